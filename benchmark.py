@@ -0,0 +1,472 @@
+import argparse
+import collections
+import datetime
+import functools
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from traffic.mmc_batch import mmc_metrics
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_THRESHOLD = 0.25  # relative slowdown reported as a regression
+MIN_SECONDS = 1e-3  # timings below this are too noisy to flag
+
+# Synthetic road network: a jittered grid around Dhaka with two-way streets between grid neighbours
+SyntheticNetwork = collections.namedtuple("SyntheticNetwork", ["nodes", "u", "v", "x", "y", "lam", "mu", "lanes"])
+
+# One benchmark case: setup(net, workdir) returns the zero-argument function that is timed;
+# sizes above max_n are skipped unless forced (pure-Python reference loops, networkx, plotting)
+Case = collections.namedtuple("Case", ["name", "setup", "max_n"])
+CASES = {}
+
+
+def case(name, max_n=None):
+    def register(setup):
+        CASES[name] = Case(name, setup, max_n)
+        return setup
+    return register
+
+
+def synthetic_network(n, seed=0):
+    """Grid-shaped network with n intersections, about four directed roads each, and λ/μ/lanes per node."""
+    rng = np.random.default_rng(seed)
+    side = math.ceil(math.sqrt(n))
+    idx = np.arange(n)
+    row, col = np.divmod(idx, side)
+    right = idx[(col < side - 1) & (idx + 1 < n)]
+    down = idx[idx + side < n]
+    a = np.concatenate([right, down])
+    b = np.concatenate([right + 1, down + side])
+    u, v = np.concatenate([a, b]), np.concatenate([b, a])
+    x = 90.35 + col * 5e-4 + rng.normal(0, 5e-5, n)  # ~50 m blocks
+    y = 23.70 + row * 5e-4 + rng.normal(0, 5e-5, n)
+    mu = rng.uniform(6, 10, n)
+    lam = mu * rng.uniform(0.3, 1.05, n)  # a few percent of the intersections are overloaded
+    lanes = rng.integers(1, 4, n)
+    return SyntheticNetwork(idx, u, v, x, y, lam, mu, lanes)
+
+
+def write_osm(net, path):
+    # Same network as an OSM XML file, one two-way residential street per grid edge
+    forward = net.u < net.v
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6" generator="benchmark">\n')
+        for i, lon, lat in zip(net.nodes.tolist(), net.x.tolist(), net.y.tolist()):
+            f.write(f'<node id="{i + 1}" lat="{lat:.7f}" lon="{lon:.7f}" version="1"/>\n')
+        for k, (a, b) in enumerate(zip(net.u[forward].tolist(), net.v[forward].tolist())):
+            f.write(f'<way id="{k + 1}" version="1"><nd ref="{a + 1}"/><nd ref="{b + 1}"/>'
+                    '<tag k="highway" v="residential"/></way>\n')
+        f.write("</osm>\n")
+
+
+def calc_L(lmbda, mu):
+    # Scalar M/M/1 reference, as in the week 5 script before NetworkState
+    if mu > lmbda:
+        return round(lmbda / (mu - lmbda), 2), "No"
+    else:
+        return float("inf"), "Yes"
+
+
+def mmc_queue_length(lam, mu, c):
+    # Scalar M/M/c reference, as in the week 8 script before traffic.core
+    if lam <= 0:
+        return 0.0
+    rho = lam / (c * mu)
+    if rho >= 1.0:
+        return np.inf
+    lam_over_mu = lam / mu
+    sum_terms = sum((lam_over_mu ** n) / math.factorial(n) for n in range(c))
+    last_term = (lam_over_mu ** c) / (math.factorial(c) * (1.0 - rho))
+    P0 = 1.0 / (sum_terms + last_term)
+    Lq = (P0 * (lam_over_mu ** c) * rho) / (math.factorial(c) * (1.0 - rho) ** 2)
+    return Lq + lam / mu
+
+
+@case("calc_L_loop", max_n=100_000)
+def _calc_L_loop(net, workdir):
+    lam, mu = net.lam.tolist(), net.mu.tolist()
+    return lambda: [calc_L(a, b) for a, b in zip(lam, mu)]
+
+
+@case("mm1_vectorized")
+def _mm1_vectorized(net, workdir):
+    return lambda: mmc_metrics(net.lam, net.mu, 1)
+
+
+@case("mmc_queue_length_sweep", max_n=100_000)
+def _mmc_queue_length_sweep(net, workdir):
+    # week 8's scalar formula for every node and 1..3 lanes
+    lam, mu = (net.lam * 2).tolist(), net.mu.tolist()
+    return lambda: [mmc_queue_length(a, b, c) for c in (1, 2, 3) for a, b in zip(lam, mu)]
+
+
+@case("mmc_metrics_sweep")
+def _mmc_metrics_sweep(net, workdir):
+    lanes = np.array([1, 2, 3])[:, None]
+    return lambda: mmc_metrics(net.lam * 2, net.mu, lanes)
+
+
+@case("mmc_cached_sweep")
+def _mmc_cached_sweep(net, workdir):
+    # Same sweep through a warm QueueCache; rates rounded to 0.1 veh/min as field counts are
+    from traffic.queue_cache import QueueCache
+
+    lanes = np.array([1, 2, 3])[:, None]
+    lam, mu = np.round(net.lam * 2, 1), np.round(net.mu, 1)
+    cache = QueueCache(maxsize=1 << 20, decimals=1)
+    cache.mmc_metrics(lam, mu, lanes)
+    return lambda: cache.mmc_metrics(lam, mu, lanes)
+
+
+@case("alt_query")
+def _alt_query(net, workdir):
+    # One point-to-point travel time under queue delays; the target for road-network routing is < 1 ms
+    import itertools
+
+    from traffic.csr_graph import CSRGraph
+    from traffic.travel_matrix import ALTIndex
+
+    w = np.hypot(net.x[net.u] - net.x[net.v], net.y[net.u] - net.y[net.v]) * 1e5 / 500.0  # minutes at 30 km/h
+    graph = CSRGraph.from_edges(len(net.nodes), net.u, net.v, w, net.nodes, net.x, net.y)
+    index = ALTIndex.build(graph)  # landmark tables are built once, outside the timing
+    index.set_queue_delay(mmc_metrics(np.minimum(net.lam, 0.95 * net.lanes * net.mu), net.mu, net.lanes).Wq)
+    pairs = itertools.cycle(np.random.default_rng(0).integers(0, len(net.nodes), (100, 2)).tolist())
+    return lambda: index.query(*next(pairs))
+
+
+@case("sensitivity_rank")
+def _sensitivity_rank(net, workdir):
+    # Analytic gradients for every node, pushed through the routing matrix of the grid
+    from traffic.csr_graph import CSRGraph
+    from traffic.sensitivity import sensitivities
+
+    graph = CSRGraph.from_edges(len(net.nodes), net.u, net.v, np.ones(len(net.u)), net.nodes)
+    return lambda: sensitivities(net.lam, net.mu, net.lanes, graph)
+
+
+@case("jackson_solve")
+def _jackson_solve(net, workdir):
+    # Open Jackson network on the grid: factorization, traffic equations and sojourn times
+    from traffic.csr_graph import CSRGraph
+    from traffic.jackson import JacksonNetwork
+
+    graph = CSRGraph.from_edges(len(net.nodes), net.u, net.v, np.ones(len(net.u)), net.nodes)
+    return lambda: JacksonNetwork(graph, net.lam * 0.1, net.mu, net.lanes).solve()
+
+
+@case("monte_carlo", max_n=100_000)
+def _monte_carlo(net, workdir):
+    # 1000 noisy (λ, μ) draws per intersection: L percentiles and P(unstable) for the whole network
+    from traffic.uncertainty import queue_uncertainty
+
+    return lambda: queue_uncertainty(net.lam, net.mu, net.lanes, samples=1000)
+
+
+def _pings(net, count=1_000_000, seed=0):
+    # GPS pings scattered ~20 m around random intersections
+    rng = np.random.default_rng(seed)
+    at = rng.integers(0, len(net.nodes), count)
+    return net.x[at] + rng.normal(0, 2e-4, count), net.y[at] + rng.normal(0, 2e-4, count)
+
+
+@case("snap_pings")
+def _snap_pings(net, workdir):
+    # A minute of 1M GPS pings snapped to intersections and turned into per-node λ and L
+    from traffic.spatial import SpatialIndex, ping_state
+
+    index = SpatialIndex(net.x, net.y, net.nodes)
+    lon, lat = _pings(net)
+    return lambda: ping_state(index, lon, lat, minutes=1.0, mu=net.mu, lanes=net.lanes)
+
+
+@case("snap_edges")
+def _snap_edges(net, workdir):
+    # 1M GPS pings matched to their exact nearest road segment
+    from traffic.spatial import SpatialIndex
+
+    forward = net.u < net.v
+    index = SpatialIndex(net.x, net.y, net.nodes, net.u[forward], net.v[forward])
+    lon, lat = _pings(net)
+    index.snap_edges(lon[:1], lat[:1])  # segment samples are built once, outside the timing
+    return lambda: index.snap_edges(lon, lat)
+
+
+@case("results_query", max_n=100_000)
+def _results_query(net, workdir):
+    # Dashboard query on a stored hour of per-minute L: 10 intersections over 15 minutes
+    import pandas as pd
+
+    from traffic.results_store import ResultStore
+
+    n = len(net.nodes)
+    times = pd.date_range("2026-01-01 08:00", periods=60, freq="min")
+    store = ResultStore(os.path.join(workdir, "results"))
+    for chunk in np.array_split(np.arange(len(times)), 4):  # four appends, as a live run would make
+        store.append("base", pd.DataFrame({
+            "time": np.repeat(times[chunk].values, n),
+            "node": np.tile(np.arange(n), len(chunk)),
+            "L": np.tile(net.lam / net.mu, len(chunk)),
+        }))
+    nodes = np.linspace(0, n - 1, 10).astype(int).tolist()
+    return lambda: store.read("base", times[20], times[35], nodes=nodes, columns=["L"])
+
+
+@case("networkx_build", max_n=100_000)
+def _networkx_build(net, workdir):
+    # Graph construction as in week 4: add_nodes_from / add_edges_from on a DiGraph
+    import networkx as nx
+
+    nodes = net.nodes.tolist()
+    edges = list(zip(net.u.tolist(), net.v.tolist()))
+
+    def build():
+        G = nx.DiGraph()
+        G.add_nodes_from(nodes)
+        G.add_edges_from(edges)
+        return G
+    return build
+
+
+@case("csr_build")
+def _csr_build(net, workdir):
+    from traffic.csr_graph import CSRGraph
+
+    w = np.hypot(net.x[net.u] - net.x[net.v], net.y[net.u] - net.y[net.v])
+    return lambda: CSRGraph.from_edges(len(net.nodes), net.u, net.v, w, net.nodes, net.x, net.y)
+
+
+@case("graph_store_load")
+def _graph_store_load(net, workdir):
+    # Reading a cached graph back (memory-mapped), as load_graph does on every run after the first
+    from traffic import graph_store
+
+    forward = net.u < net.v
+    order = np.argsort(net.u, kind="stable")
+    indptr = np.zeros(len(net.nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(net.u, minlength=len(net.nodes)), out=indptr[1:])
+    arrays = {"node_ids": net.nodes, "x": net.x, "y": net.y, "indptr": indptr, "indices": net.v[order],
+              "length": np.ones(len(order)), "forward": forward[order]}
+    path = os.path.join(workdir, f"graph_{len(net.nodes)}")
+    graph_store.save(graph_store.StoredGraph(arrays, {"undirected": True}), path)
+
+    def load():
+        stored = graph_store.load(path)
+        return float(stored.x.sum()) + int(stored.indptr[-1])
+    return load
+
+
+@case("ingest_events", max_n=100_000)
+def _ingest_events(net, workdir):
+    # One minute of detector events (about 2λ per node) into a 5-minute rolling window
+    from traffic.ingest import RateEstimator, synthetic_events
+
+    events = synthetic_events(net.lam, net.mu, 60.0)
+    batches = [events[i:i + (1 << 16)] for i in range(0, len(events), 1 << 16)]
+
+    def ingest():
+        estimator = RateEstimator(len(net.nodes), window=300.0, bins=60)
+        for batch in batches:
+            estimator.ingest_records(batch)
+        return estimator.estimates()
+    return ingest
+
+
+@case("service_queries")
+def _service_queries(net, workdir):
+    # 1000 node lookups and 100 few-node what-ifs through the query service dispatcher (no sockets)
+    import asyncio
+
+    from traffic.csr_graph import CSRGraph
+    from traffic.network_state import NetworkState
+    from traffic.service import QueueService
+
+    graph = CSRGraph.from_edges(len(net.nodes), net.u, net.v, np.ones(len(net.u)), net.nodes)
+    service = QueueService(graph, NetworkState(net.nodes, net.lam, net.mu, net.lanes), workers=1)
+    picks = np.random.default_rng(0).integers(0, len(net.nodes), 1000).tolist()
+    body = json.dumps({"nodes": picks[:3], "mu_delta": 1.0}).encode()
+
+    async def queries():
+        for i in picks:
+            await service.handle("GET", f"/nodes/{i}")
+        for _ in range(100):
+            await service.handle("POST", "/scenario", body)
+    return lambda: asyncio.run(queries())
+
+
+@case("osm_load", max_n=10_000)
+def _osm_load(net, workdir):
+    # Parsing a local .osm file through osmnx (the uncached path of load_graph)
+    import osmnx  # noqa: F401  (missing osmnx skips the case instead of failing mid-timing)
+    from traffic import graph_store
+
+    path = os.path.join(workdir, f"network_{len(net.nodes)}.osm")
+    write_osm(net, path)
+    return lambda: graph_store._fetch(None, None, None, path)
+
+
+@case("networkx_draw", max_n=10_000)
+def _networkx_draw(net, workdir):
+    # Full redraw of the styled network, as every week 7 animation frame used to do
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import networkx as nx
+
+    G = nx.DiGraph()
+    G.add_nodes_from(net.nodes.tolist())
+    G.add_edges_from(zip(net.u.tolist(), net.v.tolist()))
+    pos = {i: (x, y) for i, x, y in zip(net.nodes.tolist(), net.x.tolist(), net.y.tolist())}
+    L = mmc_metrics(net.lam, net.mu, 1).L
+    colors = np.where(np.isinf(L) | (L > 8), "red", "green")
+    fig, ax = plt.subplots(figsize=(10, 6))
+
+    def draw():
+        ax.clear()
+        nx.draw(G, pos, node_color=colors, node_size=20, arrows=False, ax=ax)
+        fig.canvas.draw()
+    return draw
+
+
+@case("animation_frame", max_n=100_000)
+def _animation_frame(net, workdir):
+    # One blitted frame of fast_animation.QueueAnimator
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from traffic.fast_animation import QueueAnimator, queue_style
+
+    xy = np.column_stack([net.x, net.y])
+    forward = net.u < net.v
+    segments = np.stack([xy[net.u[forward]], xy[net.v[forward]]], axis=1)
+    # Marker sizes matching networkx_draw, so both cases rasterize the same amount of ink
+    animator = QueueAnimator(xy, segments, style=functools.partial(queue_style, base=20.0, scale=2.0))
+    L = mmc_metrics(net.lam, net.mu, 1).L
+    animator.render(("warm-up", L))
+    return lambda: animator.render(("frame", L))
+
+
+def time_case(fn, repeat=5, min_time=0.2):
+    """Best-of-`repeat` seconds per call; fast functions are looped until a round takes `min_time`."""
+    start = time.perf_counter()
+    fn()
+    first = time.perf_counter() - start
+    number = max(1, int(min_time / first)) if first > 0 else 1000
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        timings.append((time.perf_counter() - start) / number)
+    return min(timings), timings
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def run(sizes=SIZES, names=None, repeat=5, force=False, log=print):
+    """Run the selected cases at every size; returns the results document (JSON-serializable)."""
+    results = {}
+    workdir = tempfile.TemporaryDirectory(prefix="benchmark_")  # scratch files, removed at the end
+    for n in sizes:
+        net = synthetic_network(n)
+        for name, c in CASES.items():
+            if names and not any(part in name for part in names):
+                continue
+            key = f"{name}@{n}"
+            if c.max_n is not None and n > c.max_n and not force:
+                continue
+            try:
+                fn = c.setup(net, workdir.name)
+            except ImportError as exc:
+                log(f"{key:<32} skipped ({exc.name} not installed)")
+                continue
+            best, timings = time_case(fn, repeat)
+            results[key] = {"case": name, "n": n, "seconds": best, "timings": timings}
+            log(f"{key:<32} {best * 1e3:12.3f} ms")
+    workdir.cleanup()
+    return {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD, min_seconds=MIN_SECONDS):
+    """Compare two results documents; returns rows of (key, baseline s, current s, ratio, status)."""
+    rows = []
+    base = baseline["results"]
+    for key, res in current["results"].items():
+        if key not in base:
+            rows.append((key, None, res["seconds"], None, "new"))
+            continue
+        old, new = base[key]["seconds"], res["seconds"]
+        ratio = new / old if old > 0 else math.inf
+        if ratio > 1 + threshold and new - old > min_seconds:
+            status = "REGRESSION"
+        elif ratio < 1 / (1 + threshold):
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((key, old, new, ratio, status))
+    return rows
+
+
+def report(rows):
+    lines = [f"{'case':<32} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}  status"]
+    for key, old, new, ratio, status in rows:
+        old_text = "-" if old is None else f"{old * 1e3:.3f}"
+        ratio_text = "-" if ratio is None else f"{ratio:.2f}"
+        lines.append(f"{key:<32} {old_text:>12} {new * 1e3:>12.3f} {ratio_text:>7}  {status}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark queue models, graph operations and rendering.")
+    parser.add_argument("--sizes", default="1k,10k,100k,1M", help="comma-separated node counts, e.g. 1k,10k")
+    parser.add_argument("--only", default=None, help="comma-separated substrings of case names to run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--force", action="store_true", help="also run cases above their size limit")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="results JSON to compare against")
+    parser.add_argument("--save-baseline", default=None, help="also write the results to this path")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(s) for s in args.sizes.split(",")]
+    names = args.only.split(",") if args.only else None
+    current = run(sizes, names, args.repeat, args.force)
+    for path in filter(None, (args.out, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(current, f, indent=2)
+    print(f"{len(current['results'])} results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(current, baseline, args.threshold)
+        print(report(rows))
+        regressions = [r for r in rows if r[4] == "REGRESSION"]
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
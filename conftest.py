@@ -0,0 +1 @@
+# Marks the repository root for pytest, so tests/ import the traffic package without installing it
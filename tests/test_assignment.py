@@ -0,0 +1,32 @@
+import sys
+
+import numpy as np
+import pytest
+
+from traffic.assignment import Assignment
+from traffic.core import build_graph
+
+NODES = ["A", "B", "C", "D"]
+EDGES = [("A", "B"), ("A", "C"), ("B", "D"), ("C", "D")]
+DEMAND = {("A", "D"): 6.0}
+
+
+def _solve():
+    assignment = Assignment(build_graph(NODES, EDGES), [10.0, 5.0, 5.0, 20.0])
+    return assignment, assignment.solve(DEMAND, tol=1e-6)
+
+
+def test_symmetric_routes_split_evenly():
+    assignment, result = _solve()
+    np.testing.assert_allclose(result.edge_flow, 3.0, rtol=1e-3)
+    state = assignment.to_state(result)
+    assert state.lam.tolist() == pytest.approx([6.0, 3.0, 3.0, 6.0], rel=1e-3)
+    np.testing.assert_allclose(state.L, result.L)
+
+
+def test_without_scipy_matches(monkeypatch):
+    _, expected = _solve()
+    for name in ["scipy", "scipy.sparse", "scipy.sparse.csgraph"]:
+        monkeypatch.setitem(sys.modules, name, None)
+    _, result = _solve()
+    np.testing.assert_allclose(result.edge_flow, expected.edge_flow, rtol=1e-6)
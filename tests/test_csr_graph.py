@@ -0,0 +1,28 @@
+import sys
+
+import numpy as np
+import pytest
+
+from traffic.core import build_graph
+
+NODES = ["A", "B", "C", "D"]
+EDGES = [("A", "B", {"travel_time": 1.0}), ("B", "C", {"travel_time": 2.0}),
+         ("A", "C", {"travel_time": 5.0}), ("C", "D", {"travel_time": 1.0})]
+
+
+def test_shortest_path():
+    graph = build_graph(NODES, EDGES)
+    assert graph.shortest_path("A", "D") == (4.0, ["A", "B", "C", "D"])
+    assert graph.shortest_path("D", "A") == (np.inf, [])
+
+
+@pytest.mark.parametrize("names", [NODES, [10, 20, 30, 40]])
+def test_od_matrix_without_scipy(monkeypatch, names):
+    rename = dict(zip(NODES, names))
+    graph = build_graph(names, [(rename[u], rename[v], w) for u, v, w in EDGES])
+    origins, destinations = [names[2], names[0]], [names[3], names[1]]
+    expected = [[1.0, np.inf], [4.0, 1.0]]
+    np.testing.assert_array_equal(graph.od_matrix(origins, destinations), expected)
+    for name in ["scipy", "scipy.sparse", "scipy.sparse.csgraph"]:
+        monkeypatch.setitem(sys.modules, name, None)
+    np.testing.assert_array_equal(graph.od_matrix(origins, destinations), expected)
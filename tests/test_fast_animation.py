@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+matplotlib = pytest.importorskip("matplotlib")
+matplotlib.use("Agg")
+
+from traffic.fast_animation import frames_from_windows, save_animation  # noqa: E402
+from traffic.time_stream import WindowMetrics  # noqa: E402
+
+XY = np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]])
+SEGMENTS = np.array([[[0.0, 0.0], [1.0, 0.0]], [[1.0, 0.0], [0.0, 1.0]]])
+
+
+def _window(start, nodes, L):
+    return WindowMetrics(start, np.array(nodes), None, np.array(L, dtype=float), None, None, None)
+
+
+def test_window_labels_follow_start_type():
+    numeric = list(frames_from_windows([_window(0.25, [0], [1.0]), _window(0.5, [2], [2.0])], 3))
+    assert [title for title, _ in numeric] == ["t = 0.2", "t = 0.5"]
+    np.testing.assert_array_equal(numeric[1][1], [1.0, 0.0, 2.0])
+    stamped = list(frames_from_windows([_window(pd.Timestamp("2026-01-01 08:15"), [1], [3.0])], 3))
+    assert stamped[0][0] == "2026-01-01 08:15"
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_gif_has_every_frame_in_order(tmp_path, workers):
+    Image = pytest.importorskip("PIL.Image")
+    frames = ((f"frame {i}", np.full(3, float(i))) for i in range(7))  # a generator, consumed lazily
+    path = str(tmp_path / "queue.gif")
+    assert save_animation((XY, SEGMENTS), frames, path, workers=workers, chunksize=2, figsize=(2, 2), dpi=40) == 7
+    assert Image.open(path).n_frames == 7
@@ -0,0 +1,41 @@
+import numpy as np
+
+from traffic.ingest import RateEstimator, synthetic_events
+from traffic.network_state import NetworkState
+
+
+def test_recovers_synthetic_rates():
+    rng = np.random.default_rng(0)
+    mu = rng.uniform(6.0, 10.0, 200)
+    lam = mu * rng.uniform(0.3, 0.9, 200)
+    events = synthetic_events(lam, mu, 4 * 3600.0)
+    estimator = RateEstimator(len(lam), window=4 * 3600.0, bins=60)
+    for lo in range(0, len(events), 5000):
+        estimator.ingest_records(events[lo:lo + 5000])
+    est = estimator.estimates()
+    assert estimator.dropped == 0
+    # 400-2000 events per node: each estimate within several standard errors, the mean much closer
+    np.testing.assert_allclose(est.lam, lam, rtol=0.2)
+    np.testing.assert_allclose(est.mu, mu, rtol=0.2)
+    assert abs(np.mean(est.lam / lam) - 1) < 0.02
+    assert abs(np.mean(est.mu / mu) - 1) < 0.02
+
+
+def test_window_forgets_old_events():
+    estimator = RateEstimator(2, window=60.0, bins=6)
+    old = synthetic_events([30.0, 0.0], 40.0, 60.0, seed=1)
+    new = synthetic_events([0.0, 12.0], 40.0, 60.0, start=120.0, seed=2)
+    estimator.ingest_records(old)
+    estimator.ingest_records(new)
+    est = estimator.estimates()
+    assert est.arrivals[0] == 0 and est.arrivals[1] > 0
+
+
+def test_publish_updates_state():
+    state = NetworkState(["a", "b"], [1.0, 1.0], [5.0, 5.0])
+    estimator = RateEstimator(2, window=600.0, bins=10)
+    estimator.ingest_records(synthetic_events([4.0, 1.0], [5.0, 5.0], 600.0))
+    estimator.publish(state)
+    fresh = NetworkState(["a", "b"], state.lam, state.mu)
+    np.testing.assert_allclose(state.L, fresh.L)
+    assert state.lam[0] > 2.0
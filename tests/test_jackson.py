@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+
+from traffic.core import build_graph  # noqa: E402
+from traffic.csr_graph import CSRGraph  # noqa: E402
+from traffic.jackson import JacksonNetwork  # noqa: E402
+
+
+def _grid(side=6, seed=0):
+    rng = np.random.default_rng(seed)
+    n = side * side
+    idx = np.arange(n)
+    right = idx[(idx % side) < side - 1]
+    down = idx[idx + side < n]
+    u = np.concatenate([right, down, right + 1, down + side])
+    v = np.concatenate([right + 1, down + side, right, down])
+    graph = CSRGraph.from_edges(n, u, v, np.ones(len(u)))
+    return graph, rng.uniform(0.1, 0.5, n), rng.uniform(8.0, 12.0, n)
+
+
+def test_tandem_closed_form():
+    # A -> B with probability 0.6: λ_A = γ_A, λ_B = γ_B + 0.6 γ_A, each node M/M/1
+    graph = build_graph(["A", "B"], [("A", "B")])
+    res = JacksonNetwork(graph, [2.0, 1.0], [5.0, 6.0], edge_prob=[0.6]).solve()
+    np.testing.assert_allclose(res.lam, [2.0, 2.2])
+    rho = res.lam / np.array([5.0, 6.0])
+    np.testing.assert_allclose(res.L, rho / (1 - rho))
+    W = 1 / (np.array([5.0, 6.0]) - res.lam)
+    np.testing.assert_allclose(res.sojourn, [W[0] + 0.6 * W[1], W[1]])
+    assert res.mean_sojourn == pytest.approx(res.L.sum() / 3.0)
+
+
+@pytest.mark.parametrize("max_rank", [32, 2])  # Woodbury correction, then forced refactorizations
+def test_update_routing_matches_refactorization(max_rank):
+    graph, gamma, mu = _grid()
+    net = JacksonNetwork(graph, gamma, mu, max_rank=max_rank)
+    rng = np.random.default_rng(1)
+    for node in rng.choice(graph.num_nodes, 5, replace=False).tolist():
+        lo, hi = graph.offsets[node], graph.offsets[node + 1]
+        share = rng.dirichlet(np.ones(hi - lo)) * 0.8
+        net.update_routing(np.arange(lo, hi), share)
+    fresh = JacksonNetwork(graph, gamma, mu, edge_prob=net.prob)
+    got, expected = net.solve(), fresh.solve()
+    np.testing.assert_allclose(got.lam, expected.lam, rtol=1e-10)
+    np.testing.assert_allclose(got.sojourn, expected.sojourn, rtol=1e-10)
+    np.testing.assert_allclose(got.L, expected.L, rtol=1e-10)
+
+
+def test_rejects_routing_above_one():
+    graph, gamma, mu = _grid(3)
+    net = JacksonNetwork(graph, gamma, mu)
+    with pytest.raises(ValueError):
+        net.update_routing(np.arange(graph.offsets[0], graph.offsets[1]), 0.9)
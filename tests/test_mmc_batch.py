@@ -0,0 +1,58 @@
+import math
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from traffic.mmc_batch import erlang_b, mmc_metrics
+
+
+def _reference(lam, mu, c):
+    # Textbook M/M/c with exact factorials, in rationals so a^c / c! never overflows
+    a = Fraction(lam) / Fraction(mu)
+    rho = a / c
+    tail = a ** c / (math.factorial(c) * (1 - rho))
+    P0 = 1 / (sum(a ** k / math.factorial(k) for k in range(c)) + tail)
+    Lq = P0 * tail * rho / (1 - rho)
+    return float(Lq + a), float(Lq), float(P0)
+
+
+def test_mm1_closed_form():
+    lam = np.array([0.1, 1.0, 5.0, 9.9])
+    mu = 10.0
+    rho = lam / mu
+    res = mmc_metrics(lam, mu, 1)
+    np.testing.assert_allclose(res.L, rho / (1 - rho), rtol=1e-12)
+    np.testing.assert_allclose(res.Lq, rho ** 2 / (1 - rho), rtol=1e-12)
+    np.testing.assert_allclose(res.Wq, rho / (mu - lam), rtol=1e-12)
+    np.testing.assert_allclose(res.P0, 1 - rho, rtol=1e-12)
+
+
+@pytest.mark.parametrize("c", [1, 2, 5, 20, 50, 100, 200, 400])
+@pytest.mark.parametrize("rho", [1e-6, 0.01, 0.5, 0.9, 0.99])
+def test_matches_factorial_reference(c, rho):
+    lam = rho * c
+    L, Lq, P0 = _reference(lam, 1.0, c)
+    res = mmc_metrics(lam, 1.0, c)
+    assert res.L == pytest.approx(L, rel=1e-9)
+    assert res.Lq == pytest.approx(Lq, rel=1e-9, abs=1e-300)
+    assert res.P0 == pytest.approx(P0, rel=1e-9)
+
+
+def test_p0_at_large_c_low_load():
+    # Erlang-B underflows to 0 here; P0 must still be about e^-a
+    assert mmc_metrics(0.5, 1, 400).P0 == pytest.approx(math.exp(-0.5), rel=1e-12)
+    assert mmc_metrics(1e-3, 1, 200).P0 == pytest.approx(math.exp(-1e-3), rel=1e-12)
+
+
+def test_unstable_and_idle_cells():
+    res = mmc_metrics([0.0, 2.0, 3.0], 1.0, [1, 2, 2])
+    assert res.L[0] == 0 and res.P0[0] == 1
+    assert np.isinf(res.L[1:]).all() and (res.P0[1:] == 0).all()
+    with pytest.raises(ValueError):
+        mmc_metrics(1.0, 1.0, 0)
+
+
+def test_erlang_b_broadcasts_lanes():
+    B = erlang_b(2.0, [1, 2, 3])
+    np.testing.assert_allclose(B, [2 / 3, 2 / 5, 4 / 19], rtol=1e-12)
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from traffic.network_state import NetworkState, StateComparison
+
+
+def test_scalar_lanes_broadcast():
+    state = NetworkState(["a", "b"], [1.0, 2.0], [4.0, 4.0], 1)
+    assert state.lanes.tolist() == [1, 1]
+    state.update_at([0], lam=[1.5])
+    assert state.L[0] == pytest.approx(1.5 / 2.5)
+
+
+def test_incremental_update_matches_recompute():
+    rng = np.random.default_rng(0)
+    mu = rng.uniform(5, 10, 50)
+    state = NetworkState(range(50), mu * rng.uniform(0.2, 1.1, 50), mu, rng.integers(1, 3, 50))
+    for _ in range(20):
+        idx = rng.integers(0, 50, 5)
+        state.update_at(idx, lam=mu[idx] * rng.uniform(0.2, 1.1, 5))
+    fresh = NetworkState(state.nodes, state.lam, state.mu, state.lanes)
+    np.testing.assert_allclose(state.L, fresh.L)
+    assert state.congested_count == fresh.congested_count
+    assert state.finite_L_total == pytest.approx(fresh.finite_L_total)
+
+
+def test_comparison_caps_unstable_nodes():
+    before = NetworkState(["a", "b"], [9.0, 2.0], [7.0, 4.0])
+    after = NetworkState(["a", "b"], [8.0, 2.0], [9.0, 4.0])
+    comparison = StateComparison(before, after, cap=10)
+    assert comparison.L_before.tolist() == [10, 1.0]
+    assert comparison.improvement.tolist() == [20.0, 0.0]
+    assert comparison.total_improvement == pytest.approx(100 * (11 - 9) / 11, abs=0.01)
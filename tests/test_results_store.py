@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from traffic.results_store import ResultStore
+
+
+@pytest.fixture(params=["parquet", "npy"])
+def store(request, tmp_path):
+    if request.param == "parquet":
+        pytest.importorskip("pyarrow")
+    store = ResultStore(tmp_path, format=request.param)
+    times = pd.date_range("2026-01-01 23:58", periods=4, freq="min")  # crosses midnight
+    store.append("hourly", pd.DataFrame({
+        "time": np.repeat(times.values, 3), "node": np.tile([3, 1, 2], 4), "L": np.arange(12.0),
+    }))
+    store.append_table("compare", pd.DataFrame({"Node": ["Farmgate", "Tejgaon"], "L": [2.0, 3.0]}),
+                       pd.Timestamp("2026-01-02 08:00"))
+    return store
+
+
+def test_partitions_by_date(store):
+    assert store.scenarios() == ["compare", "hourly"]
+    assert store.dates("hourly") == ["2026-01-01", "2026-01-02"]
+
+
+def test_time_and_node_filter(store):
+    df = store.read("hourly", "2026-01-01 23:59", "2026-01-02 00:01", nodes=[1, 3], columns=["L"])
+    assert sorted(zip(df["node"], df["L"])) == [(1, 4.0), (1, 7.0), (3, 3.0), (3, 6.0)]
+
+
+def test_mixed_node_types(store):
+    assert len(store.parts(nodes=[1])) == 3
+    assert store.read(nodes=[1])["L"].tolist() == [1.0, 4.0, 7.0, 10.0]
+    assert store.read(nodes=["Tejgaon"])["L"].tolist() == [3.0]
+    assert len(store.read()) == 14
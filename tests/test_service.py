@@ -0,0 +1,41 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from traffic.core import build_graph
+from traffic.network_state import NetworkState
+from traffic.service import QueueService
+
+NODES = ["A", "B", "C"]
+
+
+@pytest.fixture
+def service():
+    graph = build_graph(NODES, [("A", "B"), ("B", "C")])
+    return QueueService(graph, NetworkState(NODES, [1.0, 2.0, 5.0], [4.0, 4.0, 4.0]), workers=1)
+
+
+def _post(service, path, body):
+    return asyncio.run(service.handle("POST", path, json.dumps(body).encode()))
+
+
+def test_scenario_totals(service):
+    status, payload = _post(service, "/scenario", {"nodes": ["B"], "lam": [3.0], "cap": 10})
+    assert status == 200
+    assert payload["L Before"] == pytest.approx(1 / 3 + 1.0 + 10)
+    assert payload["L After"] == pytest.approx(1 / 3 + 3.0 + 10)
+    assert payload["Congested"] == 1
+    np.testing.assert_allclose(service.state.lam, [1.0, 2.0, 5.0])  # live state untouched
+
+
+def test_scenario_rejects_duplicate_nodes(service):
+    status, payload = _post(service, "/scenario", {"nodes": ["B", "B"], "mu_delta": 1.0})
+    assert status == 400
+    assert "B" in payload["error"]
+
+
+def test_unknown_node(service):
+    status, _ = asyncio.run(service.handle("GET", "/nodes/Z"))
+    assert status == 404
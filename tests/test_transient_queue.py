@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from traffic.mmc_batch import mmc_metrics
+from traffic import transient_queue
+
+
+@pytest.mark.parametrize("lanes", [1, 3])
+def test_constant_load_settles_at_stationary_L(lanes):
+    lam = np.full(2000, 0.8 * lanes * 5.0)
+    L = transient_queue.fluid_queue(lam, 5.0, lanes, dt=0.05)[0]
+    assert L[-1] == pytest.approx(float(mmc_metrics(lam[0], 5.0, lanes).L), rel=1e-3)
+
+
+def test_overload_grows_at_excess_rate():
+    # λ = 1.5·cμ: ρ(L) → 1, so the fluid queue gains λ - cμ vehicles per time unit
+    lam = np.full(400, 12.0)
+    L = transient_queue.fluid_queue(lam, 4.0, 2, dt=0.5)[0]
+    assert (L[-1] - L[-101]) / 50.0 == pytest.approx(4.0, rel=0.02)
+
+
+def test_clearance_after_peak():
+    dt = 0.1
+    lam = np.concatenate([np.full(100, 3.0), np.full(50, 6.0), np.full(600, 3.0)])
+    res = transient_queue.solve(lam, 5.0, 1, dt)
+    assert np.isinf(res.L_psa[0, 100:150]).all()
+    assert np.isfinite(res.L).all()
+    episodes = transient_queue.clearance_times(res.L, res.L_psa, dt)
+    assert episodes.node.tolist() == [0]
+    assert (episodes.peak_start[0], episodes.peak_end[0]) == (100, 149)
+    # About 5 vehicles built up, drained at cμ - λ = 2 per time unit, plus the tail towards steady state
+    assert 2.0 < episodes.clear_time[0] < 10.0
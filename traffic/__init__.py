@@ -0,0 +1,55 @@
+import importlib
+
+# Public name -> submodule that defines it. Nothing is imported until a name is first used,
+# so `import traffic` is free and the queue formulas pull in NumPy only; pandas, matplotlib,
+# networkx, osmnx and folium load with the features that need them.
+_EXPORTS = {
+    "calc_L": "core",
+    "calculate_queue_length": "core",
+    "mmc_queue_length": "core",
+    "lambda_t": "core",
+    "improvement": "core",
+    "build_graph": "core",
+    "mmc_metrics": "mmc_batch",
+    "erlang_b": "mmc_batch",
+    "mmc_gradients": "mmc_batch",
+    "QueueCache": "queue_cache",
+    "default_cache": "queue_cache",
+    "NetworkState": "network_state",
+    "JacksonNetwork": "jackson",
+    "StateComparison": "network_state",
+    "CSRGraph": "csr_graph",
+    "ALTIndex": "travel_matrix",
+    "Assignment": "assignment",
+    "LaneAllocator": "lane_allocation",
+    "QueueNetwork": "queue_sim",
+    "run_scenarios": "scenario_sweep",
+    "rank_intersections": "sensitivity",
+    "queue_uncertainty": "uncertainty",
+    "improvement_interval": "uncertainty",
+    "stream_windows": "time_stream",
+    "read_observations": "time_stream",
+    "RateEstimator": "ingest",
+    "read_events": "ingest",
+    "ResultStore": "results_store",
+    "load_graph": "graph_store",
+    "QueueAnimator": "fast_animation",
+    "save_animation": "fast_animation",
+    "export_map": "map_export",
+    "SpatialIndex": "spatial",
+    "QueueService": "service",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
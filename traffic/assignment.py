@@ -0,0 +1,179 @@
+import collections
+
+import numpy as np
+
+from .mmc_batch import mmc_metrics
+from .network_state import NetworkState
+
+# Output of the equilibrium solver
+#   edge_flow: vehicles/min per edge (graph order), node_lambda: arrival rate per intersection,
+#   node_delay: queue waiting time per intersection, L: M/M/c queue length per intersection
+AssignmentResult = collections.namedtuple(
+    "AssignmentResult", ["edge_flow", "node_lambda", "node_delay", "L", "gap", "iterations"]
+)
+
+
+def queue_delay(lam, mu, lanes, rho_max=0.95):
+    """M/M/c waiting time Wq, continued linearly past ρ = rho_max so it stays finite.
+
+    The solver needs a finite, increasing cost while intermediate flows
+    overshoot capacity; the final L is still reported with the exact formula.
+    """
+    lam = np.asarray(lam, dtype=float)
+    cap = rho_max * lanes * mu
+    h = 1e-6 * cap
+    w_cap = mmc_metrics(cap, mu, lanes).Wq
+    slope = (w_cap - mmc_metrics(cap - h, mu, lanes).Wq) / h
+    exact = mmc_metrics(np.minimum(lam, cap), mu, lanes).Wq
+    return np.where(lam <= cap, exact, w_cap + slope * (lam - cap))
+
+
+def _demand_rows(graph, demand):
+    # {(origin, dest): rate} -> origin positions and a dense (origins x nodes) demand block
+    origins = sorted({graph.index[o] for o, _ in demand})
+    row = {o: i for i, o in enumerate(origins)}
+    D = np.zeros((len(origins), graph.num_nodes))
+    for (o, d), q in demand.items():
+        D[row[graph.index[o]], graph.index[d]] += q
+    return np.array(origins, dtype=np.int64), D
+
+
+def _incoming(graph, cost):
+    # Incoming edges grouped by head node, parallel edges ordered cheapest first
+    order = np.lexsort((cost, graph.sources, graph.targets))
+    offsets = np.zeros(graph.num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(graph.targets, minlength=graph.num_nodes), out=offsets[1:])
+    return offsets, graph.sources[order], order
+
+
+def _edge_ids(incoming, u, v):
+    # Id of the cheapest edge u -> v for every pair, scanning v's few incoming edges in lockstep
+    offsets, sources, edge_ids = incoming
+    slot = offsets[v].copy()
+    found = np.empty(len(v), dtype=np.int64)
+    todo = np.arange(len(v))
+    while todo.size:
+        hit = sources[slot[todo]] == u[todo]
+        found[todo[hit]] = edge_ids[slot[todo[hit]]]
+        todo = todo[~hit]
+        slot[todo] += 1
+    return found
+
+
+def all_or_nothing(graph, cost, origins, D, max_cells=1 << 24):
+    """Load the demand block D onto shortest-path trees; returns (edge flow, total path cost).
+
+    Origins are routed in chunks so at most `max_cells` distances are held at once.
+    Uses scipy's compiled Dijkstra when SciPy is installed and falls back to
+    one heap Dijkstra per origin otherwise.
+    """
+    try:
+        from scipy.sparse import csgraph
+    except ImportError:
+        csgraph = None
+
+    n = graph.num_nodes
+    chunk = max(1, max_cells // max(n, 1))
+    incoming = _incoming(graph, cost)
+    matrix = None if csgraph is None else graph.to_scipy(cost)
+    flow = np.zeros(graph.num_edges)
+    total = 0.0
+    for start in range(0, len(origins), chunk):
+        block = origins[start:start + chunk]
+        Db = D[start:start + len(block)]
+        if csgraph is None:
+            trees = [graph.dijkstra(graph.nodes[o], weights=cost) for o in block]
+            dist, pred = np.array([d for d, _ in trees]), np.array([p for _, p in trees])
+        else:
+            dist, pred = csgraph.dijkstra(matrix, directed=True, indices=block, return_predecessors=True)
+        reach = np.isfinite(dist)
+        total += float((Db[reach] * dist[reach]).sum())
+
+        # Walking every OD pair back to its origin at once, one tree edge per step;
+        # paths that meet at the same node of the same tree are merged so shared segments load once
+        r, cur = np.nonzero(np.where(reach, Db, 0.0))
+        q = Db[r, cur]
+        while cur.size:
+            p = pred[r, cur]
+            live = p >= 0
+            r, cur, p, q = r[live], cur[live], p[live], q[live]
+            np.add.at(flow, _edge_ids(incoming, p, cur), q)
+            code, inv = np.unique(r * n + p, return_inverse=True)
+            q = np.bincount(inv, weights=q)
+            r, cur = np.divmod(code, n)
+    return flow, total
+
+
+class Assignment:
+    """Queue-aware user-equilibrium traffic assignment (Frank-Wolfe).
+
+    Edge cost = free-flow edge weight + M/M/c waiting time at the head
+    intersection, whose λ is the flow entering it plus the demand starting
+    there. `lanes` = 1 gives the M/M/1 model of calc_L.
+    """
+
+    def __init__(self, graph, mu, lanes=None, rho_max=0.95):
+        self.graph = graph
+        self.mu = np.asarray(mu, dtype=float)
+        self.lanes = np.ones(graph.num_nodes, dtype=int) if lanes is None else np.asarray(lanes, dtype=int)
+        self.rho_max = rho_max
+
+    def node_lambda(self, edge_flow, origin_flow):
+        return np.bincount(self.graph.targets, weights=edge_flow, minlength=self.graph.num_nodes) + origin_flow
+
+    def edge_cost(self, edge_flow, origin_flow):
+        delay = queue_delay(self.node_lambda(edge_flow, origin_flow), self.mu, self.lanes, self.rho_max)
+        return self.graph.weights + delay[self.graph.targets]
+
+    def solve(self, demand, max_iter=100, tol=1e-4, line_search_steps=30):
+        """Iterate Frank-Wolfe until the relative gap drops below `tol`.
+
+        `demand` maps (origin, destination) node pairs to vehicles per time unit.
+        """
+        origins, D = _demand_rows(self.graph, demand)
+        origin_flow = np.zeros(self.graph.num_nodes)
+        np.add.at(origin_flow, origins, D.sum(axis=1))
+
+        x, _ = all_or_nothing(self.graph, self.graph.weights.copy(), origins, D)
+        gap = np.inf
+        it = 0
+        for it in range(1, max_iter + 1):
+            cost = self.edge_cost(x, origin_flow)
+            y, sp_total = all_or_nothing(self.graph, cost, origins, D)
+            current = float(x @ cost)
+            gap = (current - sp_total) / current if current > 0 else 0.0
+            if gap < tol:
+                break
+
+            # Bisection on the directional derivative of the Beckmann objective
+            direction = y - x
+            lo, hi = 0.0, 1.0
+            for _ in range(line_search_steps):
+                mid = 0.5 * (lo + hi)
+                if float(direction @ self.edge_cost(x + mid * direction, origin_flow)) > 0:
+                    hi = mid
+                else:
+                    lo = mid
+            x = x + 0.5 * (lo + hi) * direction
+
+        lam = self.node_lambda(x, origin_flow)
+        res = mmc_metrics(lam, self.mu, self.lanes)
+        return AssignmentResult(x, lam, res.Wq, res.L, gap, it)
+
+    def to_state(self, result, cache=None):
+        # Solver λ as a NetworkState, ready for the week 5/6 tables
+        return NetworkState(self.graph.nodes, result.node_lambda, self.mu, self.lanes, cache)
+
+
+def read_demand(path):
+    """OD demand {(origin, destination): rate} from a CSV/Parquet file with origin, destination, rate columns."""
+    import pandas as pd
+
+    df = pd.read_parquet(path) if str(path).endswith((".parquet", ".pq")) else pd.read_csv(path)
+    missing = {"origin", "destination", "rate"} - set(df.columns)
+    if missing:
+        raise ValueError(f"{path} is missing columns {sorted(missing)}")
+    demand = {}
+    for o, d, q in zip(df["origin"].tolist(), df["destination"].tolist(), df["rate"].tolist()):
+        demand[o, d] = demand.get((o, d), 0.0) + q
+    return demand
@@ -0,0 +1,89 @@
+import numpy as np
+
+from .mmc_batch import mmc_metrics
+
+# week 8 hourly arrival-rate profile: morning and evening peaks, off-peak otherwise
+PEAK_HOURS = ((7, 9, 12.0), (17, 19, 14.0))
+OFF_PEAK_RATE = 6.0
+
+
+def _scalar(value, like):
+    # Plain Python scalar when every input was a scalar, the array otherwise
+    return value.item() if all(np.ndim(x) == 0 for x in like) else value
+
+
+def calculate_queue_length(lmbda, mu):
+    """M/M/1 queue length L = λ / (μ - λ), rounded to 2 decimals, and the congestion flag.
+
+    Returns (L, "Yes"/"No"); an intersection with λ >= μ is congested and
+    gets L = inf (week 3).
+    """
+    lam = np.asarray(lmbda, dtype=float)
+    mu_ = np.asarray(mu, dtype=float)
+    stable = mu_ > lam
+    with np.errstate(divide="ignore", invalid="ignore"):
+        L = np.where(stable, np.round(lam / (mu_ - lam), 2), np.inf)
+    flag = np.where(stable, "No", "Yes")
+    return _scalar(L, (lmbda, mu)), _scalar(flag, (lmbda, mu))
+
+
+# Name used by the week 4/5 scripts for the same formula
+calc_L = calculate_queue_length
+
+
+def mmc_queue_length(lam, mu, c, cache=None):
+    """Average number of vehicles in an M/M/c system, inf when λ >= c·μ (week 8).
+
+    A QueueCache memoizes the evaluation on quantized rates.
+    """
+    res = mmc_metrics(lam, mu, c) if cache is None else cache.mmc_metrics(lam, mu, c)
+    return _scalar(res.L, (lam, mu, c))
+
+
+def lambda_t(hour):
+    """week 8 arrival rate λ(t) for an hour of the day (vehicles/min)."""
+    h = np.asarray(hour)
+    rate = np.full(h.shape, OFF_PEAK_RATE)
+    for start, end, peak in PEAK_HOURS:
+        rate = np.where((start <= h) & (h <= end), peak, rate)
+    return _scalar(rate, (hour,))
+
+
+def improvement(lb, la):
+    """Vectorized week 6 improvement %, (L before - L after) / L before * 100.
+
+    An unstable node that becomes stable counts as 100%, one that stays
+    unstable as 0%, and a node with L before = 0 as 0%.
+    """
+    lb, la = np.broadcast_arrays(np.asarray(lb, dtype=float), np.asarray(la, dtype=float))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.round((lb - la) / lb * 100, 2)
+    pct = np.where(lb == 0, 0.0, pct)
+    return np.where(np.isinf(lb), np.where(np.isinf(la), 0.0, 100.0), pct)
+
+
+def build_graph(nodes, edges, weight="travel_time", default=1.0, as_networkx=False):
+    """Road network from node names and (u, v) or (u, v, attrs) edges, as built in weeks 2-7.
+
+    Returns a CSRGraph (NumPy only) with the edge `weight` attribute as
+    cost; `as_networkx=True` builds the networkx DiGraph the plotting
+    scripts use instead, importing networkx only then.
+    """
+    nodes = list(nodes)
+    edges = list(edges)
+    if as_networkx:
+        import networkx as nx
+
+        G = nx.DiGraph()
+        G.add_nodes_from(nodes)
+        G.add_edges_from(edges)
+        return G
+
+    from .csr_graph import CSRGraph
+
+    index = {n: i for i, n in enumerate(nodes)}
+    u = np.fromiter((index[e[0]] for e in edges), dtype=np.int64, count=len(edges))
+    v = np.fromiter((index[e[1]] for e in edges), dtype=np.int64, count=len(edges))
+    w = np.fromiter(((e[2].get(weight, default) if len(e) > 2 else default) for e in edges),
+                    dtype=float, count=len(edges))
+    return CSRGraph.from_edges(len(nodes), u, v, w, nodes)
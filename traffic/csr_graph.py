@@ -0,0 +1,224 @@
+import heapq
+
+import numpy as np
+
+
+class CSRGraph:
+    """Directed road graph as CSR arrays (offsets, targets, weights).
+
+    The out-edges of node i are `targets[offsets[i]:offsets[i + 1]]` with
+    costs in `weights`. `nodes` maps positions back to the original node
+    names; `x`/`y` coordinates are optional and only used for A*.
+    """
+
+    def __init__(self, offsets, targets, weights, nodes=None, x=None, y=None):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=float)
+        n = len(self.offsets) - 1
+        self.nodes = np.arange(n) if nodes is None else np.asarray(nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes.tolist())}
+        self.x = None if x is None else np.asarray(x, dtype=float)
+        self.y = None if y is None else np.asarray(y, dtype=float)
+        self.sources = np.repeat(np.arange(n), np.diff(self.offsets))
+
+    @property
+    def num_nodes(self):
+        return len(self.offsets) - 1
+
+    @property
+    def num_edges(self):
+        return len(self.targets)
+
+    @classmethod
+    def from_edges(cls, n, u, v, w, nodes=None, x=None, y=None):
+        # Sorting an edge list by source into CSR order
+        u = np.asarray(u, dtype=np.int64)
+        order = np.argsort(u, kind="stable")
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(u, minlength=n), out=offsets[1:])
+        return cls(offsets, np.asarray(v)[order], np.asarray(w, dtype=float)[order], nodes, x, y)
+
+    @classmethod
+    def from_networkx(cls, G, weight="travel_time", default=1.0):
+        """Convert a networkx (Di)Graph; undirected graphs get both edge directions."""
+        nodes = list(G.nodes)
+        index = {n: i for i, n in enumerate(nodes)}
+        edges = list(G.edges(data=weight, default=default))
+        u = [index[a] for a, _, _ in edges]
+        v = [index[b] for _, b, _ in edges]
+        w = [d for _, _, d in edges]
+        if not G.is_directed():
+            u, v, w = u + v, v + u, w + w
+        x = y = None
+        if nodes and all("x" in d and "y" in d for _, d in G.nodes(data=True)):
+            x = [d["x"] for _, d in G.nodes(data=True)]
+            y = [d["y"] for _, d in G.nodes(data=True)]
+        return cls.from_edges(len(nodes), u, v, w, nodes, x, y)
+
+    @classmethod
+    def from_store(cls, stored):
+        # Wrapping a graph_store.StoredGraph without copying its memory-mapped arrays
+        return cls(stored.indptr, stored.indices, stored.length, stored.node_ids, stored.x, stored.y)
+
+    def to_networkx(self, weight="travel_time"):
+        import networkx as nx
+
+        G = nx.DiGraph()
+        names = self.nodes.tolist()
+        if self.x is not None:
+            G.add_nodes_from((n, {"x": x, "y": y}) for n, x, y in zip(names, self.x.tolist(), self.y.tolist()))
+        else:
+            G.add_nodes_from(names)
+        G.add_edges_from(
+            (names[a], names[b], {weight: w})
+            for a, b, w in zip(self.sources.tolist(), self.targets.tolist(), self.weights.tolist())
+        )
+        return G
+
+    def with_queue_delay(self, node_delay):
+        """Edge costs plus the queue waiting time at each edge's head intersection.
+
+        `node_delay` is per node in graph order, e.g. the Wq from mmc_metrics.
+        Edges into unstable intersections (infinite delay) become impassable.
+        """
+        return self.weights + np.asarray(node_delay, dtype=float)[self.targets]
+
+    def _position(self, node):
+        return self.index[node]
+
+    def dijkstra(self, source, target=None, weights=None):
+        """Single-source shortest paths; returns (dist, pred) arrays, -1 for no predecessor.
+
+        Stops early once `target` is settled.
+        """
+        w = self.weights if weights is None else weights
+        offsets, targets, w = self.offsets.tolist(), self.targets.tolist(), w.tolist()
+        src = self._position(source)
+        goal = None if target is None else self._position(target)
+
+        dist = [np.inf] * self.num_nodes
+        pred = [-1] * self.num_nodes
+        dist[src] = 0.0
+        heap = [(0.0, src)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if u == goal:
+                break
+            for k in range(offsets[u], offsets[u + 1]):
+                nd = d + w[k]
+                v = targets[k]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    pred[v] = u
+                    heapq.heappush(heap, (nd, v))
+        return np.array(dist), np.array(pred)
+
+    def _heuristic_scale(self, w):
+        # Smallest cost per unit of straight-line distance keeps the A* heuristic admissible
+        dx = self.x[self.targets] - self.x[self.sources]
+        dy = self.y[self.targets] - self.y[self.sources]
+        span = np.hypot(dx, dy)
+        ok = span > 0
+        return float(np.min(w[ok] / span[ok])) if ok.any() else 0.0
+
+    def astar(self, source, target, weights=None):
+        """A* shortest path guided by straight-line distance to the target; returns (cost, path)."""
+        if self.x is None:
+            return self.shortest_path(source, target, weights)
+        w = self.weights if weights is None else weights
+        scale = self._heuristic_scale(w)
+        offsets, targets, wl = self.offsets.tolist(), self.targets.tolist(), w.tolist()
+        src, goal = self._position(source), self._position(target)
+        h = (np.hypot(self.x - self.x[goal], self.y - self.y[goal]) * scale).tolist()
+
+        dist = {src: 0.0}
+        pred = {src: -1}
+        heap = [(h[src], 0.0, src)]
+        closed = set()
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if u in closed:
+                continue
+            if u == goal:
+                return d, self._path(pred, goal)
+            closed.add(u)
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                nd = d + wl[k]
+                if nd < dist.get(v, np.inf):
+                    dist[v] = nd
+                    pred[v] = u
+                    heapq.heappush(heap, (nd + h[v], nd, v))
+        return np.inf, []
+
+    def _path(self, pred, goal):
+        path = []
+        u = goal
+        while u != -1:
+            path.append(u)
+            u = pred[u]
+        return self.nodes[path[::-1]].tolist()
+
+    def shortest_path(self, source, target, weights=None):
+        dist, pred = self.dijkstra(source, target, weights)
+        goal = self._position(target)
+        if not np.isfinite(dist[goal]):
+            return np.inf, []
+        return float(dist[goal]), self._path(pred, goal)
+
+    def to_scipy(self, weights=None):
+        # Sparse matrix for scipy.sparse.csgraph; parallel edges keep their cheapest cost
+        from scipy import sparse
+
+        w = self.weights if weights is None else np.asarray(weights, dtype=float)
+        ok = np.isfinite(w)
+        u, v, w = self.sources[ok], self.targets[ok], w[ok]
+        order = np.lexsort((w, v, u))
+        u, v, w = u[order], v[order], w[order]
+        first = np.ones(len(u), dtype=bool)
+        first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+        n = self.num_nodes
+        return sparse.csr_matrix((w[first], (u[first], v[first])), shape=(n, n))
+
+    def routing_probabilities(self, edge_flow=None, exit_prob=0.1):
+        """Per-edge turning probabilities P[u -> v], aligned with `targets`.
+
+        Flow leaving node u is split over its out-edges in proportion to
+        `edge_flow` (e.g. an assignment result) or evenly, after a share
+        `exit_prob` (scalar or per node) leaves the network there. Nodes
+        without out-edges, or without outgoing flow, send everything out.
+        """
+        n = self.num_nodes
+        share = np.ones(self.num_edges) if edge_flow is None else np.asarray(edge_flow, dtype=float)
+        out = np.bincount(self.sources, weights=share, minlength=n)
+        stay = 1.0 - np.broadcast_to(np.asarray(exit_prob, dtype=float), (n,))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p = share * (stay / out)[self.sources]
+        return np.where(out[self.sources] > 0, p, 0.0)
+
+    def routing_matrix(self, edge_flow=None, exit_prob=0.1):
+        # Sparse n x n routing matrix for the traffic equations λ = γ + Pᵀλ; parallel edges are summed
+        from scipy import sparse
+
+        p = self.routing_probabilities(edge_flow, exit_prob)
+        n = self.num_nodes
+        P = sparse.csr_matrix((p, self.targets, self.offsets), shape=(n, n), copy=True)
+        P.sum_duplicates()
+        return P
+
+    def od_matrix(self, origins, destinations, weights=None):
+        """Travel-cost matrix from every origin to every destination.
+
+        Uses scipy's compiled Dijkstra when SciPy is installed and falls back
+        to one heap Dijkstra per origin otherwise.
+        """
+        orig = np.array([self._position(o) for o in origins], dtype=np.int64)
+        dest = np.array([self._position(d) for d in destinations], dtype=np.int64)
+        try:
+            from scipy.sparse import csgraph
+        except ImportError:
+            return np.vstack([self.dijkstra(self.nodes[o], weights=weights)[0][dest] for o in orig])
+        return csgraph.dijkstra(self.to_scipy(weights), directed=True, indices=orig)[:, dest]
@@ -0,0 +1,206 @@
+import collections
+import numbers
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+from matplotlib.animation import FuncAnimation
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba
+
+# Worker-side animator, built once per process by _init_worker
+_worker = {}
+
+TIME_LABEL = "t = {:.1f}"  # numeric times (simulation minutes, stream hours)
+TIMESTAMP_LABEL = "{:%Y-%m-%d %H:%M}"  # windows over datetime columns
+
+
+def queue_style(L, cap=10.0, threshold=8.0, base=500.0, scale=100.0):
+    # Node size and congestion colour from queue lengths, as in week 7 (inf counts as `cap`)
+    L = np.asarray(L, dtype=float)
+    finite = np.where(np.isinf(L), cap, L)
+    sizes = base + scale * finite
+    congested = np.isinf(L) | (L > threshold)
+    colors = np.where(congested[:, None], to_rgba("red"), to_rgba("green"))
+    return sizes, colors
+
+
+def graph_geometry(G, pos):
+    """(xy, segments, node names) of a networkx graph and layout, without opening a figure."""
+    nodes = list(G.nodes)
+    xy = np.array([pos[n] for n in nodes], dtype=float)
+    segments = np.array([(pos[u], pos[v]) for u, v in G.edges()], dtype=float).reshape(-1, 2, 2)
+    return xy, segments, nodes
+
+
+class QueueAnimator:
+    """Network animation that draws the geometry once and only restyles the nodes per frame.
+
+    `xy` holds node coordinates (n x 2) and `segments` the edges as
+    (E x 2 x 2) coordinate pairs. Each frame is a (title, L) pair with one
+    queue length per node.
+    """
+
+    def __init__(self, xy, segments, labels=None, figsize=(10, 6), dpi=100, style=queue_style):
+        self.xy = np.asarray(xy, dtype=float)
+        self.segments = np.asarray(segments, dtype=float)
+        self.labels = labels
+        self.style = style
+        self.fig, self.ax = plt.subplots(figsize=figsize, dpi=dpi)
+        self.ax.add_collection(LineCollection(self.segments, colors="gray", linewidths=0.8, zorder=1))
+        self.nodes = self.ax.scatter(self.xy[:, 0], self.xy[:, 1], s=1, zorder=2, animated=True)
+        self.texts = []
+        if labels is not None:
+            self.texts = [self.ax.text(x, y, "", fontsize=7, color="white", ha="center", va="center",
+                                       zorder=3, animated=True) for x, y in self.xy]
+        self.title = self.ax.set_title("", fontsize=12, animated=True)
+        self.ax.autoscale_view()
+        self.ax.margins(0.1)
+        self.ax.axis("off")
+        self._background = None
+
+    @classmethod
+    def from_graph(cls, G, pos, labels=False, **kwargs):
+        xy, segments, nodes = graph_geometry(G, pos)
+        return cls(xy, segments, labels=nodes if labels else None, **kwargs)
+
+    @property
+    def artists(self):
+        return [self.nodes, self.title, *self.texts]
+
+    def update(self, frame):
+        title, L = frame
+        sizes, colors = self.style(L)
+        self.nodes.set_sizes(sizes)
+        self.nodes.set_facecolor(colors)
+        self.title.set_text(title)
+        for text, name, value in zip(self.texts, self.labels or [], L):
+            text.set_text(f"{name}\nL={value}")
+        return self.artists
+
+    def animation(self, frames, interval=1500, repeat=True):
+        # Blitted on-screen animation: only the node collection and texts are redrawn
+        frames = list(frames)
+        return FuncAnimation(self.fig, lambda i: self.update(frames[i]), frames=len(frames),
+                             interval=interval, repeat=repeat, blit=True)
+
+    def render(self, frame):
+        """Render one frame offscreen and return it as an (h, w, 4) uint8 RGBA array."""
+        canvas = self.fig.canvas
+        if self._background is None:
+            canvas.draw()
+            self._background = canvas.copy_from_bbox(self.fig.bbox)
+        canvas.restore_region(self._background)
+        for artist in self.update(frame):
+            self.ax.draw_artist(artist)
+        return np.asarray(canvas.buffer_rgba()).copy()
+
+
+def _init_worker(args, kwargs):
+    _worker["animator"] = QueueAnimator(*args, **kwargs)
+
+
+def _render(frame):
+    return _worker["animator"].render(frame)
+
+
+def _render_batch(frames):
+    return [_render(frame) for frame in frames]
+
+
+def _submitted(pool, frames, chunksize, max_pending):
+    # Rendered frames in order, with at most max_pending batches of `chunksize` frames in flight,
+    # so a long frame generator is consumed only as fast as the output is written
+    pending = collections.deque()
+    batch = []
+    for frame in frames:
+        batch.append(frame)
+        if len(batch) == chunksize:
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+            pending.append(pool.submit(_render_batch, batch))
+            batch = []
+    if batch:
+        pending.append(pool.submit(_render_batch, batch))
+    while pending:
+        yield from pending.popleft().result()
+
+
+def _ffmpeg_writer(path, width, height, fps):
+    ffmpeg = matplotlib.rcParams["animation.ffmpeg_path"]
+    if shutil.which(ffmpeg) is None:
+        return None
+    cmd = [ffmpeg, "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgba",
+           "-s", f"{width}x{height}", "-r", str(fps), "-i", "-"]
+    if path.endswith(".mp4"):
+        cmd += ["-vcodec", "libx264", "-pix_fmt", "yuv420p"]
+    return subprocess.Popen(cmd + [path], stdin=subprocess.PIPE)
+
+
+def save_animation(animator_args, frames, path, fps=2, workers=None, chunksize=8, **animator_kwargs):
+    """Render `frames` in parallel worker processes and stream them into a GIF or MP4.
+
+    `animator_args` are the positional QueueAnimator arguments (xy, segments).
+    At most two batches of `chunksize` frames per worker are in flight, and
+    frames are piped into ffmpeg as they arrive, in order, so memory stays
+    bounded however many frames there are. Without ffmpeg a GIF is
+    assembled with Pillow instead; Pillow writes a GIF in one call, so that
+    fallback keeps every quantized frame (one byte per pixel) in memory.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(animator_args, animator_kwargs)
+        rendered = map(_render, frames)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(animator_args, animator_kwargs))
+        rendered = _submitted(pool, frames, chunksize, 2 * workers)
+
+    count = 0
+    try:
+        proc = None
+        images = []
+        for image in rendered:
+            if count == 0:
+                proc = _ffmpeg_writer(path, image.shape[1], image.shape[0], fps)
+            if proc is not None:
+                proc.stdin.write(image.tobytes())
+            else:
+                from PIL import Image
+
+                images.append(Image.fromarray(image).convert("RGB").quantize())
+            count += 1
+        if proc is not None:
+            proc.stdin.close()
+            if proc.wait() != 0:
+                raise RuntimeError(f"ffmpeg failed while writing {path}")
+        elif images:
+            images[0].save(path, save_all=True, append_images=images[1:], duration=int(1000 / fps), loop=0)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return count
+
+
+def _time_text(t, label, timestamp_label):
+    # `label` formats numeric times; Timestamps get `timestamp_label`, a float spec would print literally
+    return (label if isinstance(t, numbers.Real) else timestamp_label).format(t)
+
+
+def frames_from_simulation(result, label=TIME_LABEL):
+    # Frames straight from a queue_sim.SimResult: one per sampled instant
+    for t, row in zip(result.times, result.queue):
+        yield label.format(t), row
+
+
+def frames_from_windows(windows, num_nodes, label=TIME_LABEL, timestamp_label=TIMESTAMP_LABEL):
+    # Frames from time_stream.stream_windows; nodes not observed in a window keep their last L
+    L = np.zeros(num_nodes)
+    for w in windows:
+        L[w.nodes] = w.L
+        yield _time_text(w.start, label, timestamp_label), L.copy()
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# Cache location, overridable for CI machines without a home directory
+DEFAULT_CACHE_DIR = os.environ.get(
+    "TRAFFIC_GRAPH_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "traffic_graphs")
+)
+
+# Arrays written for every stored graph, one .npy file each so they can be memory-mapped
+ARRAYS = ("node_ids", "x", "y", "indptr", "indices", "length", "forward")
+FORMAT_VERSION = 1
+
+
+class StoredGraph:
+    """Processed road graph as CSR adjacency plus node coordinate arrays.
+
+    Node i has OSM id `node_ids[i]` and position (`x[i]`, `y[i]`). Its
+    neighbours are `indices[indptr[i]:indptr[i + 1]]` with edge lengths in
+    `length`. Undirected graphs store both directions of every edge;
+    `forward` marks the copy that was in the original edge list.
+    """
+
+    def __init__(self, arrays, meta):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.meta = meta
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return int(self.forward.sum())
+
+    def to_networkx(self):
+        # Rebuilding an osmnx-compatible graph (plot_graph needs crs, x/y and a multigraph)
+        import networkx as nx
+
+        G = nx.MultiGraph() if self.meta.get("undirected", True) else nx.MultiDiGraph()
+        G.graph["crs"] = self.meta.get("crs", "epsg:4326")
+        ids = self.node_ids.tolist()
+        G.add_nodes_from((n, {"x": x, "y": y}) for n, x, y in zip(ids, self.x.tolist(), self.y.tolist()))
+
+        src = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+        keep = np.asarray(self.forward)
+        G.add_edges_from(
+            (ids[u], ids[v], {"length": w})
+            for u, v, w in zip(src[keep].tolist(), self.indices[keep].tolist(), self.length[keep].tolist())
+        )
+        return G
+
+
+def from_networkx(G, weight="length"):
+    """Convert a (Multi)Graph with x/y node attributes into CSR arrays for saving."""
+    node_ids = np.array(list(G.nodes))
+    index = {n: i for i, n in enumerate(G.nodes)}
+    x = np.array([d["x"] for _, d in G.nodes(data=True)], dtype=float)
+    y = np.array([d["y"] for _, d in G.nodes(data=True)], dtype=float)
+
+    edges = list(G.edges(data=weight, default=1.0))
+    u = np.fromiter((index[e[0]] for e in edges), dtype=np.int64, count=len(edges))
+    v = np.fromiter((index[e[1]] for e in edges), dtype=np.int64, count=len(edges))
+    w = np.fromiter((e[2] for e in edges), dtype=float, count=len(edges))
+
+    undirected = not G.is_directed()
+    fwd = np.ones(len(edges), dtype=bool)
+    if undirected:
+        u, v = np.concatenate([u, v]), np.concatenate([v, u])
+        w = np.concatenate([w, w])
+        fwd = np.concatenate([fwd, np.zeros(len(edges), dtype=bool)])
+
+    order = np.argsort(u, kind="stable")
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(u, minlength=len(node_ids)), out=indptr[1:])
+    arrays = {
+        "node_ids": node_ids, "x": x, "y": y, "indptr": indptr,
+        "indices": v[order], "length": w[order], "forward": fwd[order],
+    }
+    meta = {"undirected": undirected, "crs": G.graph.get("crs", "epsg:4326"), "weight": weight}
+    return StoredGraph(arrays, meta)
+
+
+def save(stored, path):
+    # Writing into a temporary directory first so readers never see a half-written graph
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent)
+    try:
+        for name in ARRAYS:
+            np.save(os.path.join(tmp, name + ".npy"), np.asarray(getattr(stored, name)))
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({**stored.meta, "version": FORMAT_VERSION}, f)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def load(path, mmap=True):
+    # Memory-mapping the arrays so opening a large graph costs almost nothing
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta.get("version") != FORMAT_VERSION:
+        raise ValueError(f"unsupported graph store version in {path}")
+    arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r" if mmap else None)
+              for name in ARRAYS}
+    return StoredGraph(arrays, meta)
+
+
+def cache_key(center=None, dist=None, network_type=None, source=None):
+    if source is not None:
+        st = os.stat(source)
+        raw = f"file|{os.path.abspath(source)}|{st.st_size}|{st.st_mtime_ns}"
+    else:
+        raw = f"point|{center[0]:.6f},{center[1]:.6f}|{dist}|{network_type}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def _fetch(center, dist, network_type, source):
+    import osmnx as ox
+
+    if source is None:
+        G = ox.graph_from_point(center, dist=dist, network_type=network_type)
+    elif str(source).endswith(".graphml"):
+        G = ox.load_graphml(source)
+    else:
+        G = ox.graph_from_xml(source)
+    return G.to_undirected()
+
+
+def load_graph(center=None, dist=800, network_type="drive", source=None, cache_dir=None,
+               refresh=False, as_networkx=True):
+    """Load the undirected road graph around `center`, or from a local .osm/.graphml `source`.
+
+    The processed graph is cached on disk under a key of (center, dist,
+    network_type), or of the source file's path, size and mtime, so later
+    runs skip the download and work offline. Returns a networkx MultiGraph,
+    or the memory-mapped StoredGraph when `as_networkx` is False.
+    """
+    if center is None and source is None:
+        raise ValueError("either center or source is required")
+    path = os.path.join(cache_dir or DEFAULT_CACHE_DIR, cache_key(center, dist, network_type, source))
+    if refresh or not os.path.exists(os.path.join(path, "meta.json")):
+        save(from_networkx(_fetch(center, dist, network_type, source)), path)
+    stored = load(path)
+    return stored.to_networkx() if as_networkx else stored
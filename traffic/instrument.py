@@ -0,0 +1,221 @@
+import collections
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+# Off unless TRAFFIC_INSTRUMENT is set (or enable() is called); every hook checks this one flag first
+_enabled = os.environ.get("TRAFFIC_INSTRUMENT", "") not in ("", "0")
+
+# Finished stages as (name, start ns, duration ns, thread id, args) and running counter totals
+_events = []
+_counters = collections.Counter()
+_origin = time.perf_counter_ns()
+
+# Folded call stacks from the sampling profiler, "outer;inner;leaf" -> samples
+_samples = collections.Counter()
+_sampler = None
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    global _origin
+    _events.clear()
+    _counters.clear()
+    _samples.clear()
+    _origin = time.perf_counter_ns()
+
+
+class _Stage:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        _events.append((self.name, self.start - _origin, end - self.start, threading.get_ident(), self.args))
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, **args):
+    """Context manager timing one pipeline stage; `args` are attached to the trace event.
+
+    Disabled, it returns a shared do-nothing context, so the cost is one
+    function call and a flag test.
+    """
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name, args)
+
+
+def count(name, value=1):
+    # Add to a named counter (nodes evaluated, unstable nodes, recomputations, ...)
+    if _enabled:
+        _counters[name] += value
+
+
+def timed(name=None):
+    """Decorator recording every call of a function as a stage."""
+    def wrap(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Stage(label, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return wrap
+
+
+def counters():
+    return dict(_counters)
+
+
+def summary():
+    """Per-stage totals: {name: (calls, total seconds, max seconds)}."""
+    out = {}
+    for name, _, dur, _, _ in _events:
+        calls, total, longest = out.get(name, (0, 0.0, 0.0))
+        out[name] = (calls + 1, total + dur / 1e9, max(longest, dur / 1e9))
+    return out
+
+
+def report(file=None):
+    # Human-readable stage table followed by the counters
+    file = file or sys.stdout
+    print(f"{'stage':<32} {'calls':>7} {'total ms':>11} {'max ms':>10}", file=file)
+    for name, (calls, total, longest) in sorted(summary().items(), key=lambda kv: -kv[1][1]):
+        print(f"{name:<32} {calls:>7} {total * 1e3:>11.3f} {longest * 1e3:>10.3f}", file=file)
+    for name, value in sorted(_counters.items()):
+        print(f"{name:<32} {value:>7}", file=file)
+
+
+def chrome_trace(path):
+    """Write the recorded stages and counters as Chrome trace JSON (chrome://tracing, Perfetto)."""
+    pid = os.getpid()
+    events = [
+        {"name": name, "ph": "X", "ts": start / 1e3, "dur": dur / 1e3, "pid": pid, "tid": tid, "args": args}
+        for name, start, dur, tid, args in _events
+    ]
+    end = max((e["ts"] + e["dur"] for e in events), default=0.0)
+    events += [{"name": name, "ph": "C", "ts": end, "pid": pid, "args": {name: value}}
+               for name, value in _counters.items()]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+
+
+def prometheus(path, prefix="traffic"):
+    """Write stage timings and counters in the Prometheus text exposition format."""
+    lines = [f"# TYPE {prefix}_stage_seconds_total counter", f"# TYPE {prefix}_stage_calls_total counter"]
+    for name, (calls, total, _) in sorted(summary().items()):
+        lines.append(f'{prefix}_stage_seconds_total{{stage="{name}"}} {total:.9f}')
+        lines.append(f'{prefix}_stage_calls_total{{stage="{name}"}} {calls}')
+    for name, value in sorted(_counters.items()):
+        metric = f"{prefix}_{name}_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+class _Sampler(threading.Thread):
+    # Periodically records the target thread's Python stack
+    def __init__(self, thread_id, interval):
+        super().__init__(name="instrument-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                _samples[";".join(reversed(stack))] += 1
+
+
+def start_sampling(interval=0.005, thread=None):
+    """Opt-in statistical profiler: sample the calling (or given) thread every `interval` seconds."""
+    global _sampler
+    stop_sampling()
+    _sampler = _Sampler((thread or threading.current_thread()).ident, interval)
+    _sampler.start()
+
+
+def stop_sampling():
+    global _sampler
+    if _sampler is not None:
+        _sampler.stopped.set()
+        _sampler.join()
+        _sampler = None
+
+
+def write_folded(path):
+    # Sampled stacks in the folded format read by flamegraph.pl and speedscope
+    with open(path, "w") as f:
+        for stack, n in _samples.most_common():
+            f.write(f"{stack} {n}\n")
+
+
+def start_from_env():
+    """Script start: TRAFFIC_PROFILE=1 (or a sampling interval in seconds) enables everything plus sampling."""
+    value = os.environ.get("TRAFFIC_PROFILE", "")
+    if value in ("", "0"):
+        return
+    enable()
+    try:
+        interval = float(value)
+    except ValueError:
+        interval = 0.005
+    start_sampling(interval if 0 < interval < 1 else 0.005)
+
+
+def finish(name, out_dir="."):
+    """Script end: print the stage table and write <name>_trace.json, <name>.prom and <name>.folded."""
+    if not _enabled:
+        return
+    stop_sampling()
+    report()
+    chrome_trace(os.path.join(out_dir, f"{name}_trace.json"))
+    prometheus(os.path.join(out_dir, f"{name}.prom"))
+    if _samples:
+        write_folded(os.path.join(out_dir, f"{name}.folded"))
@@ -0,0 +1,145 @@
+import collections
+
+import numpy as np
+
+from . import instrument
+from .mmc_batch import mmc_metrics
+
+# Solution of an open Jackson network, per-node arrays in graph order
+#   lam: effective arrival rate from λ = γ + Pᵀλ, L/Lq/W/Wq: M/M/c metrics at that rate,
+#   sojourn: expected time from entering at the node until leaving the network,
+#   total_L: vehicles in the network, mean_sojourn: total_L / Σγ (Little's law)
+JacksonResult = collections.namedtuple(
+    "JacksonResult", ["lam", "L", "Lq", "W", "Wq", "sojourn", "total_L", "throughput", "mean_sojourn"]
+)
+
+
+class JacksonNetwork:
+    """Open Jackson network of M/M/c intersections on a CSRGraph.
+
+    `gamma` is the external arrival rate per node and `edge_prob` the
+    probability that a vehicle leaving the tail of an edge takes it
+    (default: CSRGraph.routing_probabilities with `exit_prob`); whatever is
+    left over at a node leaves the network. I - P is LU-factorized once;
+    routing changes on a few nodes are applied as a low-rank (Woodbury)
+    correction until more than `max_rank` rows differ from the factorized
+    matrix, which triggers a refactorization.
+    """
+
+    def __init__(self, graph, gamma, mu, lanes=1, edge_prob=None, exit_prob=0.1, max_rank=32):
+        n = graph.num_nodes
+        self.graph = graph
+        self.gamma = np.broadcast_to(np.asarray(gamma, dtype=float), (n,)).copy()
+        self.mu = np.broadcast_to(np.asarray(mu, dtype=float), (n,)).copy()
+        self.lanes = np.broadcast_to(np.asarray(lanes, dtype=int), (n,)).copy()
+        if edge_prob is None:
+            edge_prob = graph.routing_probabilities(exit_prob=exit_prob)
+        self.prob = np.asarray(edge_prob, dtype=float).copy()
+        self._check_rows(np.arange(n))
+        self.max_rank = max_rank
+        self._factorize()
+
+    def _check_rows(self, rows):
+        out = np.bincount(self.graph.sources, weights=self.prob, minlength=self.graph.num_nodes)[rows]
+        if np.any(self.prob < 0) or np.any(out > 1.0 + 1e-9):
+            raise ValueError("routing probabilities must be >= 0 and sum to at most 1 per node")
+
+    def _matrix(self, prob):
+        from scipy import sparse
+
+        n = self.graph.num_nodes
+        P = sparse.csr_matrix((prob, self.graph.targets, self.graph.offsets), shape=(n, n), copy=True)
+        P.sum_duplicates()
+        return P
+
+    def _factorize(self):
+        from scipy import sparse
+        from scipy.sparse.linalg import splu
+
+        instrument.count("jackson_factorizations")
+        with instrument.stage("jackson_factorize"):
+            A = sparse.identity(self.graph.num_nodes, format="csc") - self._matrix(self.prob).tocsc()
+            self._lu = splu(A)
+        self._factored_prob = self.prob.copy()
+        self._rows = np.empty(0, dtype=np.int64)  # rows of P that differ from the factorized matrix
+
+    def _delta(self):
+        # Changed rows of P as a dense (rank, n) block D, so that P = P_factored + E D
+        rows = self._rows
+        D = np.zeros((len(rows), self.graph.num_nodes))
+        offsets, targets = self.graph.offsets, self.graph.targets
+        for k, r in enumerate(rows.tolist()):
+            lo, hi = offsets[r], offsets[r + 1]
+            np.add.at(D[k], targets[lo:hi], self.prob[lo:hi] - self._factored_prob[lo:hi])
+        return D
+
+    def solve_traffic(self, gamma=None):
+        """Effective arrival rates λ solving (I - Pᵀ) λ = γ under the current routing."""
+        gamma = self.gamma if gamma is None else np.asarray(gamma, dtype=float)
+        lam = self._lu.solve(gamma, trans="T")
+        if self._rows.size:
+            # (Aᵀ - Dᵀ Eᵀ)⁻¹ by Woodbury: a rank-sized dense system next to the stored LU
+            D = self._delta()
+            Z = self._lu.solve(np.ascontiguousarray(D.T), trans="T")  # A⁻ᵀ Dᵀ
+            S = np.eye(len(self._rows)) - Z[self._rows]
+            lam = lam + Z @ np.linalg.solve(S, lam[self._rows])
+        return lam
+
+    def visits(self, values):
+        """(I - P)⁻¹ values: per entry node, the sum of `values` over the nodes a vehicle passes."""
+        values = np.asarray(values, dtype=float)
+        s = self._lu.solve(values)
+        if self._rows.size:
+            # (A - E D)⁻¹: E picks the changed rows, so A⁻¹E is the matching columns of A⁻¹
+            D = self._delta()
+            E = np.zeros((self.graph.num_nodes, len(self._rows)))
+            E[self._rows, np.arange(len(self._rows))] = 1.0
+            Y = self._lu.solve(E)  # A⁻¹ E
+            S = np.eye(len(self._rows)) - D @ Y
+            s = s + Y @ np.linalg.solve(S, D @ s)
+        return s
+
+    def update_routing(self, edges, prob):
+        """Set new probabilities for edge ids `edges`; later solves apply them incrementally.
+
+        Rows whose probabilities changed are tracked against the last
+        factorization; beyond `max_rank` of them the LU is rebuilt.
+        """
+        edges = np.asarray(edges, dtype=np.int64)
+        self.prob[edges] = prob
+        rows = np.unique(self.graph.sources[edges])
+        self._check_rows(rows)
+        self._rows = np.union1d(self._rows, rows)
+        if self._rows.size > self.max_rank:
+            self._factorize()
+        instrument.count("jackson_routing_updates")
+
+    def edge_ids(self, u, v):
+        # Edge ids for (u, v) node-name pairs; the first matching edge when there are parallel roads
+        g = self.graph
+        ids = []
+        for a, b in zip(u, v):
+            i, j = g.index[a], g.index[b]
+            hits = np.flatnonzero(g.targets[g.offsets[i]:g.offsets[i + 1]] == j)
+            if not hits.size:
+                raise KeyError(f"no edge {a!r} -> {b!r}")
+            ids.append(g.offsets[i] + hits[0])
+        return np.array(ids, dtype=np.int64)
+
+    def solve(self):
+        """Effective λ, per-node L and W, and network-wide sojourn times in one pass."""
+        with instrument.stage("jackson_solve"):
+            lam = self.solve_traffic()
+            res = mmc_metrics(lam, self.mu, self.lanes)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                W = np.where(np.isinf(res.Wq), np.inf, res.Wq + 1.0 / self.mu)
+            W = np.where(lam > 0, W, 1.0 / self.mu)
+            unstable = np.isinf(W)
+            sojourn = self.visits(np.where(unstable, 0.0, W))
+            if unstable.any():
+                reaches = self.visits(unstable.astype(float)) > 1e-12
+                sojourn = np.where(reaches, np.inf, sojourn)
+        total_L = float(res.L.sum())
+        throughput = float(self.gamma.sum())
+        mean_sojourn = total_L / throughput if throughput > 0 else 0.0
+        return JacksonResult(lam, res.L, res.Lq, W, res.Wq, sojourn, total_L, throughput, mean_sojourn)
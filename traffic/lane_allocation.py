@@ -0,0 +1,156 @@
+import collections
+import heapq
+
+import numpy as np
+
+from .mmc_batch import mmc_metrics
+
+# Result of a capacity allocation
+#   extra: increments given to each unit (node, or node x window cell), spent: increments used,
+#   before/after: network objective (total L or total waiting Lq) before and after the allocation
+Allocation = collections.namedtuple("Allocation", ["extra", "spent", "before", "after"])
+
+
+class LaneAllocator:
+    """Spread a budget of extra lanes or service rate over intersections and time windows.
+
+    `lam` has shape (nodes,) or (nodes, windows); `mu` and `lanes` broadcast
+    against it. With `unit="lanes"` one increment adds a lane, with
+    `unit="mu"` it adds `step` to the per-lane service rate. When
+    `per_window` is False an increment applies to a node in every window
+    (a physical lane), otherwise each (node, window) cell is its own unit
+    (signal timing). The objective is total L, or total queue waiting (Lq)
+    with `objective="wait"`.
+    """
+
+    def __init__(self, lam, mu, lanes=1, unit="lanes", step=1.0, per_window=True, objective="L"):
+        lam = np.asarray(lam, dtype=float)
+        if lam.ndim == 1:
+            lam = lam[:, None]
+        mu = np.broadcast_to(np.asarray(mu, dtype=float).reshape(-1, 1) if np.ndim(mu) == 1 else mu, lam.shape)
+        lanes = np.broadcast_to(np.asarray(lanes, dtype=int).reshape(-1, 1) if np.ndim(lanes) == 1 else lanes,
+                                lam.shape)
+        self.shape = lam.shape
+        if per_window:
+            lam, mu, lanes = (a.reshape(-1, 1) for a in (lam, mu, lanes))
+        self.lam, self.mu, self.lanes = lam, np.ascontiguousarray(mu), np.ascontiguousarray(lanes)
+        self.unit, self.step, self.per_window = unit, step, per_window
+        self.field = "Lq" if objective == "wait" else "L"
+
+    def cost(self, extra, rows=None):
+        # Objective per unit (summed over its windows) after `extra` increments
+        sel = slice(None) if rows is None else rows
+        k = np.asarray(extra).reshape(-1, 1)
+        lam, mu, lanes = self.lam[sel], self.mu[sel], self.lanes[sel]
+        if self.unit == "lanes":
+            res = mmc_metrics(lam, mu, lanes + k)
+        else:
+            res = mmc_metrics(lam, mu + k * self.step, lanes)
+        return getattr(res, self.field).sum(axis=1)
+
+    def stabilizing_extra(self):
+        # Smallest number of increments that makes every window of a unit stable (inf if impossible)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if self.unit == "lanes":
+                need = np.floor(self.lam / self.mu) + 1 - self.lanes
+            else:
+                need = np.floor((self.lam / self.lanes - self.mu) / self.step) + 1
+        need = np.where(self.lam > 0, need, 0)
+        need = np.nan_to_num(need, nan=np.inf)
+        return np.maximum(need, 0).max(axis=1)
+
+    def allocate(self, budget, max_extra=None, exact=False):
+        """Allocate `budget` increments to minimise the network objective.
+
+        Unstable units are stabilised first, cheapest first, skipping any that
+        would need more than `max_extra` increments. The rest of the
+        budget goes by greedy marginal gain from a priority queue, which is
+        optimal because the M/M/c delay is convex in the lanes and in μ. If
+        the gains are found not to diminish, or `exact` is set, a
+        dynamic-programming knapsack over the candidate units is used instead.
+        """
+        n = self.lam.shape[0]
+        extra = np.zeros(n, dtype=np.int64)
+        before = float(self.cost(extra).sum())
+
+        need = self.stabilizing_extra()
+        if max_extra is not None:
+            need = np.where(need > max_extra, np.inf, need)  # cannot be stabilised within max_extra
+        fixable = np.flatnonzero((need > 0) & np.isfinite(need))
+        order = fixable[np.argsort(need[fixable], kind="stable")]
+        affordable = order[np.cumsum(need[order]) <= budget]
+        extra[affordable] = need[affordable].astype(np.int64)
+        remaining = int(budget - extra.sum())
+
+        stable = np.isfinite(need) & (extra >= need)
+        if remaining > 0 and stable.any():
+            if max_extra is not None:
+                stable &= extra < max_extra  # units already at the limit cannot take another increment
+            units = np.flatnonzero(stable)
+            base = self.cost(extra[units], units)
+            gain = base - self.cost(extra[units] + 1, units)
+            # Only units whose first gain ranks in the top `remaining` can ever be picked
+            if len(units) > remaining:
+                top = np.argpartition(-gain, remaining - 1)[:remaining]
+                units, base, gain = units[top], base[top], gain[top]
+
+            if exact or not self._diminishing(units, extra):
+                extra[units] += self._exact(units, extra, remaining, max_extra)
+            else:
+                extra[units] += self._greedy(units, extra, base, gain, remaining, max_extra)
+
+        spent = int(extra.sum())
+        after = float(self.cost(extra).sum())
+        return Allocation(extra.reshape(self.shape) if self.per_window else extra, spent, before, after)
+
+    def _greedy(self, units, extra, base, gain, budget, max_extra):
+        given = np.zeros(len(units), dtype=np.int64)
+        current = base.copy()
+        heap = [(-g, i) for i, g in enumerate(gain.tolist()) if g > 0]
+        heapq.heapify(heap)
+        while budget > 0 and heap:
+            neg, i = heapq.heappop(heap)
+            given[i] += 1
+            budget -= 1
+            current[i] += neg
+            k = extra[units[i]] + given[i]
+            if max_extra is None or k < max_extra:
+                nxt = current[i] - float(self.cost([k + 1], units[i:i + 1])[0])
+                if nxt > 0:
+                    heapq.heappush(heap, (-nxt, i))
+        return given
+
+    def _diminishing(self, units, extra, probe=3, sample=1024):
+        # Checking convexity on the first few increments of a sample of the candidate units
+        if len(units) > sample:
+            units = np.random.default_rng(0).choice(units, sample, replace=False)
+        k0 = extra[units]
+        costs = np.stack([self.cost(k0 + k, units) for k in range(probe + 2)])
+        gains = -np.diff(costs, axis=0)
+        return bool(np.all(gains[1:] <= gains[:-1] + 1e-9 * np.abs(gains[:-1]) + 1e-12))
+
+    def _exact(self, units, extra, budget, max_extra):
+        # Multiple-choice knapsack: dp[b] = best total gain using b increments on the units so far
+        K = budget if max_extra is None else min(budget, max_extra)
+        k0 = extra[units]
+        costs = np.stack([self.cost(k0 + k, units) for k in range(K + 1)], axis=1)
+        gains = costs[:, :1] - costs  # total gain of giving k increments, per unit
+        if max_extra is not None:
+            gains[k0[:, None] + np.arange(K + 1) > max_extra] = -np.inf
+        dp = np.zeros(budget + 1)
+        choice = np.zeros((len(units), budget + 1), dtype=np.int64)
+        for i in range(len(units)):
+            best = dp.copy()
+            for k in range(1, K + 1):
+                cand = np.full(budget + 1, -np.inf)
+                cand[k:] = dp[:-k] + gains[i, k]
+                better = cand > best
+                best[better] = cand[better]
+                choice[i, better] = k
+            dp = best
+        given = np.zeros(len(units), dtype=np.int64)
+        b = int(np.argmax(dp))
+        for i in range(len(units) - 1, -1, -1):
+            given[i] = choice[i, b]
+            b -= given[i]
+        return given
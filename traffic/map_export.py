@@ -0,0 +1,204 @@
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+TILE_PX = 256
+
+# Client side: loads the per-zoom tile scripts covering the viewport and draws them on one canvas
+_SCRIPT = """
+{% macro script(this, kwargs) %}
+(function() {
+    var map = {{ this._parent.get_name() }};
+    var meta = {{ this.meta }};
+    var renderer = L.canvas({padding: 0.5});
+    var layers = {}, requested = {}, have = {};
+    for (var k in meta.tiles) have[k] = new Set(meta.tiles[k]);
+    var shown = null;
+
+    function color(d, i) {
+        var share = d.c[i] / d.n[i];
+        return share > 0.5 ? "#d7301f" : (share > 0 ? "#fc8d59" : "#1a9850");
+    }
+    function fmt(v) { return v === null ? "inf" : v; }
+
+    window.queueTile = function(z, x, y, d) {
+        var group = layers[z] || (layers[z] = L.layerGroup());
+        for (var i = 0; i < d.lat.length; i++) {
+            var single = d.n[i] === 1;
+            var text = single
+                ? "Node " + d.node[i] + "<br>L = " + fmt(d.L[i])
+                : d.n[i] + " nodes<br>mean L = " + fmt(d.L[i]) + "<br>max L = " + fmt(d.maxL[i])
+                  + "<br>congested: " + d.c[i];
+            L.circleMarker([d.lat[i], d.lon[i]], {
+                renderer: renderer, radius: single ? 5 : Math.min(4 + 2.5 * Math.log2(d.n[i]), 24),
+                color: color(d, i), weight: 1, fillOpacity: 0.7
+            }).bindPopup(text).addTo(group);
+        }
+    };
+
+    function refresh() {
+        var z = Math.max(meta.min_zoom, Math.min(meta.max_zoom, map.getZoom()));
+        if (shown !== z) {
+            if (shown !== null && layers[shown]) map.removeLayer(layers[shown]);
+            shown = z;
+            (layers[z] || (layers[z] = L.layerGroup())).addTo(map);
+        }
+        var b = map.getBounds(), s = Math.pow(2, z);
+        var nw = map.project(b.getNorthWest(), z).divideBy(256).floor();
+        var se = map.project(b.getSouthEast(), z).divideBy(256).floor();
+        for (var x = nw.x; x <= se.x; x++) {
+            for (var y = nw.y; y <= se.y; y++) {
+                var key = z + "/" + x + "/" + y;
+                if (requested[key] || !have[z] || !have[z].has(x * s + y)) continue;
+                requested[key] = true;
+                var tag = document.createElement("script");
+                tag.src = meta.root + "/" + key + ".js";
+                document.head.appendChild(tag);
+            }
+        }
+    }
+    map.on("moveend", refresh);
+    refresh();
+})();
+{% endmacro %}
+"""
+
+
+def _mercator(lon, lat):
+    # Web-mercator position in [0, 1) x [0, 1)
+    x = (np.asarray(lon, dtype=float) + 180.0) / 360.0
+    s = np.sin(np.radians(np.clip(lat, -85.0511, 85.0511)))
+    y = 0.5 - np.log((1 + s) / (1 - s)) / (4 * np.pi)
+    return np.clip(x, 0, np.nextafter(1, 0)), np.clip(y, 0, np.nextafter(1, 0))
+
+
+def aggregate(lon, lat, L, zoom, cell_px=48, threshold=8.0, nodes=None):
+    """Cluster nodes into `cell_px`-pixel screen cells at one zoom level.
+
+    Returns one row per non-empty cell: centroid (lat, lon), node count n,
+    mean of the finite L values, max L, congested count c (L infinite or
+    above `threshold`) and the slippy tile the cell falls in. The number of
+    rows is bounded by the number of cells, not by the number of nodes.
+    With `cell_px=None` every node is its own row (the detail level).
+    """
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    L = np.asarray(L, dtype=float)
+    mx, my = _mercator(lon, lat)
+    world = (1 << zoom) * TILE_PX
+    px, py = (mx * world).astype(np.int64), (my * world).astype(np.int64)
+    tile = (px // TILE_PX) * (1 << zoom) + py // TILE_PX
+    congested = ~np.isfinite(L) | (L > threshold)
+
+    if cell_px is None:
+        frame = pd.DataFrame({"lat": lat, "lon": lon, "n": 1, "L": L, "maxL": L,
+                              "c": congested.astype(np.int64), "tile": tile})
+        if nodes is not None:
+            frame["node"] = np.asarray(nodes)
+        return frame
+
+    cells = world // cell_px
+    code = (px // cell_px) * cells + py // cell_px
+    uniq, first, inv = np.unique(code, return_index=True, return_inverse=True)
+    n = np.bincount(inv)
+    finite = np.isfinite(L)
+    n_finite = np.bincount(inv, weights=finite)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_L = np.bincount(inv, weights=np.where(finite, L, 0.0)) / n_finite
+    mean_L[n_finite == 0] = np.inf
+    max_L = np.full(len(uniq), -np.inf)
+    np.maximum.at(max_L, inv, L)
+    return pd.DataFrame({
+        "lat": np.bincount(inv, weights=lat) / n,
+        "lon": np.bincount(inv, weights=lon) / n,
+        "n": n,
+        "L": mean_L,
+        "maxL": max_L,
+        "c": np.bincount(inv, weights=congested).astype(np.int64),
+        "tile": tile[first],
+    })
+
+
+def _column(values, digits):
+    # JSON-safe list: rounded floats, None for inf / NaN (unstable queues)
+    if values.dtype.kind in "iu":
+        return values.tolist()
+    return [v if math.isfinite(v) else None for v in np.round(values.astype(float), digits).tolist()]
+
+
+def _payload(frame):
+    data = {"lat": _column(frame["lat"].to_numpy(), 6), "lon": _column(frame["lon"].to_numpy(), 6),
+            "n": frame["n"].tolist(), "L": _column(frame["L"].to_numpy(), 2),
+            "maxL": _column(frame["maxL"].to_numpy(), 2), "c": frame["c"].tolist()}
+    if "node" in frame:
+        data["node"] = [str(v) for v in frame["node"].tolist()]
+    return data
+
+
+def to_geojson(frame):
+    """One aggregation level as a GeoJSON FeatureCollection (for other GIS tools)."""
+    data = _payload(frame)
+    props = [k for k in data if k not in ("lat", "lon")]
+    features = [
+        {"type": "Feature",
+         "geometry": {"type": "Point", "coordinates": [data["lon"][i], data["lat"][i]]},
+         "properties": {k: data[k][i] for k in props}}
+        for i in range(len(frame))
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def export_map(lon, lat, L, out_dir, nodes=None, center=None, min_zoom=10, max_zoom=17, detail_zoom=16,
+               cell_px=48, threshold=8.0, zoom_start=None, geojson=False, html="index.html"):
+    """Write a folium map whose node layer is split into per-zoom, per-tile data files.
+
+    Zoom levels below `detail_zoom` hold cell clusters precomputed here, so
+    their size depends on the map extent, not on the node count; from
+    `detail_zoom` up every node is drawn individually, still only for the
+    tiles in view. The browser fetches just the tiles it is looking at and
+    draws them on a single canvas. Styling follows week 7: colour by the
+    share of congested nodes, radius by cluster size. With `geojson` each
+    level is also written as one GeoJSON file. Returns the HTML path.
+    """
+    import folium
+    from branca.element import MacroElement, Template
+
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    tiles_dir = os.path.join(out_dir, "tiles")
+    index = {}
+    for z in range(min_zoom, max_zoom + 1):
+        detail = z >= detail_zoom
+        frame = aggregate(lon, lat, L, z, None if detail else cell_px, threshold, nodes if detail else None)
+        index[z] = np.unique(frame["tile"].to_numpy()).tolist()
+        for tile, part in frame.groupby("tile", sort=False):
+            x, y = divmod(int(tile), 1 << z)
+            path = os.path.join(tiles_dir, str(z), str(x))
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, f"{y}.js"), "w") as f:
+                f.write(f"queueTile({z},{x},{y},{json.dumps(_payload(part), separators=(',', ':'))});\n")
+        if geojson:
+            with open(os.path.join(out_dir, f"z{z}.geojson"), "w") as f:
+                json.dump(to_geojson(frame), f, separators=(",", ":"))
+
+    if center is None:
+        center = (float(np.mean(lat)), float(np.mean(lon)))
+    m = folium.Map(location=center, zoom_start=zoom_start or min_zoom + 2, prefer_canvas=True)
+    layer = MacroElement()
+    layer._template = Template(_SCRIPT)
+    layer.meta = json.dumps({"root": "tiles", "min_zoom": min_zoom, "max_zoom": max_zoom,
+                             "tiles": {str(z): t for z, t in index.items()}}, separators=(",", ":"))
+    m.add_child(layer)
+    path = os.path.join(out_dir, html)
+    m.save(path)
+    return path
+
+
+def export_state(G, state, out_dir, **kwargs):
+    # NetworkState + graph with node x/y (lon/lat), e.g. from graph_store.load_graph
+    xs = np.array([G.nodes[n]["x"] for n in state.nodes], dtype=float)
+    ys = np.array([G.nodes[n]["y"] for n in state.nodes], dtype=float)
+    return export_map(xs, ys, state.L, out_dir, nodes=state.nodes, **kwargs)
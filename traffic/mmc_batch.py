@@ -0,0 +1,109 @@
+import collections
+import numpy as np
+
+from . import instrument
+
+# Result of a batched M/M/c evaluation, every field has the broadcast shape of (lam, mu, c)
+MMCResult = collections.namedtuple("MMCResult", ["L", "Lq", "Wq", "P0"])
+
+
+def _erlang_b(a, c, log_sum=False):
+    # Erlang-B recurrence; with log_sum also log S_c, S_c = sum_{k<=c} a^k/k!, from S_k = S_{k-1} / (1 - B(k))
+    a, c = np.broadcast_arrays(np.asarray(a, dtype=float), np.asarray(c, dtype=int))
+    B = np.ones(a.shape)
+    log_S = np.zeros(a.shape) if log_sum else None
+    c_max = int(c.max()) if c.size else 0
+    for k in range(1, c_max + 1):
+        B_next = a * B / (k + a * B)
+        B = np.where(k <= c, B_next, B)  # cells with fewer lanes keep their final value
+        if log_sum:
+            log_S -= np.where(k <= c, np.log1p(-B_next), 0.0)
+    return B, log_S
+
+
+def erlang_b(a, c):
+    """Erlang-B blocking probability via the recurrence B(k) = a*B(k-1) / (k + a*B(k-1)).
+
+    `a` is the offered load λ/μ and `c` the number of servers (lanes); both are
+    broadcast against each other. The recurrence never forms a**c or c!, so it
+    stays accurate for large c.
+    """
+    return _erlang_b(a, c)[0]
+
+
+def mmc_metrics(lam, mu, c):
+    """Evaluate the M/M/c queue for whole arrays of arrival rates, service rates and lanes.
+
+    Returns an MMCResult of arrays (L, Lq, Wq, P0). Unstable cells (λ >= c·μ)
+    get L = Lq = Wq = inf and P0 = 0; cells with λ <= 0 have an empty queue.
+    """
+    lam, mu, c = np.broadcast_arrays(
+        np.asarray(lam, dtype=float), np.asarray(mu, dtype=float), np.asarray(c, dtype=int)
+    )
+    if np.any(c < 1):
+        raise ValueError("number of lanes c must be >= 1")
+
+    idle = lam <= 0
+    unstable = ~idle & (lam >= c * mu)
+    stable = ~idle & ~unstable
+    if instrument.enabled():
+        instrument.count("nodes_evaluated", lam.size)
+        instrument.count("unstable_nodes", int(unstable.sum()))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a = np.where(stable, lam / mu, 0.0)  # offered load λ/μ
+        rho = a / c  # traffic intensity per lane
+        B, log_S = _erlang_b(a, c, log_sum=True)
+        C = B / (1.0 - rho * (1.0 - B))  # Erlang-C: probability an arriving vehicle waits
+        Lq = C * rho / (1.0 - rho)
+        Wq = C / (c * mu - lam)
+        # 1/P0 = S_c · (1 + B·ρ/(1-ρ)); log S_c stays finite where B itself underflows at large c
+        P0 = np.exp(-log_S - np.log1p(B * rho / (1.0 - rho)))
+
+    L = np.where(stable, Lq + a, np.where(unstable, np.inf, 0.0))
+    Lq = np.where(stable, Lq, np.where(unstable, np.inf, 0.0))
+    Wq = np.where(stable, Wq, np.where(unstable, np.inf, 0.0))
+    P0 = np.where(stable, P0, np.where(unstable, 0.0, 1.0))
+    return MMCResult(L, Lq, Wq, P0)
+
+
+# Analytic sensitivities of L, broadcast like mmc_metrics
+#   dL_dlam, dL_dmu: partial derivatives; dL_lane: L(c + 1) - L(c), the change from one more lane
+MMCGradient = collections.namedtuple("MMCGradient", ["L", "dL_dlam", "dL_dmu", "dL_lane"])
+
+
+def mmc_gradients(lam, mu, c):
+    """∂L/∂λ, ∂L/∂μ and the one-extra-lane difference of the M/M/c queue length.
+
+    Uses dB/da = B (c/a - 1 + B) for the Erlang-B term and the chain rule
+    through Erlang-C and Lq, so every cell costs one extra pass over the
+    same arrays instead of two perturbed evaluations. Unstable cells get
+    dL/dλ = inf and dL/dμ = -inf; idle cells (λ <= 0) get the λ → 0 limit
+    1/μ and 0.
+    """
+    lam, mu, c = np.broadcast_arrays(
+        np.asarray(lam, dtype=float), np.asarray(mu, dtype=float), np.asarray(c, dtype=int)
+    )
+    base = mmc_metrics(lam, mu, c)
+    idle = lam <= 0
+    unstable = ~idle & np.isinf(base.L)
+    stable = ~idle & ~unstable
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        a = np.where(stable, lam / mu, 1.0)
+        rho = a / c
+        B = erlang_b(a, c)
+        dB = B * (c / a - 1.0 + B)
+        D = 1.0 - rho * (1.0 - B)  # Erlang-C denominator, C = B / D
+        C = B / D
+        dC = (dB * D - B * ((B - 1.0) / c + rho * dB)) / (D * D)
+        dL_da = dC * rho / (1.0 - rho) + C / (c * (1.0 - rho) ** 2) + 1.0
+        dL_dlam = dL_da / mu
+        dL_dmu = -dL_da * a / mu
+
+    dL_dlam = np.where(stable, dL_dlam, np.where(unstable, np.inf, 1.0 / mu))
+    dL_dmu = np.where(stable, dL_dmu, np.where(unstable, -np.inf, 0.0))
+    with np.errstate(invalid="ignore"):
+        dL_lane = mmc_metrics(lam, mu, c + 1).L - base.L
+    dL_lane = np.where(np.isnan(dL_lane), 0.0, dL_lane)  # inf - inf: still unstable with the extra lane
+    return MMCGradient(base.L, dL_dlam, dL_dmu, dL_lane)
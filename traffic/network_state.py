@@ -0,0 +1,179 @@
+import collections
+import numpy as np
+
+from . import instrument
+from .core import improvement
+from .mmc_batch import mmc_metrics
+
+# Column names used by the week 4/5 tables
+NODE_COL = "Node"
+LAMBDA_COL = "λ (Arrival Rate)"
+MU_COL = "μ (Service Rate)"
+L_COL = "Queue Length (L)"
+CONGESTION_COL = "Congestion?"
+
+# Nodes whose congestion flag flipped during an incremental update
+CongestionDiff = collections.namedtuple("CongestionDiff", ["congested", "cleared"])
+
+
+class NetworkState:
+    """Columnar λ/μ/lanes/L state for every intersection of a network.
+
+    Node names map to a fixed integer position through `index`; every metric
+    lives in a contiguous NumPy array in that order. λ, μ and L share one
+    (3, n) float block so `to_frame()` can wrap them without copying.
+    An optional QueueCache memoizes the M/M/c evaluations.
+    """
+
+    def __init__(self, nodes, lam, mu, lanes=None, cache=None):
+        self.cache = cache
+        self.nodes = np.asarray(list(nodes), dtype=object)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        n = len(self.nodes)
+
+        self._values = np.zeros((3, n))  # rows: λ, μ, L
+        self.lam, self.mu, self.L = self._values
+        self.lam[:] = lam
+        self.mu[:] = mu
+        self.lanes = np.broadcast_to(np.asarray(1 if lanes is None else lanes, dtype=int), (n,)).copy()
+        self.congested = np.zeros(n, dtype=bool)
+        self.recompute()
+
+    @property
+    def total_L(self):
+        # Network-wide L, infinite as soon as one node is unstable
+        return np.inf if self.congested_count else self.finite_L_total
+
+    @classmethod
+    def from_dicts(cls, nodes, lambda_values, mu_values, lanes=None, cache=None):
+        # Building from the per-node dicts used in the weekly scripts
+        nodes = list(nodes)
+        lam = np.fromiter((lambda_values[n] for n in nodes), dtype=float, count=len(nodes))
+        mu = np.fromiter((mu_values[n] for n in nodes), dtype=float, count=len(nodes))
+        if isinstance(lanes, dict):
+            lanes = np.fromiter((lanes.get(n, 1) for n in nodes), dtype=int, count=len(nodes))
+        return cls(nodes, lam, mu, lanes, cache)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def positions(self, nodes):
+        # Integer positions for a list of node names
+        return np.fromiter((self.index[n] for n in nodes), dtype=np.intp, count=len(nodes))
+
+    def evaluate(self, lam, mu, lanes):
+        # M/M/c metrics through the cache when one is attached
+        if self.cache is None:
+            return mmc_metrics(lam, mu, lanes)
+        return self.cache.mmc_metrics(lam, mu, lanes)
+
+    def recompute(self):
+        # Whole-network refresh in one vectorized pass (lanes = 1 is the week 4/5 M/M/1 model)
+        instrument.count("full_recomputations")
+        self.L[:] = self.evaluate(self.lam, self.mu, self.lanes).L
+        np.isinf(self.L, out=self.congested)
+        # Aggregates are rebuilt from scratch here, which also clears any drift from update()
+        self.congested_count = int(self.congested.sum())
+        self.finite_L_total = float(self.L[~self.congested].sum())
+        return self
+
+    def update(self, nodes, lam=None, mu=None, lanes=None):
+        """Apply new λ/μ/lanes to a batch of nodes and refresh only those nodes.
+
+        The network aggregates are adjusted by the changed nodes' contributions,
+        so a tick costs O(len(nodes)) rather than O(N). Returns a
+        CongestionDiff with the node names that became congested or cleared.
+        """
+        return self.update_at(self.positions(nodes), lam, mu, lanes)
+
+    def update_at(self, idx, lam=None, mu=None, lanes=None):
+        # update() for integer node positions, as produced by the ingestion stage
+        idx = np.asarray(idx, dtype=np.intp)
+        if lam is not None:
+            self.lam[idx] = lam
+        if mu is not None:
+            self.mu[idx] = mu
+        if lanes is not None:
+            self.lanes[idx] = lanes
+        return self._refresh(idx)
+
+    def _refresh(self, idx):
+        # Positions may repeat within a batch; only the last write matters
+        idx = np.unique(idx)
+        instrument.count("incremental_updates")
+        old_L = self.L[idx]
+        old_flags = self.congested[idx]
+        new_L = self.evaluate(self.lam[idx], self.mu[idx], self.lanes[idx]).L
+        new_flags = np.isinf(new_L)
+
+        self.finite_L_total += float(new_L[~new_flags].sum() - old_L[~old_flags].sum())
+        self.congested_count += int(new_flags.sum()) - int(old_flags.sum())
+        self.L[idx] = new_L
+        self.congested[idx] = new_flags
+
+        flipped = new_flags != old_flags
+        return CongestionDiff(
+            congested=self.nodes[idx[flipped & new_flags]].tolist(),
+            cleared=self.nodes[idx[flipped & ~new_flags]].tolist(),
+        )
+
+    def to_frame(self, columns=(LAMBDA_COL, MU_COL, L_COL)):
+        """Table view of the state; the λ, μ and L columns share memory with the arrays."""
+        import pandas as pd
+
+        df = pd.DataFrame(self._values.T, columns=list(columns), copy=False)
+        df.insert(0, NODE_COL, self.nodes)
+        df[CONGESTION_COL] = np.where(self.congested, "Yes", "No")
+        return df
+
+
+class StateComparison:
+    """Before/after comparison of two NetworkStates over the same nodes (week 6).
+
+    Infinite queue lengths are replaced by `cap` before comparing, as in the
+    week 6 plots; `cap=None` keeps them infinite. Updating either side only
+    touches the changed nodes and keeps the network improvement % current.
+    """
+
+    def __init__(self, before, after, cap=None):
+        if list(before.nodes) != list(after.nodes):
+            raise ValueError("before and after states must list the same nodes in the same order")
+        self.before = before
+        self.after = after
+        self.cap = cap
+        self.L_before = self._capped(before.L)
+        self.L_after = self._capped(after.L)
+        self.improvement = improvement(self.L_before, self.L_after)
+
+    def _capped(self, L):
+        return L.copy() if self.cap is None else np.where(np.isinf(L), self.cap, L)
+
+    def _total(self, state):
+        # Summed (capped) L, read off the state's incrementally maintained aggregates
+        if self.cap is None:
+            return state.total_L
+        return state.finite_L_total + self.cap * state.congested_count
+
+    @property
+    def total_before(self):
+        return self._total(self.before)
+
+    @property
+    def total_after(self):
+        return self._total(self.after)
+
+    @property
+    def total_improvement(self):
+        # Network-wide improvement % of the summed (capped) queue lengths
+        return float(improvement(self.total_before, self.total_after))
+
+    def update(self, nodes, lam=None, mu=None, lanes=None, side="after"):
+        # Pushing new rates into one side and refreshing the affected rows only
+        state = self.after if side == "after" else self.before
+        diff = state.update(nodes, lam=lam, mu=mu, lanes=lanes)
+        idx = np.unique(state.positions(nodes))
+
+        target = self.L_after if side == "after" else self.L_before
+        target[idx] = self._capped(state.L[idx])
+        self.improvement[idx] = improvement(self.L_before[idx], self.L_after[idx])
+        return diff
@@ -0,0 +1,223 @@
+import collections
+import os
+import sqlite3
+
+import numpy as np
+
+from . import instrument
+from .mmc_batch import MMCResult, mmc_metrics
+
+# Default on-disk tier location, used when QueueCache(path=True)
+DEFAULT_CACHE_PATH = os.environ.get(
+    "TRAFFIC_QUEUE_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "traffic_queue.sqlite")
+)
+
+# Hit/miss counters since the cache was created (or last cleared); lookups count distinct keys per call
+CacheStats = collections.namedtuple(
+    "CacheStats", ["hits", "misses", "disk_hits", "evictions", "size", "maxsize", "hit_rate"]
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mmc (
+    scale INTEGER, lam INTEGER, mu INTEGER, c INTEGER,
+    L REAL, Lq REAL, Wq REAL, P0 REAL,
+    PRIMARY KEY (scale, lam, mu, c)
+) WITHOUT ROWID
+"""
+
+
+def _unique_rows(keys):
+    # Distinct rows of an (n, 3) int64 key array plus the inverse map; lexsort is several
+    # times faster than np.unique(axis=0)
+    order = np.lexsort(keys.T[::-1])
+    ordered = keys[order]
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = np.any(ordered[1:] != ordered[:-1], axis=1)
+    inverse = np.empty(len(keys), dtype=np.intp)
+    inverse[order] = np.cumsum(first) - 1
+    return ordered[first], inverse
+
+
+class QueueCache:
+    """Memoized M/M/1 and M/M/c evaluation keyed on quantized (λ, μ, c).
+
+    Rates are rounded to `decimals` places and stored as integers, so
+    intersections whose rates agree after rounding share one entry, and every
+    result is the one for the rounded rates. At most `maxsize` keys are kept
+    in memory, least recently used first out. `path` adds an SQLite tier that
+    survives across runs (`True` for DEFAULT_CACHE_PATH); memory misses are
+    looked up there before being computed.
+    """
+
+    def __init__(self, maxsize=65536, decimals=4, path=None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self.maxsize = maxsize
+        self.decimals = decimals
+        self.scale = 10 ** decimals
+        self.path = DEFAULT_CACHE_PATH if path is True else path
+        self._entries = collections.OrderedDict()
+        self._conn = None
+        self.clear_stats()
+
+    # Pool workers get the settings and the disk tier, not the parent's entries or connection
+    def __getstate__(self):
+        return {"maxsize": self.maxsize, "decimals": self.decimals, "path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear_stats(self):
+        self.hits = self.misses = self.disk_hits = self.evictions = 0
+
+    def clear(self, disk=False):
+        # Empties the memory tier; disk=True also deletes this precision's rows on disk
+        self._entries.clear()
+        if disk and self.path is not None:
+            db = self._db()
+            with db:
+                db.execute("DELETE FROM mmc WHERE scale = ?", (self.scale,))
+        self.clear_stats()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return CacheStats(self.hits, self.misses, self.disk_hits, self.evictions,
+                          len(self._entries), self.maxsize, self.hits / lookups if lookups else 0.0)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _db(self):
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30)
+            self._conn.execute(_SCHEMA)
+        return self._conn
+
+    def _disk_get(self, keys):
+        # One join against a temp table instead of a query per key
+        db = self._db()
+        db.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (lam INTEGER, mu INTEGER, c INTEGER)")
+        db.execute("DELETE FROM wanted")
+        db.executemany("INSERT INTO wanted VALUES (?, ?, ?)", keys)
+        rows = db.execute(
+            "SELECT w.lam, w.mu, w.c, m.L, m.Lq, m.Wq, m.P0 FROM wanted w "
+            "JOIN mmc m ON m.scale = ? AND m.lam = w.lam AND m.mu = w.mu AND m.c = w.c",
+            (self.scale,),
+        )
+        return {row[:3]: row[3:] for row in rows}
+
+    def _disk_put(self, keys, values):
+        db = self._db()
+        with db:
+            db.executemany(
+                "INSERT OR IGNORE INTO mmc VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(self.scale, *k, *v) for k, v in zip(keys, values)],
+            )
+
+    def _put(self, key, value):
+        entries = self._entries
+        entries[key] = value
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def quantize(self, rate):
+        # Canonical integer key for a rate array
+        rate = np.asarray(rate, dtype=float)
+        if not np.all(np.isfinite(rate)):
+            raise ValueError("rates must be finite to be cached")
+        return np.rint(rate * self.scale).astype(np.int64)
+
+    def mmc_metrics(self, lam, mu, c):
+        """Cached drop-in for mmc_batch.mmc_metrics on broadcast arrays of λ, μ and lanes.
+
+        Each distinct key in the batch is looked up once; only the misses
+        are evaluated, in a single mmc_metrics call, and scattered back into
+        the broadcast shape.
+        """
+        lam, mu, c = np.broadcast_arrays(
+            np.asarray(lam, dtype=float), np.asarray(mu, dtype=float), np.asarray(c, dtype=int)
+        )
+        shape = lam.shape
+        keys = np.stack([self.quantize(lam).ravel(), self.quantize(mu).ravel(), c.ravel().astype(np.int64)], axis=1)
+        if keys.shape[0] == 0:
+            return mmc_metrics(lam, mu, c)
+        unique, inverse = _unique_rows(keys)
+        out = np.empty((len(unique), 4))
+
+        entries = self._entries
+        missing = []
+        for i, key in enumerate(map(tuple, unique.tolist())):
+            value = entries.get(key)
+            if value is None:
+                missing.append((i, key))
+            else:
+                entries.move_to_end(key)
+                out[i] = value
+        self.hits += len(unique) - len(missing)
+
+        if missing and self.path is not None:
+            found = self._disk_get([key for _, key in missing])
+            if found:
+                still = []
+                for i, key in missing:
+                    value = found.get(key)
+                    if value is None:
+                        still.append((i, key))
+                    else:
+                        out[i] = value
+                        self._put(key, value)
+                self.disk_hits += len(missing) - len(still)
+                self.hits += len(missing) - len(still)
+                missing = still
+
+        if missing:
+            rows = np.fromiter((i for i, _ in missing), dtype=np.intp, count=len(missing))
+            q = unique[rows]
+            res = mmc_metrics(q[:, 0] / self.scale, q[:, 1] / self.scale, q[:, 2])
+            values = np.stack(res, axis=1)
+            out[rows] = values
+            computed = [tuple(v) for v in values.tolist()]
+            for (_, key), value in zip(missing, computed):
+                self._put(key, value)
+            if self.path is not None:
+                self._disk_put([key for _, key in missing], computed)
+            self.misses += len(missing)
+
+        if instrument.enabled():
+            instrument.count("cache_hits", len(unique) - len(missing))
+            instrument.count("cache_misses", len(missing))
+        out = out[inverse]
+        return MMCResult(*(out[:, j].reshape(shape) for j in range(4)))
+
+    def mmc_queue_length(self, lam, mu, c):
+        # L of an M/M/c system, inf when λ >= c·μ
+        return self.mmc_metrics(lam, mu, c).L
+
+    def mm1_queue_length(self, lam, mu):
+        # M/M/1 is the c = 1 case, L = λ / (μ - λ); shares entries with mmc_queue_length(λ, μ, 1)
+        return self.mmc_metrics(lam, mu, 1).L
+
+
+_default = None
+
+
+def default_cache():
+    """Process-wide QueueCache used when code asks for caching without passing one."""
+    global _default
+    if _default is None:
+        _default = QueueCache()
+    return _default
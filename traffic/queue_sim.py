@@ -0,0 +1,181 @@
+import bisect
+import collections
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Output of one simulation run
+#   times: sample instants, queue: vehicles in system per node at each sample (samples x nodes)
+#   mean_L: time-average vehicles in system per node, served: vehicles that left the network
+#   mean_sojourn: average time spent in the network, events: number of processed events
+SimResult = collections.namedtuple("SimResult", ["times", "queue", "mean_L", "served", "mean_sojourn", "events"])
+
+ARRIVAL = 0
+DEPARTURE = 1
+
+
+class QueueNetwork:
+    """Network of M/M/c intersections for discrete-event simulation.
+
+    `gamma` is the external (Poisson) arrival rate at each node, `mu` the
+    service rate per lane and `lanes` the number of lanes. After service a
+    vehicle leaves the network with probability `exit_prob[i]`, otherwise it
+    moves to one of node i's successors.
+    """
+
+    def __init__(self, nodes, gamma, mu, lanes, successors, split, exit_prob):
+        self.nodes = list(nodes)
+        self.gamma = np.asarray(gamma, dtype=float)
+        self.mu = np.asarray(mu, dtype=float)
+        self.lanes = np.asarray(lanes, dtype=int)
+        self.successors = successors  # list of successor positions per node
+        self.split = split  # list of cumulative routing probabilities per node, ending at 1
+        self.exit_prob = np.asarray(exit_prob, dtype=float)
+
+    @classmethod
+    def from_graph(cls, G, lambda_values, mu_values, lanes=None, exit_prob=0.5, weight="p"):
+        """Build from a week 4/5 DiGraph and per-node λ/μ dicts.
+
+        Edges carrying a `weight` attribute are chosen with that relative
+        weight, the others uniformly. Nodes without successors always exit.
+        """
+        nodes = list(G.nodes)
+        index = {n: i for i, n in enumerate(nodes)}
+        successors, split, exits = [], [], []
+        for n in nodes:
+            out = list(G.out_edges(n, data=True))
+            w = np.array([d.get(weight, 1.0) for _, _, d in out], dtype=float)
+            successors.append([index[v] for _, v, _ in out])
+            cum = np.cumsum(w) / w.sum() if out else np.zeros(0)
+            cum[-1:] = 1.0  # guarding the last bucket against rounding
+            split.append(cum.tolist())
+            exits.append(exit_prob if out else 1.0)
+        lanes = [1] * len(nodes) if lanes is None else [lanes.get(n, 1) for n in nodes]
+        return cls(nodes, [lambda_values[n] for n in nodes], [mu_values[n] for n in nodes],
+                   lanes, successors, split, exits)
+
+    def simulate(self, horizon, sample_every=1.0, seed=None, capacity=1 << 16):
+        return simulate(self, horizon, sample_every, seed, capacity)
+
+    def replicate(self, horizon, replications=4, sample_every=1.0, seed=None, processes=None):
+        return run_replications(self, horizon, replications, sample_every, seed, processes)
+
+
+def _draws(rng, kind, size=1 << 15):
+    # Endless stream of random numbers drawn from NumPy in batches
+    while True:
+        batch = rng.standard_exponential(size) if kind == "exp" else rng.random(size)
+        yield from batch.tolist()
+
+
+def simulate(net, horizon, sample_every=1.0, seed=None, capacity=1 << 16):
+    """Run one replication until `horizon` and sample queue lengths every `sample_every`.
+
+    Events live in a binary heap of (time, kind, node, vehicle) tuples. Vehicle
+    entry times are kept in a preallocated array whose slots are recycled, so
+    the run only grows memory when more vehicles are in the network at once
+    than `capacity`. Unlike the closed-form models this stays meaningful when
+    ρ >= 1: queues simply keep growing over the horizon.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(net.nodes)
+    total_gamma = float(net.gamma.sum())
+    mu = net.mu.tolist()
+    lanes = net.lanes.tolist()
+    exit_prob = net.exit_prob.tolist()
+    successors, split = net.successors, net.split
+
+    expo = _draws(rng, "exp")
+    unif = _draws(rng, "uniform")
+    # External arrivals are one superposed Poisson stream, the node is picked by γ share
+    arrival_cum = (np.cumsum(net.gamma) / total_gamma).tolist() if total_gamma > 0 else []
+
+    in_system = [0] * n
+    busy = [0] * n
+    waiting = [collections.deque() for _ in range(n)]
+    area = [0.0] * n
+    last_change = [0.0] * n
+
+    entry_time = np.empty(capacity)
+    free_slots = list(range(capacity - 1, -1, -1))
+
+    heap = []
+    if total_gamma > 0:
+        heap.append((next(expo) / total_gamma, ARRIVAL, -1, -1))
+    push, pop = heapq.heappush, heapq.heappop
+
+    sample_times = np.arange(0.0, horizon + 1e-12, sample_every)
+    samples = np.zeros((len(sample_times), n), dtype=np.int64)
+    next_sample = 0
+    served = 0
+    sojourn_total = 0.0
+    events = 0
+
+    while heap:
+        t, kind, node, vehicle = pop(heap)
+        if t > horizon:
+            break
+        while next_sample < len(sample_times) and sample_times[next_sample] <= t:
+            samples[next_sample] = in_system
+            next_sample += 1
+        events += 1
+
+        if kind == ARRIVAL:
+            if node < 0:
+                # New vehicle entering the network; scheduling the next external arrival
+                push(heap, (t + next(expo) / total_gamma, ARRIVAL, -1, -1))
+                node = min(bisect.bisect_right(arrival_cum, next(unif)), n - 1)
+                if not free_slots:
+                    grown = np.empty(len(entry_time) * 2)
+                    grown[:len(entry_time)] = entry_time
+                    free_slots.extend(range(len(grown) - 1, len(entry_time) - 1, -1))
+                    entry_time = grown
+                vehicle = free_slots.pop()
+                entry_time[vehicle] = t
+            area[node] += in_system[node] * (t - last_change[node])
+            last_change[node] = t
+            in_system[node] += 1
+            if busy[node] < lanes[node]:
+                busy[node] += 1
+                push(heap, (t + next(expo) / mu[node], DEPARTURE, node, vehicle))
+            else:
+                waiting[node].append(vehicle)
+        else:
+            area[node] += in_system[node] * (t - last_change[node])
+            last_change[node] = t
+            in_system[node] -= 1
+            if waiting[node]:
+                push(heap, (t + next(expo) / mu[node], DEPARTURE, node, waiting[node].popleft()))
+            else:
+                busy[node] -= 1
+
+            # Routing the served vehicle onwards or out of the network
+            if next(unif) < exit_prob[node]:
+                served += 1
+                sojourn_total += t - entry_time[vehicle]
+                free_slots.append(vehicle)
+            else:
+                nxt = successors[node][bisect.bisect_right(split[node], next(unif))]
+                push(heap, (t, ARRIVAL, nxt, vehicle))
+
+    samples[next_sample:] = in_system
+    for i in range(n):
+        area[i] += in_system[i] * (horizon - last_change[i])
+    mean_L = np.array(area) / horizon if horizon > 0 else np.zeros(n)
+    return SimResult(sample_times, samples, mean_L, served, sojourn_total / served if served else np.nan, events)
+
+
+def _replication(args):
+    net, horizon, sample_every, seed = args
+    return simulate(net, horizon, sample_every, seed)
+
+
+def run_replications(net, horizon, replications=4, sample_every=1.0, seed=None, processes=None):
+    """Run independent replications across a process pool, one seed stream each."""
+    seeds = np.random.SeedSequence(seed).spawn(replications)
+    tasks = [(net, horizon, sample_every, s) for s in seeds]
+    if processes == 1:
+        return [_replication(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(_replication, tasks))
@@ -0,0 +1,249 @@
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from urllib.parse import quote
+
+import numpy as np
+
+from . import instrument
+
+TIME_COL = "time"
+NODE_COL = "node"
+MANIFEST = "manifest.jsonl"
+ROW_GROUP_ROWS = 65536  # parquet row groups: the unit the node/time statistics can skip
+FORMAT_VERSION = 1
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _kind(value):
+    # "number" or "text": node bounds are only ordered against query nodes of the same kind
+    if isinstance(value, (str, np.str_)):
+        return "text"
+    return "number" if isinstance(value, (int, float, np.number)) and not isinstance(value, bool) else None
+
+
+def _json_value(x):
+    # Manifest bounds as plain JSON values; timestamps as ISO strings
+    if isinstance(x, np.datetime64):
+        return str(x.astype("datetime64[ms]"))
+    return x.item() if isinstance(x, np.generic) else x
+
+
+class ResultStore:
+    """Append-only store of per-node, per-minute metrics, partitioned by scenario and date.
+
+    Every append writes new part files under
+    `root/scenario=<name>/date=<YYYY-MM-DD>/`, sorted by (node, time), and
+    records their row count and node/time bounds in an append-only manifest,
+    so queries pick the parts to open without listing directories and old
+    parts are never rewritten. Parts are zstd-compressed Parquet when
+    pyarrow is installed (row groups skipped through their statistics) and
+    directories of memory-mapped .npy columns otherwise.
+    """
+
+    def __init__(self, root, format=None):
+        self.root = os.path.abspath(root)
+        self.format = format or ("parquet" if _has_pyarrow() else "npy")
+        if self.format not in ("parquet", "npy"):
+            raise ValueError("format must be 'parquet' or 'npy'")
+        self._parts = []
+        self._manifest_pos = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    # Manifest
+
+    def _manifest(self):
+        # Reading only the lines appended since the last call
+        path = os.path.join(self.root, MANIFEST)
+        if os.path.exists(path):
+            with open(path) as f:
+                f.seek(self._manifest_pos)
+                for line in f:
+                    if line.endswith("\n"):
+                        self._parts.append(json.loads(line))
+                        self._manifest_pos += len(line.encode())
+        return self._parts
+
+    def _record(self, entries):
+        with open(os.path.join(self.root, MANIFEST), "a") as f:
+            f.write("".join(json.dumps(e) + "\n" for e in entries))
+
+    def scenarios(self):
+        return sorted({p["scenario"] for p in self._manifest()})
+
+    def dates(self, scenario):
+        return sorted({p["date"] for p in self._manifest() if p["scenario"] == scenario})
+
+    # Writing
+
+    def append(self, scenario, frame):
+        """Append a DataFrame with `time` and `node` columns plus any metric columns.
+
+        Rows are split by calendar date of `time`; each (scenario, date)
+        gets one new part. Returns the manifest entries written.
+        """
+        import pandas as pd
+
+        if TIME_COL not in frame or NODE_COL not in frame:
+            raise ValueError(f"frame needs {TIME_COL!r} and {NODE_COL!r} columns")
+        frame = frame.copy()
+        frame[TIME_COL] = pd.to_datetime(frame[TIME_COL]).astype("datetime64[ms]")
+        entries = []
+        with instrument.stage("results_append"):
+            for date, part in frame.groupby(frame[TIME_COL].dt.strftime("%Y-%m-%d"), sort=True):
+                part = part.sort_values([NODE_COL, TIME_COL], kind="stable").reset_index(drop=True)
+                entries.append(self._write_part(scenario, date, part))
+        self._record(entries)
+        return entries
+
+    def append_table(self, scenario, table, run_time, node_col="Node"):
+        # A per-node table without a time axis (week 6 comparisons), stamped with the run time
+        frame = table.rename(columns={node_col: NODE_COL}).copy()
+        frame.insert(0, TIME_COL, run_time)
+        return self.append(scenario, frame)
+
+    def _write_part(self, scenario, date, part):
+        rel_dir = os.path.join(f"scenario={quote(str(scenario), safe='')}", f"date={date}")
+        directory = os.path.join(self.root, rel_dir)
+        os.makedirs(directory, exist_ok=True)
+        name = f"part-{uuid.uuid4().hex[:12]}"
+        if self.format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            name += ".parquet"
+            tmp = os.path.join(directory, "." + name)
+            table = pa.Table.from_pandas(part, preserve_index=False)
+            pq.write_table(table, tmp, compression="zstd", row_group_size=ROW_GROUP_ROWS,
+                           use_dictionary=[NODE_COL] if part[NODE_COL].dtype == object else False)
+            os.replace(tmp, os.path.join(directory, name))
+        else:
+            # Same temp-directory-then-rename as graph_store, so readers never see half a part
+            tmp = tempfile.mkdtemp(dir=directory)
+            try:
+                for col in part.columns:
+                    values = part[col].to_numpy()
+                    if values.dtype == object:
+                        values = values.astype(str)
+                    np.save(os.path.join(tmp, f"{col}.npy"), values)
+                with open(os.path.join(tmp, "meta.json"), "w") as f:
+                    json.dump({"columns": list(part.columns), "version": FORMAT_VERSION}, f)
+                os.replace(tmp, os.path.join(directory, name))
+            except BaseException:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+        nodes, times = part[NODE_COL].to_numpy(), part[TIME_COL].to_numpy()
+        return {
+            "scenario": str(scenario), "date": date, "path": os.path.join(rel_dir, name), "rows": len(part),
+            "node_min": _json_value(nodes[0]), "node_max": _json_value(nodes[-1]),
+            "time_min": _json_value(times.min()), "time_max": _json_value(times.max()),
+            "columns": list(part.columns), "format": self.format,
+        }
+
+    # Reading
+
+    def parts(self, scenario=None, start=None, end=None, nodes=None):
+        """Manifest entries that can hold rows for the scenario, [start, end) range and nodes."""
+        start = None if start is None else np.datetime64(start, "ms")
+        end = None if end is None else np.datetime64(end, "ms")
+        lo = hi = None
+        if nodes is not None and len(nodes):
+            lo, hi = min(nodes), max(nodes)
+        kind = None if lo is None else _kind(lo)
+        chosen = []
+        for p in self._manifest():
+            if scenario is not None and p["scenario"] != str(scenario):
+                continue
+            if start is not None and np.datetime64(p["time_max"], "ms") < start:
+                continue
+            if end is not None and np.datetime64(p["time_min"], "ms") >= end:
+                continue
+            # Scenarios can key nodes differently (OSM ids, names); bounds of another kind cannot rule a part out
+            if kind is not None and _kind(p["node_min"]) == kind and (p["node_max"] < lo or p["node_min"] > hi):
+                continue
+            chosen.append(p)
+        return chosen
+
+    def read(self, scenario=None, start=None, end=None, nodes=None, columns=None):
+        """Rows for a scenario (all when None), time range [start, end) and node set, as a DataFrame.
+
+        Only parts whose manifest bounds overlap the query are opened; inside
+        a Parquet part only the requested columns and the row groups whose
+        statistics overlap are decompressed.
+        """
+        import pandas as pd
+
+        with instrument.stage("results_read"):
+            parts = self.parts(scenario, start, end, nodes)
+            cols = None if columns is None else list(dict.fromkeys([TIME_COL, NODE_COL, *columns]))
+            frames = []
+            parquet = [p for p in parts if p["format"] == "parquet"]
+            # One dataset per node type, since Arrow cannot unify int and string node columns
+            for kind in dict.fromkeys(_kind(p["node_min"]) for p in parquet):
+                wanted = None if nodes is None else [x for x in nodes if _kind(x) == kind]
+                if wanted is not None and not wanted:
+                    continue  # none of the query nodes can appear in parts keyed this way
+                group = [p for p in parquet if _kind(p["node_min"]) == kind]
+                frames.append(self._read_parquet(group, start, end, wanted, cols))
+            frames.extend(self._read_npy(p, start, end, nodes, cols) for p in parts if p["format"] == "npy")
+            if not frames:
+                return pd.DataFrame(columns=cols or [TIME_COL, NODE_COL])
+            df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        instrument.count("results_parts_read", len(parts))
+        return df
+
+    def _read_parquet(self, parts, start, end, nodes, cols):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset([os.path.join(self.root, p["path"]) for p in parts], format="parquet")
+        expr = None
+        conditions = []
+        if start is not None:
+            conditions.append(ds.field(TIME_COL) >= pa.scalar(np.datetime64(start, "ms"), pa.timestamp("ms")))
+        if end is not None:
+            conditions.append(ds.field(TIME_COL) < pa.scalar(np.datetime64(end, "ms"), pa.timestamp("ms")))
+        if nodes is not None:
+            conditions.append(ds.field(NODE_COL).isin(list(nodes)))
+        for cond in conditions:
+            expr = cond if expr is None else expr & cond
+        return dataset.to_table(columns=cols, filter=expr).to_pandas()
+
+    def _read_npy(self, part, start, end, nodes, cols):
+        import pandas as pd
+
+        path = os.path.join(self.root, part["path"])
+        columns = cols or part["columns"]
+        node = np.load(os.path.join(path, f"{NODE_COL}.npy"), mmap_mode="r")
+        # Rows are sorted by node: a node set of the same type narrows to one slice by binary search
+        # before any other column is read
+        lo, hi = 0, len(node)
+        if nodes is not None and len(nodes) and len(node) and _kind(node[0].item()) == _kind(min(nodes)):
+            lo = int(np.searchsorted(node, min(nodes), side="left"))
+            hi = int(np.searchsorted(node, max(nodes), side="right"))
+        keep = np.ones(hi - lo, dtype=bool)
+        if nodes is not None:
+            keep &= np.isin(node[lo:hi], np.asarray(list(nodes)))
+        if start is not None or end is not None:
+            t = np.load(os.path.join(path, f"{TIME_COL}.npy"), mmap_mode="r")[lo:hi]
+            if start is not None:
+                keep &= t >= np.datetime64(start, "ms")
+            if end is not None:
+                keep &= t < np.datetime64(end, "ms")
+        return pd.DataFrame({c: np.load(os.path.join(path, f"{c}.npy"), mmap_mode="r")[lo:hi][keep]
+                             for c in columns})
+
+
+def from_env():
+    """ResultStore at $TRAFFIC_RESULTS, or None when the variable is unset (scripts then keep nothing)."""
+    root = os.environ.get("TRAFFIC_RESULTS")
+    return ResultStore(root) if root else None
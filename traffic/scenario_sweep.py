@@ -0,0 +1,195 @@
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .core import improvement
+from .mmc_batch import mmc_metrics
+from .network_state import NetworkState
+from .queue_cache import QueueCache
+
+# Knobs a scenario can set, with their no-op defaults
+SCENARIO_DEFAULTS = {
+    "lambda_scale": 1.0,
+    "lambda_delta": 0.0,
+    "mu_scale": 1.0,
+    "mu_delta": 0.0,
+    "extra_lanes": 0,
+}
+
+# Per-worker view of the base network, filled in by _init_worker
+_base = {}
+
+
+def expand_grid(axes, nodes=None):
+    """Cartesian product of scenario axes, e.g. {"lambda_scale": [0.9, 1.1], "extra_lanes": [0, 1]}."""
+    keys = list(axes)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(axes[k] for k in keys))]
+    if nodes is not None:
+        for scenario in grid:
+            scenario["nodes"] = list(nodes)
+    return grid
+
+
+def _capped(L, cap):
+    return L if cap is None else np.where(np.isinf(L), cap, L)
+
+
+def _init_worker(shm_name, n, scenarios, base_L, cap, cache):
+    # Attaching to the shared base arrays once per worker instead of pickling them per task
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _base["shm"] = shm
+    _base["values"] = np.ndarray((3, n), dtype=float, buffer=shm.buf)
+    _base["scenarios"] = scenarios
+    _base["L"] = base_L
+    _base["unstable"] = np.isinf(base_L)
+    _base["congested"] = int(_base["unstable"].sum())
+    _base["capped"] = _capped(base_L, cap)
+    _base["finite"] = float(np.where(np.isinf(_base["capped"]), 0.0, _base["capped"]).sum())
+    _base["cap"] = cap
+    _base["evaluate"] = mmc_metrics if cache is None else cache.mmc_metrics
+
+
+def _run_shard(bounds):
+    start, stop = bounds
+    lam0, mu0, lanes0 = _base["values"]
+    cap = _base["cap"]
+    summary, tracked = [], []
+    for k in range(start, stop):
+        s = _base["scenarios"][k]
+        pos = s.get("positions")
+        sel = slice(None) if pos is None else pos
+
+        lam = lam0[sel] * s["lambda_scale"] + s["lambda_delta"]
+        mu = mu0[sel] * s["mu_scale"] + s["mu_delta"]
+        lanes = lanes0[sel].astype(int) + s["extra_lanes"]
+        L = _base["evaluate"](lam, mu, lanes).L
+
+        # Only the touched nodes change, the rest of the network keeps its base L
+        # Finite part and unstable count kept apart, so removing an infinite base L never gives inf - inf
+        capped = _capped(L, cap)
+        old = _base["capped"][sel]
+        finite = (_base["finite"] - float(np.where(np.isinf(old), 0.0, old).sum())
+                  + float(np.where(np.isinf(capped), 0.0, capped).sum()))
+        congested = _base["congested"] - int(_base["unstable"][sel].sum()) + int(np.isinf(L).sum())
+        total = np.inf if cap is None and congested else finite
+        summary.append((k, total, congested))
+        if pos is not None:
+            tracked.append((k, pos, lam, mu, lanes, L))
+    return summary, tracked
+
+
+def _shards(count, workers):
+    size = max(1, -(-count // (4 * workers)))
+    return [(i, min(i + size, count)) for i in range(0, count, size)]
+
+
+def run_scenarios(state, scenarios, workers=None, cap=None, cache=None):
+    """Evaluate a batch of what-if scenarios against a base NetworkState.
+
+    Each scenario is a dict of SCENARIO_DEFAULTS keys, optionally restricted to
+    a list of `nodes`. Scenarios are sharded across a process pool whose
+    workers read λ/μ/lanes from shared memory. Returns `(df_compare,
+    df_sensitivity)`: one row per scenario with network totals and improvement
+    %, and one row per (scenario, node) for scenarios restricted to nodes.
+    `cap` replaces infinite L in the totals, as week 6 does for its plots.
+    `cache` (default: the state's) memoizes repeated (λ, μ, c) evaluations;
+    each pool worker gets its own memory tier and shares the disk tier.
+    """
+    workers = workers or os.cpu_count() or 1
+    cache = state.cache if cache is None else cache
+    prepared = []
+    for s in scenarios:
+        s = {**SCENARIO_DEFAULTS, **s}
+        if s.get("nodes") is not None:
+            s["positions"] = state.positions(s["nodes"])
+        prepared.append(s)
+
+    n = len(state)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, 3 * n * 8))
+    try:
+        values = np.ndarray((3, n), dtype=float, buffer=shm.buf)
+        values[0], values[1], values[2] = state.lam, state.mu, state.lanes
+        init_args = (shm.name, n, prepared, state.L.copy(), cap, cache)
+        shards = _shards(len(prepared), workers)
+        if workers == 1:
+            _init_worker(*init_args)
+            try:
+                parts = [_run_shard(b) for b in shards]
+            finally:
+                shm_view = _base.pop("shm")
+                _base.clear()
+                shm_view.close()
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as pool:
+                parts = list(pool.map(_run_shard, shards))
+        del values
+    finally:
+        shm.close()
+        shm.unlink()
+
+    # pandas only in the parent: pool workers import this module and need NumPy alone
+    import pandas as pd
+
+    base_total = float(_capped(state.L, cap).sum())
+    rows, sens = [], []
+    for summary, tracked in parts:
+        for k, total, congested in summary:
+            s = prepared[k]
+            row = {"Scenario": s.get("name", k)}
+            row.update({key: s[key] for key in SCENARIO_DEFAULTS})
+            row.update({
+                "L Before": base_total,
+                "L After": total,
+                "Congested": congested,
+                "Improvement (%)": float(improvement(base_total, total)),
+            })
+            rows.append(row)
+        for k, pos, lam, mu, lanes, L in tracked:
+            sens.append(pd.DataFrame({
+                "Scenario": prepared[k].get("name", k),
+                "Node": state.nodes[pos],
+                "λ": lam,
+                "μ": mu,
+                "Lanes": lanes,
+                "Queue Length (L)": L,
+            }))
+    df_compare = pd.DataFrame(rows)
+    df_sensitivity = pd.concat(sens, ignore_index=True) if sens else pd.DataFrame()
+    return df_compare, df_sensitivity
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a what-if scenario grid over a traffic network.")
+    parser.add_argument("network", help="CSV with Node, lambda, mu and optional lanes columns")
+    parser.add_argument("grid", help="JSON list of scenarios, or an object of axes to expand")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cap", type=float, default=None, help="value replacing infinite L in totals")
+    parser.add_argument("--out", default="scenario_results.csv")
+    parser.add_argument("--sensitivity-out", default="scenario_sensitivity.csv")
+    parser.add_argument("--cache", default=None, help="SQLite file memoizing (λ, μ, c) results across runs")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+
+    net = pd.read_csv(args.network)
+    lanes = net["lanes"].to_numpy() if "lanes" in net else None
+    cache = QueueCache(path=args.cache) if args.cache else None
+    state = NetworkState(net["Node"], net["lambda"].to_numpy(), net["mu"].to_numpy(), lanes, cache)
+    with open(args.grid) as f:
+        grid = json.load(f)
+    scenarios = grid if isinstance(grid, list) else expand_grid(grid)
+
+    df_compare, df_sensitivity = run_scenarios(state, scenarios, workers=args.workers, cap=args.cap)
+    df_compare.to_csv(args.out, index=False)
+    if not df_sensitivity.empty:
+        df_sensitivity.to_csv(args.sensitivity_out, index=False)
+    print(f"{len(df_compare)} scenarios written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
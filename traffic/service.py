@@ -0,0 +1,383 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+
+from . import instrument
+from .core import improvement
+from .mmc_batch import mmc_metrics
+from .scenario_sweep import SCENARIO_DEFAULTS
+
+log = logging.getLogger(__name__)
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+MAX_HEADER = 16384
+
+# Per-worker graph and view of the shared queue delays, filled in by _init_worker
+_worker = {}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _label(node):
+    # Node names as plain Python values for json (NumPy scalars are not serializable)
+    return node.item() if isinstance(node, np.generic) else node
+
+
+def _number(x):
+    # JSON has no inf: unstable queues are reported as null next to congested = "Yes"
+    x = float(x)
+    return x if np.isfinite(x) else None
+
+
+def _init_worker(graph, shm_name):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker["graph"] = graph
+    _worker["shm"] = shm
+    _worker["shared"] = np.ndarray(graph.num_nodes + 1, dtype=float, buffer=shm.buf)  # [version, delay...]
+    _worker["version"] = None
+
+
+def _route_in_worker(source, target):
+    # Edge weights are rebuilt only when the parent has published a new delay version
+    graph, shared = _worker["graph"], _worker["shared"]
+    if _worker["version"] != shared[0]:
+        _worker["version"] = float(shared[0])
+        _worker["weights"] = graph.with_queue_delay(shared[1:])
+    return graph.astar(source, target, _worker["weights"])
+
+
+def apply_scenario(lam, mu, lanes, scenario):
+    """New (λ, μ, lanes) arrays for a what-if: SCENARIO_DEFAULTS knobs, or absolute `mu`/`lam`/`lanes` values."""
+    s = {**SCENARIO_DEFAULTS, **scenario}
+    lam = np.asarray(s["lam"], dtype=float) if "lam" in s else lam * s["lambda_scale"] + s["lambda_delta"]
+    mu = np.asarray(s["mu"], dtype=float) if "mu" in s else mu * s["mu_scale"] + s["mu_delta"]
+    lanes = np.asarray(s["lanes"], dtype=int) if "lanes" in s else lanes.astype(int) + s["extra_lanes"]
+    return np.broadcast_arrays(lam, mu, lanes)
+
+
+def _scenario_in_worker(lam, mu, lanes, scenario):
+    lam, mu, lanes = apply_scenario(lam, mu, lanes, scenario)
+    return mmc_metrics(lam, mu, lanes).L
+
+
+class QueueService:
+    """Long-running JSON service over one road graph and its NetworkState.
+
+    `graph` is a CSRGraph and `state` a NetworkState with the same node
+    order. Per-node queries and what-ifs on a few nodes are answered on the
+    event loop; routes on graphs above `inline_nodes` and whole-network
+    scenarios run in a process pool. Identical requests in flight at the
+    same time share one computation.
+    """
+
+    def __init__(self, graph, state, workers=None, inline_nodes=2000):
+        if graph.num_nodes != len(state):
+            raise ValueError("graph and state must have the same nodes")
+        self.graph = graph
+        self.state = state
+        self.workers = workers or os.cpu_count() or 1
+        self.inline_nodes = inline_nodes
+        self.labels = [_label(n) for n in state.nodes.tolist()]
+        self.names = {str(n): i for i, n in enumerate(self.labels)}
+        self.version = 0
+        self._inflight = {}
+        self._pool = None
+        self._shm = None
+        self._server = None
+        self._routes = {
+            ("GET", "/health"): self._health,
+            ("GET", "/nodes"): self._nodes,
+            ("GET", "/route"): self._route,
+            ("POST", "/update"): self._update,
+            ("POST", "/scenario"): self._scenario,
+        }
+        self.refresh()
+
+    # Queue state shared with the pool
+
+    def refresh(self, idx=None):
+        """Recompute queue delay after the state changed (only at positions `idx` if given); routes see the new version."""
+        state = self.state
+        if idx is None:
+            self.delay = state.evaluate(state.lam, state.mu, state.lanes).Wq
+        else:
+            self.delay[idx] = state.evaluate(state.lam[idx], state.mu[idx], state.lanes[idx]).Wq
+        self.version += 1
+        self._weights = None
+        self._publish()
+
+    def _publish(self):
+        # Delays first, then the version pool workers compare against
+        if self._shm is not None:
+            shared = np.ndarray(len(self.delay) + 1, dtype=float, buffer=self._shm.buf)
+            shared[1:] = self.delay
+            shared[0] = self.version
+            del shared
+
+    @property
+    def weights(self):
+        if self._weights is None:
+            self._weights = self.graph.with_queue_delay(self.delay)
+        return self._weights
+
+    def _ensure_pool(self):
+        if self._pool is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=(self.graph.num_nodes + 1) * 8)
+            self._publish()
+            self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                             initargs=(self.graph, self._shm.name))
+        return self._pool
+
+    async def _offload(self, key, fn, *args):
+        # Coalescing: a request identical to one still running awaits the same future
+        future = self._inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._ensure_pool(), fn, *args)
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+            instrument.count("offloaded_requests")
+        else:
+            instrument.count("coalesced_requests")
+        return await asyncio.shield(future)
+
+    # Handlers: (query dict, decoded JSON body) -> JSON-able payload
+
+    def _position(self, name):
+        try:
+            return self.names[str(name)]
+        except KeyError:
+            raise HTTPError(404, f"unknown node {name!r}") from None
+
+    def _node_rows(self, idx):
+        s = self.state
+        return [
+            {"node": self.labels[i], "lambda": float(s.lam[i]), "mu": float(s.mu[i]), "lanes": int(s.lanes[i]),
+             "L": _number(s.L[i]), "wait": _number(self.delay[i]),
+             "congested": "Yes" if s.congested[i] else "No"}
+            for i in idx.tolist()
+        ]
+
+    async def _health(self, query, body):
+        return {"status": "ok", "nodes": len(self.state), "version": self.version}
+
+    async def _nodes(self, query, body, name=None):
+        if name is not None:
+            return self._node_rows(np.array([self._position(name)]))[0]
+        if "node" in query:
+            idx = np.array([self._position(n) for n in query["node"]], dtype=np.intp)
+        elif query.get("congested") == ["1"]:
+            idx = np.flatnonzero(self.state.congested)
+        else:
+            idx = np.arange(len(self.state))
+        return {"version": self.version, "congested_count": self.state.congested_count,
+                "finite_L_total": self.state.finite_L_total, "nodes": self._node_rows(idx)}
+
+    async def _update(self, query, body):
+        # {"nodes": [...], "lam": [...], "mu": [...], "lanes": [...]}, any of lam/mu/lanes optional
+        idx = np.array([self._position(n) for n in body.get("nodes", [])], dtype=np.intp)
+        diff = self.state.update_at(idx, body.get("lam"), body.get("mu"), body.get("lanes"))
+        self.refresh(idx)
+        return {"version": self.version, "congested": [_label(n) for n in diff.congested],
+                "cleared": [_label(n) for n in diff.cleared]}
+
+    async def _scenario(self, query, body):
+        """What-if without touching the live state; `nodes` limits it to those intersections."""
+        state = self.state
+        scenario = {k: v for k, v in body.items() if k != "nodes"}
+        cap = scenario.pop("cap", None)
+        if body.get("nodes") is not None:
+            sel = np.array([self._position(n) for n in body["nodes"]], dtype=np.intp)
+            # A repeated node would count twice in the totals, and per-node lam/mu/lanes lists follow `nodes`
+            positions, counts = np.unique(sel, return_counts=True)
+            if (counts > 1).any():
+                repeated = [self.labels[i] for i in positions[counts > 1].tolist()]
+                raise HTTPError(400, f"nodes listed more than once: {repeated}")
+        else:
+            sel = np.arange(len(state))
+        args = (state.lam[sel], state.mu[sel], state.lanes[sel], scenario)
+        try:
+            if len(sel) <= self.inline_nodes:
+                L = _scenario_in_worker(*args)
+            else:
+                key = ("scenario", self.version, json.dumps(body, sort_keys=True))
+                L = await self._offload(key, _scenario_in_worker, *args)
+        except ValueError as exc:
+            raise HTTPError(400, str(exc)) from None
+
+        # Totals from the state's running aggregates, so a few-node what-if stays O(len(nodes))
+        old = state.L[sel]
+        congested_after = int(state.congested_count - state.congested[sel].sum() + np.isinf(L).sum())
+        finite_after = state.finite_L_total - float(old[np.isfinite(old)].sum()) + float(L[np.isfinite(L)].sum())
+        if cap is None:
+            before = np.inf if state.congested_count else state.finite_L_total
+            after = np.inf if congested_after else finite_after
+        else:
+            before = state.finite_L_total + cap * state.congested_count
+            after = finite_after + cap * congested_after
+        payload = {
+            "version": self.version,
+            "L Before": _number(before),
+            "L After": _number(after),
+            "Improvement (%)": _number(improvement(before, after)),
+            "Congested": congested_after,
+        }
+        if body.get("nodes") is not None:
+            payload["nodes"] = [{"node": n, "L Before": _number(a), "L After": _number(b)}
+                                for n, a, b in zip(body["nodes"], state.L[sel].tolist(), L.tolist())]
+        return payload
+
+    async def _route(self, query, body):
+        """Queue-aware route: travel time plus the waiting time at every intersection entered."""
+        try:
+            source, target = query["from"][0], query["to"][0]
+        except KeyError:
+            raise HTTPError(400, "route needs from and to") from None
+        src = self.graph.nodes[self._position(source)]
+        dst = self.graph.nodes[self._position(target)]
+        if self.graph.num_nodes <= self.inline_nodes:
+            cost, path = self.graph.astar(src, dst, self.weights)
+        else:
+            cost, path = await self._offload(("route", self.version, src, dst), _route_in_worker, src, dst)
+        return {"version": self.version, "from": source, "to": target, "cost": _number(cost),
+                "path": [_label(n) for n in path]}
+
+    async def handle(self, method, target, body=b""):
+        """Dispatch one request; returns (status, payload)."""
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        query = parse_qs(url.query)
+        try:
+            data = json.loads(body) if body else {}
+            if not isinstance(data, dict):
+                raise HTTPError(400, "request body must be a JSON object")
+            if path.startswith("/nodes/") and method == "GET":
+                return 200, await self._nodes(query, data, unquote(path[len("/nodes/"):]))
+            handler = self._routes.get((method, path))
+            if handler is None:
+                if any(p == path for _, p in self._routes):
+                    raise HTTPError(405, f"{method} not allowed on {path}")
+                raise HTTPError(404, f"no route {path}")
+            return 200, await handler(query, data)
+        except HTTPError as exc:
+            return exc.status, {"error": str(exc)}
+        except (ValueError, TypeError) as exc:
+            return 400, {"error": str(exc)}
+        except Exception:
+            log.exception("request %s %s failed", method, target)
+            return 500, {"error": "internal error"}
+
+    # HTTP/1.1 over asyncio streams, keep-alive by default
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    key, _, value = line.partition(":")
+                    if key:
+                        headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0) or 0)
+                body = await reader.readexactly(length) if length else b""
+
+                with instrument.stage("request"):
+                    status, payload = await self.handle(method, target, body)
+                data = json.dumps(payload).encode()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            pass  # shutdown cancels idle keep-alive connections; nothing is left to answer
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8080):
+        self._server = await asyncio.start_server(self._serve, host, port, limit=MAX_HEADER)
+        return self._server
+
+    async def serve_forever(self, host="127.0.0.1", port=8080):
+        server = await self.start(host, port)
+        log.info("serving %d nodes on %s", len(self.state),
+                 ", ".join(str(s.getsockname()) for s in server.sockets))
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve queue metrics, what-if scenarios and routes over HTTP.")
+    parser.add_argument("network", help="CSV with Node, lambda, mu and optional lanes columns")
+    parser.add_argument("edges", help="CSV with u, v and travel_time columns")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--inline-nodes", type=int, default=2000, help="larger graphs route in the process pool")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+
+    from .csr_graph import CSRGraph
+    from .network_state import NetworkState
+    from .queue_cache import QueueCache
+
+    net = pd.read_csv(args.network)
+    edges = pd.read_csv(args.edges)
+    lanes = net["lanes"].to_numpy() if "lanes" in net else None
+    state = NetworkState(net["Node"], net["lambda"].to_numpy(), net["mu"].to_numpy(), lanes, QueueCache())
+    pos = pd.Index(state.nodes)
+    u, v = pos.get_indexer(edges["u"]), pos.get_indexer(edges["v"])
+    if (u < 0).any() or (v < 0).any():
+        parser.error("edges reference nodes missing from the network file")
+    w = edges["travel_time"].to_numpy(dtype=float) if "travel_time" in edges else np.ones(len(edges))
+    graph = CSRGraph.from_edges(len(state), u, v, w, state.nodes)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    service = QueueService(graph, state, args.workers, args.inline_nodes)
+    try:
+        asyncio.run(service.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import collections
+import os
+import numpy as np
+import pandas as pd
+
+
+# Per-window M/M/c metrics for the nodes observed in that window
+WindowMetrics = collections.namedtuple("WindowMetrics", ["start", "nodes", "lam", "L", "Lq", "Wq", "P0"])
+
+TIME_COL = "time"
+NODE_COL = "node"
+LAMBDA_COL = "lambda"
+
+
+def read_observations(source, chunk_rows=65536, columns=(TIME_COL, NODE_COL, LAMBDA_COL)):
+    """Yield DataFrame chunks of (time, node, lambda) observations from a CSV or Parquet file.
+
+    Only `chunk_rows` rows are held in memory at a time. `source` may also be
+    an iterable of DataFrames, which is passed through unchanged.
+    """
+    if not isinstance(source, (str, os.PathLike)):
+        yield from source
+        return
+
+    columns = list(columns)
+    if str(source).endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(source, usecols=columns, chunksize=chunk_rows)
+
+
+def lambda_t_observations(lambda_t, hours, nodes):
+    # Turning a λ(t) function into an observation stream, one chunk per hour
+    nodes = list(nodes)
+    for hour in hours:
+        yield pd.DataFrame({TIME_COL: hour, NODE_COL: nodes, LAMBDA_COL: lambda_t(hour)})
+
+
+def _time_values(values, time_unit):
+    # Numeric times pass through; datetimes and ISO strings become offsets from the epoch in `time_unit`
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=float), None
+    ts = pd.to_datetime(values)
+    epoch = pd.Timestamp("1970-01-01", tz=ts.dt.tz)
+    return ((ts - epoch) / pd.Timedelta(1, unit=time_unit)).to_numpy(dtype=float), epoch
+
+
+def stream_windows(chunks, state, window, columns=(TIME_COL, NODE_COL, LAMBDA_COL), time_unit="h"):
+    """Yield WindowMetrics for consecutive time windows of an observation stream.
+
+    `chunks` must be in time order (e.g. from read_observations). Observations
+    are averaged per node inside each window of width `window` and evaluated
+    with the μ, lanes and cache of `state` (a NetworkState). Memory is bounded by the
+    node count, whatever the length of the stream; observations of unknown
+    nodes are skipped. The time column may be numeric (in the unit of
+    `window`) or timestamps (datetime64 or ISO strings); timestamps are
+    windowed in `time_unit` (`window` may then also be a Timedelta or a
+    string such as "15min") and window starts are reported as Timestamps.
+    """
+    time_col, node_col, lam_col = columns
+    if not isinstance(window, (int, float, np.number)):
+        window = pd.Timedelta(window) / pd.Timedelta(1, unit=time_unit)
+    epoch = None
+    node_lookup = pd.Index(state.nodes)
+    n = len(state.nodes)
+    sums = np.zeros(n)
+    counts = np.zeros(n)
+    current = None
+
+    def flush(window_id):
+        seen = np.flatnonzero(counts)
+        lam = sums[seen] / counts[seen]
+        res = state.evaluate(lam, state.mu[seen], state.lanes[seen])
+        sums[:] = 0.0
+        counts[:] = 0.0
+        start = window_id * window
+        if epoch is not None:
+            start = epoch + pd.Timedelta(start, unit=time_unit)
+        return WindowMetrics(start, seen, lam, res.L, res.Lq, res.Wq, res.P0)
+
+    for chunk in chunks:
+        pos = node_lookup.get_indexer(chunk[node_col])
+        known = pos >= 0
+        pos = pos[known]
+        lam = chunk[lam_col].to_numpy(dtype=float)[known]
+        times, epoch = _time_values(chunk[time_col], time_unit)
+        win = np.floor(times[known] / window).astype(np.int64)
+        if win.size == 0:
+            continue
+        if np.any(np.diff(win) < 0) or (current is not None and win[0] < current):
+            raise ValueError("observations must be in time order")
+
+        # Splitting the chunk wherever the window changes and accumulating each run at once
+        breaks = np.flatnonzero(np.diff(win)) + 1
+        for seg_pos, seg_lam, seg_win in zip(np.split(pos, breaks), np.split(lam, breaks), win[np.r_[0, breaks]]):
+            if current is not None and seg_win != current:
+                yield flush(current)
+            current = seg_win
+            sums += np.bincount(seg_pos, weights=seg_lam, minlength=n)
+            counts += np.bincount(seg_pos, minlength=n)
+
+    if current is not None and counts.any():
+        yield flush(current)
@@ -0,0 +1,135 @@
+import collections
+
+import numpy as np
+
+from .mmc_batch import mmc_metrics
+
+# Time-resolved queue lengths, every array is (nodes, steps)
+#   L: fluid (PSA-FFA) queue length, L_psa: pointwise-stationary M/M/c value (inf when overloaded),
+#   rho: λ(t) / (c·μ)
+TransientResult = collections.namedtuple("TransientResult", ["times", "L", "L_psa", "rho"])
+
+# One overload episode per row: node position, first and last overloaded step,
+# and the time from the end of the overload until L(t) is back near its stationary value (inf if never)
+Clearance = collections.namedtuple("Clearance", ["node", "peak_start", "peak_end", "clear_time"])
+
+
+def utilization_table(lanes, size=4096, x_max=1e6):
+    """Inverse of the stationary M/M/c curve L(ρ), tabulated per distinct lane count.
+
+    Returns (lane values, grid step, table) where table[i, j] is the
+    utilization ρ at which a queue with lanes[i] lanes holds
+    x = expm1(j * step) vehicles. The grid is uniform in log1p(x), so a
+    lookup is one multiply instead of a search.
+    """
+    values = np.unique(np.asarray(lanes, dtype=int))
+    # ρ grid crowded towards 1, where L(ρ) blows up
+    rho = -np.expm1(-np.linspace(0.0, np.log(x_max) + 5.0, 20000))
+    step = np.log1p(x_max) / (size - 1)
+    x = np.expm1(np.arange(size) * step)
+    table = np.empty((len(values), size))
+    for i, c in enumerate(values):
+        L = mmc_metrics(rho * c, 1.0, c).L
+        table[i] = np.interp(x, L, rho)
+    return values, step, table
+
+
+def fluid_queue(lam, mu, lanes, dt, L0=0.0, store_every=1, newton_steps=3):
+    """Integrate the pointwise-stationary fluid-flow model dL/dt = λ(t) - c·μ·ρ(L) for all nodes at once.
+
+    `lam` is (nodes, steps) or (steps,) with the arrival rate of each step
+    of length `dt`, in the same time unit as μ. ρ(L) inverts the stationary
+    M/M/c curve, so L follows the steady state when λ changes slowly and
+    builds up (and drains) at a finite rate during overloads. Implicit
+    Euler keeps large steps stable; each step starts from a closed-form
+    guess and is refined by Newton iterations on the tabulated ρ(L).
+    Returns L at the end of every `store_every`-th step.
+    """
+    lam = np.atleast_2d(np.asarray(lam, dtype=float))
+    n, steps = lam.shape
+    mu = np.broadcast_to(np.asarray(mu, dtype=float), (n,))
+    lanes = np.broadcast_to(np.asarray(lanes, dtype=int), (n,))
+    values, step, table = utilization_table(lanes)
+    size = table.shape[1]
+    grid = np.expm1(np.arange(size) * step)
+    # Per-segment slope of the piecewise-linear ρ(x), flattened so one gather serves every lane count
+    slopes = np.zeros_like(table)
+    slopes[:, :-1] = np.diff(table, axis=1) / np.diff(grid)
+    flat_rho, flat_slope = table.ravel(), slopes.ravel()
+    base = np.searchsorted(values, lanes) * size
+    a = dt * lanes * mu
+    lam_steps = np.ascontiguousarray(lam.T) * dt
+
+    x = np.broadcast_to(np.asarray(L0, dtype=float), (n,)).copy()
+    out = np.empty((steps // store_every, n))
+    for k in range(steps):
+        b = x + lam_steps[k]
+        # Solve x + a·ρ(x) = b: start from the closed form for ρ ≈ x / (c + x), exact when c = 1,
+        # then polish with Newton on the tabulated ρ(x)
+        p = lanes + a - b
+        x = 0.5 * (np.sqrt(p * p + 4.0 * b * lanes) - p)
+        for _ in range(newton_steps):
+            j = np.minimum((np.log1p(x) / step).astype(np.int64), size - 1)
+            slope = flat_slope[base + j]
+            g = flat_rho[base + j] + slope * (x - grid[j])
+            x = np.maximum(x - (x + a * g - b) / (1.0 + a * slope), 0.0)
+        if (k + 1) % store_every == 0:
+            out[(k + 1) // store_every - 1] = x
+    return out.T
+
+
+def pointwise_stationary(lam, mu, lanes, max_cells=1 << 20):
+    # Plain M/M/c L at every instant, as in week 8 (inf while overloaded), in column blocks to bound temporaries
+    lam = np.atleast_2d(np.asarray(lam, dtype=float))
+    mu = np.broadcast_to(np.asarray(mu, dtype=float), (lam.shape[0],))[:, None]
+    lanes = np.broadcast_to(np.asarray(lanes, dtype=int), (lam.shape[0],))[:, None]
+    out = np.empty(lam.shape)
+    block = max(1, max_cells // max(lam.shape[0], 1))
+    for k in range(0, lam.shape[1], block):
+        out[:, k:k + block] = mmc_metrics(lam[:, k:k + block], mu, lanes).L
+    return out
+
+
+def clearance_times(L, L_psa, dt, tol=0.05, slack=0.5):
+    """Find every overload episode and how long its queue takes to drain afterwards.
+
+    A node is overloaded where the stationary L is infinite. The queue
+    counts as cleared once L is within `tol` (relative) plus `slack`
+    vehicles of the stationary value again.
+    """
+    over = ~np.isfinite(L_psa)
+    n, steps = over.shape
+    pad = np.zeros((n, 1), dtype=bool)
+    edges = np.diff(np.hstack([pad, over, pad]).astype(np.int8), axis=1)
+    node, start = np.nonzero(edges == 1)
+    _, end = np.nonzero(edges == -1)
+    end = end - 1
+
+    with np.errstate(invalid="ignore"):
+        cleared = np.isfinite(L_psa) & (L <= L_psa * (1 + tol) + slack)
+    idx = np.where(cleared, np.arange(steps), steps)
+    # First cleared step at or after each step: a running minimum from the right
+    next_clear = np.minimum.accumulate(idx[:, ::-1], axis=1)[:, ::-1]
+    after = np.minimum(end + 1, steps - 1)
+    first = next_clear[node, after]
+    clear_time = np.where((end + 1 < steps) & (first < steps), (first - end) * dt, np.inf)
+    return Clearance(node, start, end, clear_time)
+
+
+def solve(lam, mu, lanes, dt, t0=0.0, L0=0.0, store_every=1):
+    """Fluid and pointwise-stationary queue lengths for a λ(t) matrix; returns a TransientResult."""
+    lam = np.atleast_2d(np.asarray(lam, dtype=float))
+    n = lam.shape[0]
+    mu = np.broadcast_to(np.asarray(mu, dtype=float), (n,))
+    lanes = np.broadcast_to(np.asarray(lanes, dtype=int), (n,))
+    L = fluid_queue(lam, mu, lanes, dt, L0, store_every)
+    sampled = lam[:, store_every - 1::store_every][:, :L.shape[1]]
+    times = t0 + dt * store_every * np.arange(1, L.shape[1] + 1)
+    return TransientResult(times, L, pointwise_stationary(sampled, mu, lanes),
+                           sampled / (lanes * mu)[:, None])
+
+
+def lambda_series(lambda_t, start, end, dt):
+    # Sampling an hourly λ(t) function (like week 8's lambda_t) every `dt` hours
+    hours = start + dt * np.arange(int(round((end - start) / dt)))
+    return hours, np.array([lambda_t(int(np.floor(h + 1e-9))) for h in hours], dtype=float)
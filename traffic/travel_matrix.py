@@ -0,0 +1,179 @@
+import heapq
+import json
+import os
+
+import numpy as np
+
+from .csr_graph import CSRGraph
+
+ARRAYS = ("landmarks", "dist_from", "dist_to", "base_weights")
+
+
+def _sssp(graph, sources, weights=None):
+    # Shortest-path distances from each source (rows) to every node (columns)
+    sources = np.atleast_1d(np.asarray(sources, dtype=np.int64))
+    try:
+        from scipy.sparse import csgraph
+    except ImportError:
+        names = graph.nodes.tolist()
+        return np.vstack([graph.dijkstra(names[s], weights=weights)[0] for s in sources])
+    return csgraph.dijkstra(graph.to_scipy(weights), directed=True, indices=sources)
+
+
+def _reverse(graph, weights):
+    return CSRGraph.from_edges(graph.num_nodes, graph.targets, graph.sources, weights, graph.nodes)
+
+
+class ALTIndex:
+    """Landmark (ALT) index for fast point-to-point queries and travel-time matrices.
+
+    For every landmark the index keeps shortest distances from the landmark
+    to each node and from each node to the landmark, computed on the base
+    (free-flow) edge weights. The triangle inequality then gives A* a lower
+    bound that stays valid for any current weights >= the base weights, so
+    adding queue delays never invalidates the index.
+    """
+
+    def __init__(self, graph, landmarks, dist_from, dist_to, base_weights):
+        self.graph = graph
+        self.landmarks = np.asarray(landmarks, dtype=np.int64)
+        self.dist_from = np.asarray(dist_from)
+        self.dist_to = np.asarray(dist_to)
+        self.base_weights = np.array(base_weights, dtype=float)
+        self.weights = self.base_weights.copy()
+
+    @classmethod
+    def build(cls, graph, n_landmarks=16, weights=None, seed=0):
+        """Pick landmarks by farthest-point selection and compute their distance tables."""
+        w = graph.weights if weights is None else np.asarray(weights, dtype=float)
+        rng = np.random.default_rng(seed)
+        n = graph.num_nodes
+        n_landmarks = min(n_landmarks, n)
+
+        landmarks = []
+        closest = np.full(n, np.inf)
+        current = int(rng.integers(n))
+        for _ in range(n_landmarks):
+            d = _sssp(graph, current, w)[0]
+            closest = np.minimum(closest, d)
+            landmarks.append(current)
+            # Next landmark: the reachable node farthest from all chosen ones
+            candidates = np.where(np.isfinite(closest), closest, -1.0)
+            candidates[landmarks] = -1.0
+            if candidates.max() <= 0:
+                break
+            current = int(candidates.argmax())
+
+        dist_from = _sssp(graph, landmarks, w)
+        dist_to = _sssp(_reverse(graph, w), landmarks)
+        return cls(graph, landmarks, dist_from, dist_to, w)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, name + ".npy"), np.asarray(getattr(self, name)))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"num_nodes": self.graph.num_nodes, "num_edges": self.graph.num_edges}, f)
+
+    @classmethod
+    def load(cls, path, graph, mmap=True):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if (meta["num_nodes"], meta["num_edges"]) != (graph.num_nodes, graph.num_edges):
+            raise ValueError(f"index at {path} was built for a different graph")
+        arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r" if mmap else None)
+                  for name in ARRAYS}
+        return cls(graph, **arrays)
+
+    def update_weights(self, weights):
+        """Switch to new edge weights, repairing only the landmark tables they invalidate.
+
+        Weights at or above the base keep every bound valid and cost nothing.
+        For edges that got cheaper, only the landmarks whose distances can
+        shrink through those edges are recomputed. Returns the number of
+        landmark tables that were refreshed.
+        """
+        weights = np.asarray(weights, dtype=float)
+        cheaper = np.flatnonzero(weights < self.base_weights)
+        self.weights = weights.copy()
+        if cheaper.size == 0:
+            return 0
+
+        u, v, w = self.graph.sources[cheaper], self.graph.targets[cheaper], weights[cheaper]
+        self.base_weights[cheaper] = w
+        fwd = np.flatnonzero(np.any(self.dist_from[:, u] + w < self.dist_from[:, v], axis=1))
+        bwd = np.flatnonzero(np.any(self.dist_to[:, v] + w < self.dist_to[:, u], axis=1))
+        self.dist_from = np.array(self.dist_from)
+        self.dist_to = np.array(self.dist_to)
+        if fwd.size:
+            self.dist_from[fwd] = _sssp(self.graph, self.landmarks[fwd], self.base_weights)
+        if bwd.size:
+            self.dist_to[bwd] = _sssp(_reverse(self.graph, self.base_weights), self.landmarks[bwd])
+        return len(fwd) + len(bwd)
+
+    def set_queue_delay(self, node_delay):
+        # Current weights = travel time + waiting time at the head intersection
+        return self.update_weights(self.graph.with_queue_delay(node_delay))
+
+    def lower_bound(self, nodes, target):
+        # ALT potential: max over landmarks of the two triangle-inequality bounds
+        return self._potential(nodes, self.dist_to[:, target][:, None], self.dist_from[:, target][:, None])
+
+    def _potential(self, nodes, to_t, from_t):
+        # lower_bound with the target columns already taken; non-finite terms (unreachable landmarks) count as 0
+        with np.errstate(invalid="ignore"):
+            b1 = self.dist_to[:, nodes] - to_t
+            b2 = from_t - self.dist_from[:, nodes]
+        b1 = np.where(np.isfinite(b1), b1, 0.0)
+        b2 = np.where(np.isfinite(b2), b2, 0.0)
+        return np.maximum(np.maximum(b1, b2).max(axis=0), 0.0)
+
+    def query(self, source, target):
+        """Point-to-point travel time under the current weights; returns (cost, path)."""
+        g = self.graph
+        src, goal = g.index[source], g.index[target]
+        offsets, targets, w = g.offsets, g.targets, self.weights
+        # Potentials only for nodes the search reaches, one vectorized call per settled node's new neighbours
+        to_t, from_t = self.dist_to[:, goal][:, None], self.dist_from[:, goal][:, None]
+        h = {src: float(self._potential([src], to_t, from_t)[0])}
+
+        dist = {src: 0.0}
+        pred = {src: -1}
+        heap = [(h[src], 0.0, src)]
+        closed = set()
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if u in closed:
+                continue
+            if u == goal:
+                return d, g._path(pred, goal)
+            closed.add(u)
+            lo, hi = int(offsets[u]), int(offsets[u + 1])
+            nbrs, costs = targets[lo:hi].tolist(), w[lo:hi].tolist()
+            new = [v for v in nbrs if v not in h]
+            if new:
+                h.update(zip(new, self._potential(new, to_t, from_t).tolist()))
+            for v, c in zip(nbrs, costs):
+                nd = d + c
+                if nd < dist.get(v, np.inf):
+                    dist[v] = nd
+                    pred[v] = u
+                    heapq.heappush(heap, (nd + h[v], nd, v))
+        return np.inf, []
+
+    def matrix(self, origins, destinations, chunk=256):
+        """N x M travel-time matrix under the current weights, computed in origin chunks.
+
+        The landmark tables are not used here: one Dijkstra per origin
+        already settles every destination at once, and ALT bounds only prune
+        a search aimed at a single target. Use query() for a few pairs.
+        Chunking bounds the temporary memory to `chunk` x num_nodes distances.
+        """
+        g = self.graph
+        orig = np.array([g.index[o] for o in origins], dtype=np.int64)
+        dest = np.array([g.index[d] for d in destinations], dtype=np.int64)
+        out = np.empty((len(orig), len(dest)))
+        for start in range(0, len(orig), chunk):
+            block = orig[start:start + chunk]
+            out[start:start + len(block)] = _sssp(g, block, self.weights)[:, dest]
+        return out
@@ -0,0 +1,297 @@
+import argparse
+import collections
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import instrument
+from .core import improvement
+
+CHUNK_CELLS = 1 << 21  # (samples x nodes) cells evaluated at once, about 250 MB of M/M/c temporaries
+PERCENTILES = (5.0, 50.0, 95.0)
+
+# Measurement noise on a rate: distribution `kind` centred on the point value with coefficient of variation `cv`
+Noise = collections.namedtuple("Noise", ["kind", "cv"])
+DEFAULT_LAM_NOISE = Noise("gamma", 0.10)  # counted arrivals over a short window
+DEFAULT_MU_NOISE = Noise("gamma", 0.05)   # saturation flow, steadier than demand
+
+# Monte Carlo summary of one network state, node arrays in state order
+#   L_percentiles: (len(percentiles), n), inf where that share of the draws is unstable
+#   p_unstable: share of draws with λ >= c·μ per node; total_percentiles: network-wide L (each L clipped at cap when set)
+QueueUncertainty = collections.namedtuple(
+    "QueueUncertainty", ["percentiles", "L_percentiles", "p_unstable", "total_percentiles", "p_any_unstable"]
+)
+# Confidence interval of the week 6 improvement % under independent noise on both measurements
+#   low/high per node, p_better: share of draws where the node's L went down; total_*: summed network L
+ImprovementInterval = collections.namedtuple(
+    "ImprovementInterval", ["level", "point", "low", "high", "p_better", "total_point", "total_low", "total_high"]
+)
+
+
+# Samplers take (n, 1) means and scalar or (n, 1) cvs and return (n, samples) draws with that mean and cv
+def _normal(rng, mean, cv, shape):
+    return np.maximum(mean * (1.0 + cv * rng.standard_normal(shape)), 0.0)
+
+
+def _lognormal(rng, mean, cv, shape):
+    s2 = np.log1p(cv * cv)
+    return mean * np.exp(np.sqrt(s2) * rng.standard_normal(shape) - 0.5 * s2)
+
+
+def _gamma(rng, mean, cv, shape):
+    # Shape 1/cv², scale mean·cv²; a scalar shape parameter is much faster to draw than a per-cell one
+    if np.ndim(cv) == 0 and cv > 0:
+        return rng.standard_gamma(1.0 / (cv * cv), shape) * (mean * cv * cv)
+    safe = np.where(cv > 0, cv, 1.0)
+    draws = rng.standard_gamma(np.broadcast_to(1.0 / (safe * safe), shape), shape) * (safe * safe)
+    return np.where(cv > 0, draws, 1.0) * mean
+
+
+def _uniform(rng, mean, cv, shape):
+    # Same standard deviation as the other kinds: half-width √3·cv
+    return np.maximum(mean * (1.0 + cv * np.sqrt(3.0) * rng.uniform(-1.0, 1.0, shape)), 0.0)
+
+
+SAMPLERS = {"normal": _normal, "lognormal": _lognormal, "gamma": _gamma, "uniform": _uniform}
+
+
+def _noise(spec):
+    if spec is None:
+        return Noise("normal", 0.0)
+    spec = Noise(*spec)
+    if spec.kind not in SAMPLERS:
+        raise ValueError(f"unknown distribution {spec.kind!r}; choose from {sorted(SAMPLERS)}")
+    return spec
+
+
+def sample_rates(rng, values, noise, samples):
+    """(n, samples) draws of a rate around its point values, one row per node.
+
+    `noise.cv` may be a scalar or one value per node.
+    """
+    values = np.asarray(values, dtype=float).reshape(-1, 1)
+    cv = np.asarray(noise.cv, dtype=float)
+    cv = cv if cv.ndim == 0 else cv.reshape(-1, 1)
+    return SAMPLERS[noise.kind](rng, values, cv, (values.shape[0], samples))
+
+
+def _queue_length(lam, mu, lanes):
+    """M/M/c L only, for (n, samples) rates and (n,) lanes; the lean core of mmc_metrics.
+
+    Rows are visited in descending lane order, so the Erlang-B recurrence
+    step k works on a contiguous prefix of the rows still needing it
+    instead of masking the whole matrix.
+    """
+    order = np.argsort(-lanes, kind="stable")
+    c = lanes[order]
+    a = lam[order] / mu[order]
+    B = np.ones_like(a)
+    rows = np.searchsorted(-c, -np.arange(1, int(c[0]) + 1 if c.size else 1), side="right")  # rows with c >= k
+    for k, r in enumerate(rows.tolist(), start=1):
+        aB = a[:r] * B[:r]
+        B[:r] = aB / (k + aB)
+    rho = a / c[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        L = B / (1.0 - rho * (1.0 - B)) * rho / (1.0 - rho) + a  # Erlang-C · ρ/(1-ρ) + λ/μ
+    L[rho >= 1.0] = np.inf
+    L[a <= 0.0] = 0.0
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(order.size)
+    return L[inverse]
+
+
+def _order_stats(x, q):
+    # Empirical (inverted-CDF) quantiles along each row, by partial sorting at the needed ranks only
+    ranks = np.clip(np.ceil(np.asarray(q) * x.shape[1]).astype(int) - 1, 0, x.shape[1] - 1)
+    return np.partition(x, np.unique(ranks), axis=1)[:, ranks].T
+
+
+def _chunk(task):
+    # One block of nodes for every side: sampled L summaries plus per-draw network totals
+    seed, lo, sides, samples, lam_noise, mu_noise, q, cap, level = task
+    rng = np.random.default_rng([seed, lo])  # depends on the block, not on which process runs it
+    out, capped = [], []
+    for lam, mu, lanes in sides:
+        L = _queue_length(sample_rates(rng, lam, lam_noise, samples), sample_rates(rng, mu, mu_noise, samples),
+                          np.asarray(lanes))
+        unstable = np.isinf(L)
+        # Any L >= cap counts as cap, so a near-critical stable draw never scores worse than an unstable one
+        clipped = np.where(unstable, 0.0, L) if cap is None else np.minimum(L, cap)
+        out.append((_order_stats(L, q), unstable.mean(axis=1), clipped.sum(axis=0), unstable.sum(axis=0)))
+        capped.append(L if cap is None else clipped)
+    if len(sides) == 2:
+        pct = improvement(capped[0], capped[1])
+        tail = (1.0 - level) / 2.0
+        out.append((_order_stats(pct, [tail, 1.0 - tail]), (capped[1] < capped[0]).mean(axis=1)))
+    return lo, out
+
+
+def _slice(noise, lo, hi):
+    # Per-node cv arrays follow the node block; scalars pass through
+    return noise if np.ndim(noise.cv) == 0 else Noise(noise.kind, np.asarray(noise.cv)[lo:hi])
+
+
+def _blocks(n, samples, chunk_cells):
+    size = max(1, chunk_cells // max(samples, 1))
+    return [(lo, min(lo + size, n)) for lo in range(0, n, size)]
+
+
+def _run(sides, samples, lam_noise, mu_noise, percentiles, cap, level, chunk_cells, workers, seed):
+    n = sides[0][0].size
+    q = np.asarray(percentiles, dtype=float) / 100.0
+    tasks = [(seed, lo, [(lam[lo:hi], mu[lo:hi], lanes[lo:hi]) for lam, mu, lanes in sides],
+              samples, _slice(lam_noise, lo, hi), _slice(mu_noise, lo, hi), q, cap, level)
+             for lo, hi in _blocks(n, samples, chunk_cells)]
+    instrument.count("monte_carlo_cells", samples * n * len(sides))
+    with instrument.stage("monte_carlo"):
+        if workers == 1 or len(tasks) == 1:
+            parts = [_chunk(t) for t in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parts = list(pool.map(_chunk, tasks))
+    return n, parts
+
+
+def _summaries(n, parts, samples, percentiles, cap, side):
+    # Stitching one side's blocks back into node order and combining the per-draw totals
+    Lp = np.empty((len(percentiles), n))
+    p_unstable = np.empty(n)
+    summed = np.zeros(samples)  # finite L per draw, or capped L when cap is set
+    count = np.zeros(samples, dtype=np.int64)
+    for lo, out in parts:
+        qs, pu, fs, uc = out[side]
+        Lp[:, lo:lo + pu.size] = qs
+        p_unstable[lo:lo + pu.size] = pu
+        summed += fs
+        count += uc
+    totals = np.where(count > 0, np.inf, summed) if cap is None else summed
+    q = np.asarray(percentiles, dtype=float) / 100.0
+    result = QueueUncertainty(np.asarray(percentiles, dtype=float), Lp, p_unstable,
+                              np.quantile(totals, q, method="inverted_cdf"), float((count > 0).mean()))
+    return result, totals
+
+
+def _arrays(state_or_lam, mu=None, lanes=1):
+    if mu is None:  # a NetworkState
+        state = state_or_lam
+        return state.lam, state.mu, state.lanes
+    lam = np.asarray(state_or_lam, dtype=float).ravel()
+    mu = np.broadcast_to(np.asarray(mu, dtype=float), lam.shape)
+    lanes = np.broadcast_to(np.asarray(lanes, dtype=int), lam.shape)
+    return lam, mu, lanes
+
+
+def queue_uncertainty(lam, mu=None, lanes=1, samples=1000, lam_noise=DEFAULT_LAM_NOISE, mu_noise=DEFAULT_MU_NOISE,
+                      percentiles=PERCENTILES, cap=None, chunk_cells=CHUNK_CELLS, workers=1, seed=0):
+    """Percentiles of L and probability of instability per node under noisy λ and μ.
+
+    `lam` is either a NetworkState or an array of point rates (with `mu` and
+    `lanes`). Every node gets `samples` independent (λ, μ) draws from the
+    `lam_noise`/`mu_noise` distributions, evaluated as one (samples, nodes)
+    matrix in blocks of about `chunk_cells` cells, optionally spread over
+    `workers` processes. Results depend on `seed` and the block size only.
+    """
+    lam_noise, mu_noise = _noise(lam_noise), _noise(mu_noise)
+    n, parts = _run([_arrays(lam, mu, lanes)], samples, lam_noise, mu_noise, percentiles, cap, 0.95,
+                    chunk_cells, workers or os.cpu_count() or 1, seed)
+    return _summaries(n, parts, samples, percentiles, cap, 0)[0]
+
+
+def improvement_interval(before, after, samples=1000, level=0.95, cap=10, lam_noise=DEFAULT_LAM_NOISE,
+                         mu_noise=DEFAULT_MU_NOISE, chunk_cells=CHUNK_CELLS, workers=1, seed=0):
+    """Confidence intervals on the week 6 improvement % between two NetworkStates.
+
+    Both states are measured with independent noise, so each draw pairs a
+    sampled "before" network with a sampled "after" network. `cap` clips
+    every L at cap, stable or not, so the week 6 plot cap bounds both the
+    unstable and the near-critical draws. Returns the
+    ImprovementInterval and the QueueUncertainty of each side.
+    """
+    if list(before.nodes) != list(after.nodes):
+        raise ValueError("before and after states must list the same nodes in the same order")
+    lam_noise, mu_noise = _noise(lam_noise), _noise(mu_noise)
+    tail = (1.0 - level) / 2.0
+    n, parts = _run([_arrays(before), _arrays(after)], samples, lam_noise, mu_noise, PERCENTILES, cap, level,
+                    chunk_cells, workers or os.cpu_count() or 1, seed)
+    side_before, total_before = _summaries(n, parts, samples, PERCENTILES, cap, 0)
+    side_after, total_after = _summaries(n, parts, samples, PERCENTILES, cap, 1)
+
+    low, high, p_better = np.empty(n), np.empty(n), np.empty(n)
+    for lo, out in parts:
+        bounds, better = out[2]
+        low[lo:lo + better.size], high[lo:lo + better.size] = bounds
+        p_better[lo:lo + better.size] = better
+
+    def capped(L):
+        return L if cap is None else np.minimum(L, cap)
+
+    total_pct = improvement(total_before, total_after)
+    total_low, total_high = np.quantile(total_pct, [tail, 1.0 - tail], method="inverted_cdf")
+    point_total = improvement(capped(before.L).sum(), capped(after.L).sum())
+    interval = ImprovementInterval(level, improvement(capped(before.L), capped(after.L)), low, high, p_better,
+                                   float(point_total), float(total_low), float(total_high))
+    return interval, side_before, side_after
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo uncertainty of queue lengths under noisy λ and μ.")
+    parser.add_argument("network", help="CSV with Node, lambda, mu and optional lanes columns")
+    parser.add_argument("after", nargs="?", help="second CSV over the same nodes: report improvement %% intervals")
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--lam-noise", default="gamma:0.10", help="distribution:cv for λ, e.g. lognormal:0.15")
+    parser.add_argument("--mu-noise", default="gamma:0.05", help="distribution:cv for μ")
+    parser.add_argument("--cap", type=float, default=None, help="clip every L at this value in totals")
+    parser.add_argument("--level", type=float, default=0.95)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="queue_uncertainty.csv")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+
+    from .network_state import NetworkState
+
+    def noise(text):
+        kind, _, cv = text.partition(":")
+        return Noise(kind, float(cv or 0.0))
+
+    def load(path):
+        net = pd.read_csv(path)
+        lanes = net["lanes"].to_numpy() if "lanes" in net else None
+        return NetworkState(net["Node"], net["lambda"].to_numpy(), net["mu"].to_numpy(), lanes)
+
+    opts = dict(samples=args.samples, lam_noise=noise(args.lam_noise), mu_noise=noise(args.mu_noise),
+                workers=args.workers, seed=args.seed)
+    state = load(args.network)
+    start = time.perf_counter()
+    if args.after:
+        after = load(args.after)
+        interval, _, side = improvement_interval(state, after, level=args.level,
+                                                 cap=10 if args.cap is None else args.cap, **opts)
+        state = after
+    else:
+        side = queue_uncertainty(state, cap=args.cap, **opts)
+    elapsed = time.perf_counter() - start
+
+    df = pd.DataFrame({"Node": state.nodes, "λ": state.lam, "μ": state.mu, "Lanes": state.lanes, "L": state.L})
+    for p, row in zip(side.percentiles, side.L_percentiles):
+        df[f"L p{p:g}"] = row
+    df["P(unstable)"] = side.p_unstable
+    if args.after:
+        df["Improvement (%)"] = interval.point
+        df[f"Improvement {args.level:.0%} low"] = interval.low
+        df[f"Improvement {args.level:.0%} high"] = interval.high
+        df["P(L lower)"] = interval.p_better
+    df.to_csv(args.out, index=False)
+    print(df.head(10).round(3))
+    if args.after:
+        print(f"Network improvement {interval.total_point:.1f}% "
+              f"({args.level:.0%} CI {interval.total_low:.1f}% to {interval.total_high:.1f}%)")
+    print(f"{len(state)} nodes x {args.samples} samples in {elapsed:.2f}s; "
+          f"P(some node unstable) = {side.p_any_unstable:.3f}; written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
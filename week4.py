@@ -1,6 +1,10 @@
 import networkx as nx
-import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
+import pandas as pd
+from traffic.core import build_graph
+from traffic.jackson import JacksonNetwork
+from traffic.network_state import NetworkState
 
 #Defining a non-symmetrical traffic network
 intersections = [
@@ -24,10 +28,6 @@ roads = [
     ('Mohakhali', 'Banani'),
 ]
 
-G = nx.DiGraph()
-G.add_nodes_from(intersections)
-G.add_edges_from(roads)
-
 #Assigning λ and μ values
 lambda_values = {
     'Farmgate': 9,
@@ -55,48 +55,59 @@ mu_values = {
     'Mirpur-10': 6
 }
 
-#Calculating queue length and congestion
-queue_lengths = {}
-congestion_flags = {}
 
-def calc_L(lmbda, mu):
-    if mu > lmbda:
-        return round(lmbda / (mu - lmbda), 2), "No"
-    else:
-        return float("inf"), "Yes"
+#Share of vehicles leaving the network at each intersection in the coupled model
+EXIT_PROB = 0.7
+
+
+def main():
+    G = build_graph(intersections, roads, as_networkx=True)
+
+    #Calculating queue length and congestion for the whole network in one pass
+    state = NetworkState.from_dicts(G.nodes, lambda_values, mu_values)
+    queue_lengths = dict(zip(state.nodes, state.L.round(2)))
+    congestion_flags = dict(zip(state.nodes, np.where(state.congested, "Yes", "No")))
+
+    #Visualization
+    node_colors = ['red' if congestion_flags[n] == "Yes" else 'green' for n in G.nodes]
+
+    pos = nx.spring_layout(G, seed=42)
 
-for node in G.nodes:
-    L, flag = calc_L(lambda_values[node], mu_values[node])
-    queue_lengths[node] = L
-    congestion_flags[node] = flag
+    plt.figure(figsize=(12, 8))
+    nx.draw(G, pos, with_labels=False, node_color=node_colors, node_size=1600, arrowsize=20)
 
-#Visualization
-node_colors = ['red' if congestion_flags[n] == "Yes" else 'green' for n in G.nodes]
+    #Adding node labels above, queue length below
+    for node, (x, y) in pos.items():
+        plt.text(x, y + 0.08, node, fontsize=10, ha='center', fontweight='bold')
+        q_val = queue_lengths[node]
+        plt.text(x, y - 0.08, f"L={q_val if q_val != float('inf') else '∞'}", fontsize=9, color='blue', ha='center')
 
-pos = nx.spring_layout(G, seed=42)
+    plt.title("Urban Traffic Simulation: Non-Symmetrical Layout (Week 4)", fontsize=14)
+    plt.axis('off')
 
-plt.figure(figsize=(12, 8))
-nx.draw(G, pos, with_labels=False, node_color=node_colors, node_size=1600, arrowsize=20)
+    #Printing the table BEFORE showing graph
+    df = state.to_frame().round(2)
 
-#Adding node labels above, queue length below
-for node, (x, y) in pos.items():
-    plt.text(x, y + 0.08, node, fontsize=10, ha='center', fontweight='bold')
-    q_val = queue_lengths[node]
-    plt.text(x, y - 0.08, f"L={q_val if q_val != float('inf') else '∞'}", fontsize=9, color='blue', ha='center')
+    print("\nQueue Length and Congestion Table (Realistic Layout):\n")
+    print(df.to_string(index=False))
 
-plt.title("Urban Traffic Simulation: Non-Symmetrical Layout (Week 4)", fontsize=14)
-plt.axis('off')
+    #Coupled network: the typed λ become external arrivals and vehicles follow the roads
+    graph = build_graph(intersections, roads)
+    jackson = JacksonNetwork(graph, [lambda_values[n] for n in intersections],
+                             [mu_values[n] for n in intersections], exit_prob=EXIT_PROB)
+    coupled = jackson.solve()
+    df_coupled = pd.DataFrame({
+        'Node': intersections,
+        'γ (External)': jackson.gamma,
+        'λ (Effective)': coupled.lam,
+        'Queue Length (L)': coupled.L,
+        'Time in System (W)': coupled.W,
+    }).round(2)
+    print(f"\nCoupled (Jackson) Network, {EXIT_PROB:.0%} of vehicles leave at each intersection:\n")
+    print(df_coupled.to_string(index=False))
 
-#Printing the table BEFORE showing graph
-df = pd.DataFrame({
-    "Node": list(G.nodes),
-    "λ (Arrival Rate)": [lambda_values[n] for n in G.nodes],
-    "μ (Service Rate)": [mu_values[n] for n in G.nodes],
-    "Queue Length (L)": [queue_lengths[n] for n in G.nodes],
-    "Congestion?": [congestion_flags[n] for n in G.nodes]
-})
+    plt.show()
 
-print("\nQueue Length and Congestion Table (Realistic Layout):\n")
-print(df.to_string(index=False))
 
-plt.show()
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
 import matplotlib.pyplot as plt
 import networkx as nx
-import pandas as pd
+import numpy as np
+import sys
+from traffic.assignment import Assignment, read_demand
+from traffic.core import build_graph
+from traffic.network_state import NetworkState
 
 # Updated realistic intersection names and edges
 nodes = [
@@ -35,50 +39,44 @@ service_rates = {
     'Uttara-10': 5, 'Mirpur-10': 7
 }
 
-# M/M/1 Calculation
-def calc_L(lmbda, mu):
-    if mu > lmbda:
-        return round(lmbda / (mu - lmbda), 2), "No"
-    else:
-        return float("inf"), "Yes"
 
-queue_lengths = {}
-congestion_flags = {}
-for node in nodes:
-    L, flag = calc_L(arrival_rates[node], service_rates[node])
-    queue_lengths[node] = L
-    congestion_flags[node] = flag
+def main():
+    # --demand=<csv/parquet> with origin, destination, rate columns: λ comes from routing that
+    # demand over the network (queue-aware equilibrium); the surveyed arrival_rates otherwise
+    demand_file = next((a.split('=', 1)[1] for a in sys.argv[1:] if a.startswith('--demand=')), None)
 
-# Table output
-df = pd.DataFrame({
-    'Node': nodes,
-    'λ (Arrival Rate)': [arrival_rates[n] for n in nodes],
-    'μ (Service Rate)': [service_rates[n] for n in nodes],
-    'Queue Length (L)': [queue_lengths[n] for n in nodes],
-    'Congestion?': [congestion_flags[n] for n in nodes]
-})
+    # M/M/1 Calculation for every node at once
+    if demand_file:
+        assignment = Assignment(build_graph(nodes, edges), [service_rates[n] for n in nodes])
+        state = assignment.to_state(assignment.solve(read_demand(demand_file)))
+    else:
+        state = NetworkState.from_dicts(nodes, arrival_rates, service_rates)
+    queue_lengths = dict(zip(state.nodes, state.L.round(2)))
+    congestion_flags = dict(zip(state.nodes, np.where(state.congested, 'Yes', 'No')))
 
-print(df)    
+    # Table output
+    df = state.to_frame().round(2)
 
-# Graph creation
-G = nx.DiGraph()
-G.add_nodes_from(nodes)
-G.add_edges_from(edges)
-pos = nx.spring_layout(G, seed=42)
+    print(df)    
 
-# Node coloring
-colors = ['green' if congestion_flags[node] == 'No' else 'red' for node in G.nodes]
+    # Graph creation
+    G = build_graph(nodes, edges, as_networkx=True)
+    pos = nx.spring_layout(G, seed=42)
 
-# Draw graph
-plt.figure(figsize=(12, 8))
-nx.draw(G, pos, with_labels=False, node_color=colors, node_size=1800, arrowsize=20)
-queue_labels = {node: f"{node}\nL={queue_lengths[node]}" for node in G.nodes}
-nx.draw_networkx_labels(G, pos, labels=queue_labels, font_size=8, font_color='white', font_weight='bold')
+    # Node coloring
+    colors = ['green' if congestion_flags[node] == 'No' else 'red' for node in G.nodes]
 
-plt.title("Post-Optimization Traffic Network (Week 5)", fontsize=14)
-plt.axis('off')
-plt.subplots_adjust(left=0.05, right=0.95, top=0.95, bottom=0.05)
-plt.show()
+    # Draw graph
+    plt.figure(figsize=(12, 8))
+    nx.draw(G, pos, with_labels=False, node_color=colors, node_size=1800, arrowsize=20)
+    queue_labels = {node: f"{node}\nL={queue_lengths[node]}" for node in G.nodes}
+    nx.draw_networkx_labels(G, pos, labels=queue_labels, font_size=8, font_color='white', font_weight='bold')
 
+    plt.title("Post-Optimization Traffic Network (Week 5)", fontsize=14)
+    plt.axis('off')
+    plt.subplots_adjust(left=0.05, right=0.95, top=0.95, bottom=0.05)
+    plt.show()
 
 
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,16 @@
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
+import sys
+from traffic import instrument
+from traffic.assignment import Assignment, read_demand
+from traffic.core import build_graph
+from traffic.network_state import NetworkState, StateComparison
+from traffic.queue_cache import QueueCache
+from traffic.results_store import from_env as results_store
+from traffic.scenario_sweep import run_scenarios
+from traffic.sensitivity import rank_intersections
+from traffic.uncertainty import improvement_interval
 
 # Defining intersections
 nodes = [
@@ -9,6 +19,20 @@ nodes = [
     'Uttara-10', 'Mirpur-10'
 ]
 
+# Roads between them, as in week 5
+edges = [
+    ('Farmgate', 'Karwan Bazar'),
+    ('Karwan Bazar', 'Tejgaon'),
+    ('Tejgaon', 'Mohakhali'),
+    ('Mohakhali', 'Gulshan-1'),
+    ('Gulshan-1', 'Gulshan-2'),
+    ('Gulshan-2', 'Banani'),
+    ('Banani', 'Airport'),
+    ('Airport', 'Uttara-10'),
+    ('Tejgaon', 'Mirpur-10'),
+    ('Gulshan-2', 'Mirpur-10'),
+]
+
 # λ and μ values
 lambda_before = {
     'Farmgate': 9, 'Karwan Bazar': 8, 'Tejgaon': 10, 'Mohakhali': 7,
@@ -31,82 +55,120 @@ mu_after = {
     'Uttara-10': 5, 'Mirpur-10': 7
 }
 
-# L calculation
-def calc_L(lmbda, mu):
-    return round(lmbda / (mu - lmbda), 2) if mu > lmbda else float('inf')
-
-L_before_raw = [calc_L(lambda_before[n], mu_before[n]) for n in nodes]
-L_after_raw = [calc_L(lambda_after[n], mu_after[n]) for n in nodes]
-
-# Replacing inf with a capped value like 10 for plotting
-L_before = [val if val != float('inf') else 10 for val in L_before_raw]
-L_after = [val if val != float('inf') else 10 for val in L_after_raw]
-
-# Improvement %
-def improvement(lb, la):
-    if lb == float('inf') and la != float('inf'):
-        return 100.0
-    elif lb == float('inf') and la == float('inf'):
-        return 0.0
-    else:
-        return round((lb - la) / lb * 100, 2) if lb != 0 else 0.0
-
-improvements = [improvement(L_before[i], L_after[i]) for i in range(len(nodes))]
-
-# Table
-df_compare = pd.DataFrame({
-    'Node': nodes,
-    'λ': [lambda_after[n] for n in nodes],
-    'μ': [mu_after[n] for n in nodes],
-    'L Before': L_before,
-    'L After': L_after,
-    'Improvement (%)': improvements
-})
-
-# Sensitivity: λ ±1
-sensitive_nodes = ['Tejgaon', 'Farmgate', 'Mirpur-10']
-sensitivity_data = []
-for node in sensitive_nodes:
-    base_lambda = lambda_after[node]
-    mu = mu_after[node]
-    for delta in [-1, 0, 1]:
-        new_lambda = base_lambda + delta
-        L = calc_L(new_lambda, mu)
-        sensitivity_data.append({
-            'Node': node,
-            'λ': new_lambda,
-            'μ': mu,
-            'Queue Length (L)': L
+
+def main():
+    instrument.start_from_env()  # TRAFFIC_INSTRUMENT=1 times the stages below, TRAFFIC_PROFILE=1 also samples
+    # --demand=<csv/parquet> with origin, destination, rate columns: both networks get λ from routing
+    # that demand over their own μ (queue-aware equilibrium); the surveyed λ dicts otherwise
+    demand_file = next((a.split('=', 1)[1] for a in sys.argv[1:] if a.startswith('--demand=')), None)
+
+    cache = QueueCache()  # Sensitivity scenarios re-evaluate the same (λ, μ) pairs, shared by both states
+    with instrument.stage("queue_computation"):
+        if demand_file:
+            demand = read_demand(demand_file)
+            graph = build_graph(nodes, edges)
+            before = Assignment(graph, [mu_before[n] for n in nodes])
+            after = Assignment(graph, [mu_after[n] for n in nodes])
+            state_before = before.to_state(before.solve(demand), cache=cache)
+            state_after = after.to_state(after.solve(demand), cache=cache)
+        else:
+            state_before = NetworkState.from_dicts(nodes, lambda_before, mu_before, cache=cache)
+            state_after = NetworkState.from_dicts(nodes, lambda_after, mu_after, cache=cache)
+        L_before_raw = state_before.L.round(2)
+        L_after_raw = state_after.L.round(2)
+
+    # Replacing inf with a capped value like 10 for plotting
+    L_before = np.where(np.isfinite(L_before_raw), L_before_raw, 10)
+    L_after = np.where(np.isfinite(L_after_raw), L_after_raw, 10)
+
+    # Improvement % (kept up to date per node by comparison.update() when rates change)
+    with instrument.stage("build_tables"):
+        comparison = StateComparison(state_before, state_after, cap=10)
+        improvements = comparison.improvement
+
+        # Table
+        df_compare = pd.DataFrame({
+            'Node': state_after.nodes,
+            'λ': state_after.lam,
+            'μ': state_after.mu,
+            'L Before': L_before,
+            'L After': L_after,
+            'Improvement (%)': improvements
         })
-df_sensitivity = pd.DataFrame(sensitivity_data)
-
-# Before vs After Plot
-plt.figure(figsize=(12, 6))
-x = np.arange(len(nodes))
-width = 0.35
-plt.bar(x - width/2, L_before, width, label='Before', color='lightcoral')
-plt.bar(x + width/2, L_after, width, label='After', color='mediumseagreen')
-plt.xticks(x, nodes, rotation=45)
-plt.ylabel("Queue Length (L)")
-plt.title("Queue Length Before vs After Optimization")
-plt.legend()
-plt.tight_layout()
-plt.show()
-
-# Heatmap-style View
-plt.figure(figsize=(12, 6))
-colors = ['red' if L > 6 else 'orange' if L > 3 else 'green' for L in L_after]
-plt.bar(nodes, L_after, color=colors)
-plt.xticks(rotation=45)
-plt.ylabel("Queue Length (L After)")
-plt.title("Post-Optimization Traffic Intensity (Heatmap View)")
-plt.tight_layout()
-plt.show()
-
-# Showing tables
-print("\n Queue Length Comparison Table:")
-print(df_compare)
-print("\n Sensitivity Analysis Table:")
-print(df_sensitivity)
+
+    # Sensitivity: λ ±1
+    sensitive_nodes = ['Tejgaon', 'Farmgate', 'Mirpur-10']
+    scenarios = [{'nodes': [node], 'lambda_delta': delta} for node in sensitive_nodes for delta in [-1, 0, 1]]
+    with instrument.stage("sensitivity"):
+        _, df_scenarios = run_scenarios(state_after, scenarios, workers=1)
+        df_sensitivity = df_scenarios[['Node', 'λ', 'μ', 'Queue Length (L)']].round(2)
+
+    # Every intersection ranked by analytic ∂L/∂λ, ∂L/∂μ and the gain from one more lane
+    with instrument.stage("critical_ranking"):
+        df_critical = rank_intersections(state_after)[['Node', 'Queue Length (L)', '∂L/∂λ', '∂L/∂μ', 'ΔL (+1 lane)']]
+
+    # Uncertainty: 5000 noisy (λ, μ) measurements of both networks (γ-distributed, 10% / 5% CV)
+    with instrument.stage("uncertainty"):
+        interval, _, after_mc = improvement_interval(state_before, state_after, samples=5000, cap=10)
+        p5, p50, p95 = after_mc.L_percentiles
+        df_uncertainty = pd.DataFrame({
+            'Node': state_after.nodes,
+            'L After p5': p5,
+            'L After p50': p50,
+            'L After p95': p95,
+            'P(unstable)': after_mc.p_unstable,
+            'Improvement (%)': improvements,
+            'Improvement 95% low': interval.low,
+            'Improvement 95% high': interval.high,
+        }).round(2)
+
+    # Keeping this run's tables when TRAFFIC_RESULTS points at a result store
+    store = results_store()
+    if store is not None:
+        with instrument.stage("store_results"):
+            run_time = pd.Timestamp.now().floor("s")
+            store.append_table("week6_compare", df_compare, run_time)
+            store.append_table("week6_sensitivity", df_scenarios[['Scenario', 'Node', 'λ', 'μ', 'Queue Length (L)']], run_time)
+            store.append_table("week6_uncertainty", df_uncertainty, run_time)
+
+    # Before vs After Plot
+    with instrument.stage("render"):
+        plt.figure(figsize=(12, 6))
+        x = np.arange(len(nodes))
+        width = 0.35
+        plt.bar(x - width/2, L_before, width, label='Before', color='lightcoral')
+        plt.bar(x + width/2, L_after, width, label='After', color='mediumseagreen')
+        plt.xticks(x, nodes, rotation=45)
+        plt.ylabel("Queue Length (L)")
+        plt.title("Queue Length Before vs After Optimization")
+        plt.legend()
+        plt.tight_layout()
+        plt.show()
+
+        # Heatmap-style View
+        plt.figure(figsize=(12, 6))
+        colors = ['red' if L > 6 else 'orange' if L > 3 else 'green' for L in L_after]
+        plt.bar(nodes, L_after, color=colors)
+        plt.xticks(rotation=45)
+        plt.ylabel("Queue Length (L After)")
+        plt.title("Post-Optimization Traffic Intensity (Heatmap View)")
+        plt.tight_layout()
+        plt.show()
+
+    # Showing tables
+    print("\n Queue Length Comparison Table:")
+    print(df_compare)
+    print("\n Sensitivity Analysis Table:")
+    print(df_sensitivity)
+    print("\n Uncertainty Table (95% intervals under measurement noise):")
+    print(df_uncertainty)
+    print(f"Network improvement {interval.total_point:.1f}% "
+          f"(95% CI {interval.total_low:.1f}% to {interval.total_high:.1f}%)")
+    print("\n Critical Intersections (most sensitive first):")
+    print(df_critical.round(2))
+
+    instrument.finish("week6")
 
 
+if __name__ == "__main__":
+    main()
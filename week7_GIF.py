@@ -1,7 +1,9 @@
 import networkx as nx 
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
-import numpy as np
+import functools
+import itertools
+from traffic.core import build_graph
+from traffic.fast_animation import frames_from_simulation, graph_geometry, queue_style, save_animation
+from traffic.queue_sim import QueueNetwork
 import os  # ✅ Added to auto-open the GIF
 
 nodes = ['Farmgate', 'Karwan Bazar', 'Tejgaon', 'Mohakhali', 'Gulshan-1',
@@ -14,39 +16,46 @@ edges = [
     ('Tejgaon', 'Mirpur-10'), ('Gulshan-2', 'Mirpur-10')
 ]
 
-# Queue values for 3 stages
-queue_stages = {
-    'Before': [float('inf'), float('inf'), float('inf'), float('inf'), float('inf'), float('inf'), 2, 0.75, 0.67, float('inf')],
-    'During': [12, 10, 9, 8, 7, 6, 4, 1, 0.8, 10],
-    'After':  [8, 3.5, 4, 3, 5, 2, 2, 0.75, 0.67, 2.5]
+# λ and μ before and after optimization (week 6); every vehicle leaves after one intersection,
+# so each node is the M/M/1 queue of the week 5/6 tables
+stages = {
+    'Before': (
+        {'Farmgate': 9, 'Karwan Bazar': 8, 'Tejgaon': 10, 'Mohakhali': 7, 'Gulshan-1': 6,
+         'Gulshan-2': 5, 'Banani': 4, 'Airport': 3, 'Uttara-10': 2, 'Mirpur-10': 6},
+        {'Farmgate': 7, 'Karwan Bazar': 7, 'Tejgaon': 8, 'Mohakhali': 6, 'Gulshan-1': 5,
+         'Gulshan-2': 5, 'Banani': 6, 'Airport': 7, 'Uttara-10': 5, 'Mirpur-10': 6},
+    ),
+    'After': (
+        {'Farmgate': 8, 'Karwan Bazar': 7, 'Tejgaon': 8, 'Mohakhali': 6, 'Gulshan-1': 5,
+         'Gulshan-2': 4, 'Banani': 4, 'Airport': 3, 'Uttara-10': 2, 'Mirpur-10': 5},
+        {'Farmgate': 9, 'Karwan Bazar': 9, 'Tejgaon': 10, 'Mohakhali': 8, 'Gulshan-1': 6,
+         'Gulshan-2': 6, 'Banani': 6, 'Airport': 7, 'Uttara-10': 5, 'Mirpur-10': 7},
+    ),
 }
+minutes = 30  # simulated per stage, one frame per sampled minute
 
-G = nx.DiGraph()
-G.add_nodes_from(nodes)
-G.add_edges_from(edges)
-pos = nx.spring_layout(G, seed=42)
 
-fig, ax = plt.subplots(figsize=(10, 6))
+def main():
+    G = build_graph(nodes, edges, as_networkx=True)
+    pos = nx.spring_layout(G, seed=42)
 
-def update(frame):
-    ax.clear()
-    stage = list(queue_stages.keys())[frame]
-    Ls = queue_stages[stage]
-    sizes = [500 + 100 * (l if l != float('inf') else 10) for l in Ls]
-    colors = ['red' if l == float('inf') or l > 8 else 'green' for l in Ls]
+    # Vehicles in each intersection, sampled every minute of a discrete-event run per stage
+    frames = itertools.chain.from_iterable(
+        frames_from_simulation(
+            QueueNetwork.from_graph(G, lam, mu, exit_prob=1.0).simulate(minutes, sample_every=1.0, seed=42),
+            label=f"Traffic Simulation - {stage} (t = {{:.0f}} min)")
+        for stage, (lam, mu) in stages.items()
+    )
 
-    nx.draw(G, pos, node_color=colors, node_size=sizes, with_labels=False, arrows=True, ax=ax)
-    labels = {n: f"{n}\nL={Ls[i]}" for i, n in enumerate(nodes)}
-    nx.draw_networkx_labels(G, pos, labels=labels, font_size=7, font_color='white', ax=ax)
+    # Edges are drawn once; each frame only restyles the nodes (size/colour by L) and relabels them
+    xy, segments, names = graph_geometry(G, pos)
+    save_animation((xy, segments), frames, "traffic_animation.gif", fps=4, workers=1,
+                   labels=names, style=functools.partial(queue_style, scale=20.0))
+    print("✅ Animated GIF saved as 'traffic_animation.gif'")
 
-    ax.set_title(f"Traffic Simulation - {stage}", fontsize=12)
-    ax.axis('off')
+    # ✅ Automatically open the GIF (Windows only)
+    os.startfile("traffic_animation.gif")
 
-ani = FuncAnimation(fig, update, frames=3, repeat=True, interval=1500)
-ani.save("traffic_animation.gif", writer='pillow')
-plt.close()
-print("✅ Animated GIF saved as 'traffic_animation.gif'")
-
-# ✅ Automatically open the GIF (Windows only)
-os.startfile("traffic_animation.gif")
 
+if __name__ == "__main__":
+    main()
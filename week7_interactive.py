@@ -1,64 +1,77 @@
-import osmnx as ox
-import networkx as nx
 import folium
 import os
 import webbrowser
+import sys
+from traffic.graph_store import load_graph
+from traffic.map_export import export_state
+from traffic.spatial import SpatialIndex, attach, observed_state
 
-#Downloading road network for Tejgaon area
-place_center = (23.7571, 90.4004)  # Tejgaon central point
-G = ox.graph_from_point(place_center, dist=800, network_type='drive')
-G = G.to_undirected()
 
-#Selecting 20 intersections and 3 congested nodes
-selected_nodes = list(G.nodes())[:20]
-congested_nodes = selected_nodes[:3]  # First 3 are congested
+def main():
+    #Loading road network for Tejgaon area (downloaded once, then read from the local graph cache)
+    place_center = (23.7571, 90.4004)  # Tejgaon central point
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    osm_file = args[0] if args else None  # optional local .osm/.graphml file for offline runs
+    tiled = '--tiles' in sys.argv  # city-scale mode: every node, clustered per zoom level into tile files
+    # --sensors=<csv/parquet> with lat, lon (GPS pings) or lat, lon, lambda, mu (sensors); synthetic pings otherwise
+    sensors = next((a.split('=', 1)[1] for a in sys.argv[1:] if a.startswith('--sensors=')), None)
+    G = load_graph(place_center, dist=800, network_type='drive', source=osm_file)
 
-#Creating interactive folium map
-m = folium.Map(location=place_center, zoom_start=16)
+    #Snapping the readings to their nearest OSM intersections and solving the queue at each one
+    index = SpatialIndex.from_graph(G)
+    state = observed_state(index, sensors)
+    attach(G, state)  # λ, μ and L now live on the real OSM nodes
+    selected_nodes = state.nodes[~state.congested].tolist()
+    congested_nodes = state.nodes[state.congested].tolist()  # unstable queues (λ ≥ capacity)
 
-#Adding selected traffic model nodes (blue markers)
-for node in selected_nodes:
-    lat = G.nodes[node]['y']
-    lon = G.nodes[node]['x']
-    folium.CircleMarker(
-        location=(lat, lon),
-        radius=5,
-        color='blue',
-        fill=True,
-        fill_opacity=0.7,
-        popup=f"Node {node}"
-    ).add_to(m)
+    if tiled:
+        #Every intersection with data, clustered per zoom level; congested ones are the unstable queues (L = inf)
+        map_file = export_state(G, state, "tejgaon_traffic_tiles", center=place_center, zoom_start=16)
+    else:
+        #Creating interactive folium map
+        m = folium.Map(location=place_center, zoom_start=16)
 
-#Highlighting congested nodes (red markers)
-for node in congested_nodes:
-    lat = G.nodes[node]['y']
-    lon = G.nodes[node]['x']
-    folium.CircleMarker(
-        location=(lat, lon),
-        radius=7,
-        color='red',
-        fill=True,
-        fill_opacity=1,
-        popup=f"🚨 Congestion at Node {node}"
-    ).add_to(m)
+        #Adding stable intersections, colored by queue length as in week 6 (green L ≤ 3, orange L ≤ 6, red above)
+        for node in selected_nodes:
+            data = G.nodes[node]
+            folium.CircleMarker(
+                location=(data['y'], data['x']),
+                radius=5,
+                color='red' if data['L'] > 6 else 'orange' if data['L'] > 3 else 'green',
+                fill=True,
+                fill_opacity=0.7,
+                popup=f"Node {node}<br>λ = {data['lam']:.2f}, μ = {data['mu']:.2f}<br>L = {data['L']:.2f}"
+            ).add_to(m)
 
-#Saving the interactive map to an HTML file
-map_file = "tejgaon_traffic_model.html"
-m.save(map_file)
-
-#Opening the map automatically in Google Chrome
-full_path = os.path.abspath(map_file)
-chrome_path = "C:/Program Files/Google/Chrome/Application/chrome.exe %s"
-
-try:
-    webbrowser.get(chrome_path).open("file://" + full_path)
-    print("✅ Map saved and opened in Google Chrome.")
-except:
-    # Fallback to default browser if Chrome not found
-    webbrowser.open("file://" + full_path)
-    print("✅ Map saved. Opened in default browser (Chrome not found at expected path).")
+        #Highlighting congested nodes (red markers)
+        for node in congested_nodes:
+            lat = G.nodes[node]['y']
+            lon = G.nodes[node]['x']
+            folium.CircleMarker(
+                location=(lat, lon),
+                radius=7,
+                color='red',
+                fill=True,
+                fill_opacity=1,
+                popup=f"🚨 Congestion at Node {node}<br>λ = {G.nodes[node]['lam']:.2f} ≥ capacity {G.nodes[node]['mu'] * G.nodes[node]['lanes']:.2f}"
+            ).add_to(m)
 
+        #Saving the interactive map to an HTML file
+        map_file = "tejgaon_traffic_model.html"
+        m.save(map_file)
 
+    #Opening the map automatically in Google Chrome
+    full_path = os.path.abspath(map_file)
+    chrome_path = "C:/Program Files/Google/Chrome/Application/chrome.exe %s"
 
+    try:
+        webbrowser.get(chrome_path).open("file://" + full_path)
+        print("✅ Map saved and opened in Google Chrome.")
+    except:
+        # Fallback to default browser if Chrome not found
+        webbrowser.open("file://" + full_path)
+        print("✅ Map saved. Opened in default browser (Chrome not found at expected path).")
 
 
+if __name__ == "__main__":
+    main()
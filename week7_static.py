@@ -1,51 +1,64 @@
 import osmnx as ox
 import networkx as nx
 import matplotlib.pyplot as plt
-import folium
-
-#Defining area and downloading road network
-place_center = (23.7571, 90.4004)  # Tejgaon center coordinates
-G = ox.graph_from_point(place_center, dist=800, network_type='drive')
-G = G.to_undirected()
-
-#Selecting 20 key intersections (nodes) manually or randomly
-all_nodes = list(G.nodes())
-selected_nodes = all_nodes[:20]  # select first 20 for simplicity
-congested_nodes = selected_nodes[:3]  # mark first 3 as congested
-
-#Plotting static map using osmnx
-fig, ax = ox.plot_graph(G, show=False, close=False, node_size=5, bgcolor='white')
-
-#Getting node coordinates for drawing
-positions = {node: (data['x'], data['y']) for node, data in G.nodes(data=True)}
-
-#Plotting selected traffic model nodes in blue
-nx.draw_networkx_nodes(
-    G, pos=positions,
-    nodelist=selected_nodes,
-    node_color='blue',
-    node_size=50,
-    ax=ax,
-    label='Traffic Nodes'
-)
-
-#Highlighting congested nodes in red
-nx.draw_networkx_nodes(
-    G, pos=positions,
-    nodelist=congested_nodes,
-    node_color='red',
-    node_size=100,
-    ax=ax,
-    label='Congested Intersections'
-)
-
-#Labeling selected intersections with node ID
-for node in selected_nodes:
-    x, y = positions[node]
-    ax.text(x, y, str(node), fontsize=6, color='black')
-
-plt.title("Real Map Overlay: Tejgaon Traffic Model")
-plt.legend()
-plt.show()
+import sys
+from traffic.graph_store import load_graph
+from traffic.spatial import SpatialIndex, attach, observed_state
 
 
+def main():
+    #Defining area and loading the road network (downloaded once, then read from the local graph cache)
+    place_center = (23.7571, 90.4004)  # Tejgaon center coordinates
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    osm_file = args[0] if args else None  # optional local .osm/.graphml file for offline runs
+    # --sensors=<csv/parquet> with lat, lon (GPS pings) or lat, lon, lambda, mu (sensors); synthetic pings otherwise
+    sensors = next((a.split('=', 1)[1] for a in sys.argv[1:] if a.startswith('--sensors=')), None)
+    G = load_graph(place_center, dist=800, network_type='drive', source=osm_file)
+
+    #Snapping the readings to their nearest OSM intersections and solving the queue at each one
+    index = SpatialIndex.from_graph(G)
+    state = observed_state(index, sensors)
+    attach(G, state)  # λ, μ and L now live on the real OSM nodes
+    selected_nodes = state.nodes.tolist()  # intersections with data
+    congested_nodes = state.nodes[state.congested].tolist()  # unstable queues (λ ≥ capacity)
+    print(f"{len(selected_nodes)} intersections with data, {len(congested_nodes)} congested")
+
+    #Plotting static map using osmnx
+    fig, ax = ox.plot_graph(G, show=False, close=False, node_size=5, bgcolor='white')
+
+    #Getting node coordinates for drawing
+    positions = {node: (data['x'], data['y']) for node, data in G.nodes(data=True)}
+
+    #Plotting intersections with data, colored by queue length as in week 6 (green L ≤ 3, orange L ≤ 6)
+    queue_L = [G.nodes[n]['L'] for n in selected_nodes]
+    nx.draw_networkx_nodes(
+        G, pos=positions,
+        nodelist=selected_nodes,
+        node_color=['red' if L > 6 else 'orange' if L > 3 else 'green' for L in queue_L],
+        node_size=20,
+        ax=ax,
+        label='Traffic Nodes'
+    )
+
+    #Highlighting congested nodes in red
+    nx.draw_networkx_nodes(
+        G, pos=positions,
+        nodelist=congested_nodes,
+        node_color='red',
+        node_size=100,
+        ax=ax,
+        label='Congested Intersections'
+    )
+
+    #Labeling congested intersections with node ID and arrival rate
+    for node in congested_nodes:
+        x, y = positions[node]
+        ax.text(x, y, f"{node}\nλ={G.nodes[node]['lam']:.1f}", fontsize=6, color='black')
+
+    plt.title("Real Map Overlay: Tejgaon Traffic Model")
+    plt.legend()
+    plt.show()
+
+
+if __name__ == "__main__":
+    main()